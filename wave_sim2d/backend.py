@@ -0,0 +1,111 @@
+import numpy as np
+import scipy.fft
+import scipy.signal
+import scipy.ndimage
+
+try:
+    import cupy
+    import cupyx.scipy.fft
+    import cupyx.scipy.signal
+    import cupyx.scipy.ndimage
+except ImportError:
+    cupy = None
+
+
+class ArrayBackend:
+    """
+    Bundles the array module (numpy or cupy) and the matching signal processing module of one compute backend.
+    The simulator, the scene objects and the visualizer use this class instead of importing cupy directly, so the
+    same code path runs on the CPU (NumPy/SciPy) and on the GPU (CuPy).
+    """
+    def __init__(self, name, xp, signal, ndimage, fft=None):
+        """
+        @param name: Name of the backend ('numpy' or 'cupy').
+        @param xp: The array module.
+        @param signal: The signal processing module providing convolve2d.
+        @param ndimage: The n-dimensional image processing module.
+        @param fft: The scipy.fft compatible module providing the discrete Fourier, sine and cosine transforms.
+        """
+        self.name = name
+        self.xp = xp
+        self.signal = signal
+        self.ndimage = ndimage
+        self.fft = fft
+
+    @property
+    def is_gpu(self):
+        return self.name == 'cupy'
+
+    def asarray(self, a, dtype=None):
+        """
+        Converts an array to this backend. Arrays that already live on this backend with the requested dtype are
+        returned without copying, so scene objects can call this each frame to cache their device arrays.
+        """
+        if self.is_gpu or cupy is None or not isinstance(a, cupy.ndarray):
+            return self.xp.asarray(a, dtype=dtype)
+        return self.xp.asarray(a.get(), dtype=dtype)
+
+    def to_numpy(self, a):
+        """ returns a host (numpy) version of the given array """
+        if cupy is not None and isinstance(a, cupy.ndarray):
+            return a.get()
+        return np.asarray(a)
+
+    def convolve2d(self, a, kernel):
+        """
+        2D convolution with zero boundary that keeps the size of the input. Stacks of 2D arrays (batch, h, w) are
+        convolved along their last two axes in one call.
+        """
+        if a.ndim == 2:
+            return self.signal.convolve2d(a, kernel, mode='same', boundary='fill')
+        kernel = kernel.reshape((1,) * (a.ndim - 2) + kernel.shape)
+        return self.ndimage.convolve(a, kernel, output=self.xp.result_type(a, kernel), mode='constant', cval=0.0)
+
+    def synchronize(self):
+        """ blocks until all queued device work is done, a no-op on the CPU """
+        if self.is_gpu:
+            cupy.cuda.get_current_stream().synchronize()
+
+    def __repr__(self):
+        return f'ArrayBackend({self.name!r})'
+
+
+_numpy_backend = ArrayBackend('numpy', np, scipy.signal, scipy.ndimage, scipy.fft)
+_cupy_backend = ArrayBackend('cupy', cupy, cupyx.scipy.signal, cupyx.scipy.ndimage,
+                             cupyx.scipy.fft) if cupy is not None else None
+
+
+def cupy_available():
+    """ returns True if cupy is installed and a CUDA device can be used """
+    if cupy is None:
+        return False
+    try:
+        return cupy.cuda.runtime.getDeviceCount() > 0
+    except Exception:
+        return False
+
+
+def get_backend(backend=None):
+    """
+    Returns an array backend.
+    @param backend: 'numpy', 'cupy', an ArrayBackend instance or None. None selects cupy when a CUDA device is
+                    available and numpy otherwise.
+    """
+    if isinstance(backend, ArrayBackend):
+        return backend
+    if backend is None:
+        return _cupy_backend if cupy_available() else _numpy_backend
+    if backend == 'numpy':
+        return _numpy_backend
+    if backend == 'cupy':
+        if cupy is None:
+            raise ValueError('the cupy backend was requested, but cupy is not installed')
+        return _cupy_backend
+    raise ValueError(f'unknown array backend: {backend}')
+
+
+def backend_of(array):
+    """ returns the backend an array lives on """
+    if cupy is not None and isinstance(array, cupy.ndarray):
+        return _cupy_backend
+    return _numpy_backend
@@ -0,0 +1,79 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))  # noqa
+
+import time
+import argparse
+import numpy as np
+import wave_sim2d.wave_simulation as sim
+from wave_sim2d.boundary import CPMLBoundary
+from wave_sim2d.engines import laplacian_kernel_scale
+from wave_sim2d.scene_objects.static_dampening import StaticDampening
+
+
+def pulse(size, center, width):
+    """
+    mexican hat pulse at rest, it has no constant component and its spectrum peaks at a wavelength of about
+    4.4 * width cells
+    """
+    y, x = np.mgrid[0:size, 0:size].astype(np.float64)
+    r2 = ((x - center) ** 2 + (y - center) ** 2) / (2 * width ** 2)
+    return ((1.0 - r2) * np.exp(-r2)).astype(np.float32)
+
+
+def simulate(interior, margin, boundary, sponge, num_steps, width, engine):
+    """
+    simulates a pulse in the center of an interior region surrounded by a margin of absorbing cells and returns the
+    interior field of every step
+    """
+    size = interior + 2 * margin
+    dampening = StaticDampening(np.ones((size, size)), sponge)
+    simulator = sim.WaveSimulator2D(size, size, [dampening], initial_field=pulse(size, size / 2, width),
+                                    backend='numpy', engine=engine, boundary=boundary)
+    frames = []
+
+    def record(s):
+        frames.append(s.get_field()[margin:margin + interior, margin:margin + interior].copy())
+
+    start = time.perf_counter()
+    simulator.run(num_steps, callbacks=[record])
+    return np.array(frames), time.perf_counter() - start
+
+
+def main():
+    """
+    Measures the waves reflected by the sponge border of StaticDampening and by the CPML boundary. A pulse is
+    simulated in the center of an interior region surrounded by the absorber. The same pulse simulated on a grid
+    large enough that no reflection reaches the interior within the simulated time is the reference, the largest
+    difference in the interior relative to the largest amplitude of the pulse at the border is the reflection.
+    """
+    parser = argparse.ArgumentParser(description='Compares the reflections of the sponge border and the CPML boundary')
+    parser.add_argument('--interior', type=int, default=200, help='side length of the interior region in cells')
+    parser.add_argument('--thicknesses', default='8,12,16,24,32,48,64', help='comma separated absorber thicknesses')
+    parser.add_argument('--width', type=float, default=4.0, help='width of the pulse in cells')
+    parser.add_argument('--engine', default='fused', help='field update engine')
+    args = parser.parse_args()
+
+    # long enough for the reflection of the farthest corner to travel back through the interior
+    speed = np.sqrt(laplacian_kernel_scale(np.array([[0.066, 0.184, 0.066], [0.184, -1.0, 0.184],
+                                                     [0.066, 0.184, 0.066]])))
+    num_steps = int(2.0 * args.interior / speed)
+    reference_margin = int(speed * num_steps) + 8
+    reference, _ = simulate(args.interior, reference_margin, None, 0, num_steps, args.width, args.engine)
+
+    # amplitude of the incident pulse when it arrives at the edge of the interior
+    edge = np.concatenate([reference[:, 0, :], reference[:, -1, :], reference[:, :, 0], reference[:, :, -1]], axis=1)
+    incident = np.abs(edge).max()
+
+    print(f"{'thickness':>10} {'sponge':>12} {'cpml':>12} {'cells (cpml)':>14} {'seconds (cpml)':>15}")
+    for thickness in [int(t) for t in args.thicknesses.split(',')]:
+        sponge, _ = simulate(args.interior, thickness, None, thickness, num_steps, args.width, args.engine)
+        cpml, elapsed = simulate(args.interior, thickness, CPMLBoundary(thickness), 0, num_steps, args.width,
+                                 args.engine)
+        size = args.interior + 2 * thickness
+        print(f'{thickness:>10} {np.abs(sponge - reference).max() / incident:12.2e} '
+              f'{np.abs(cpml - reference).max() / incident:12.2e} {size * size:>14} {elapsed:15.3f}')
+
+
+if __name__ == "__main__":
+    main()
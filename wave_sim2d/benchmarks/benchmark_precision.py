@@ -0,0 +1,70 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))  # noqa
+
+import time
+import argparse
+import numpy as np
+import wave_sim2d.wave_simulation as sim
+from wave_sim2d.engines import get_engine
+from wave_sim2d.scene_objects.source import PointSource
+from wave_sim2d.scene_objects.static_dampening import StaticDampening
+from wave_sim2d.scene_objects.static_refractive_index import StaticRefractiveIndexPolygon
+
+
+def build_scene(size):
+    """ point source in front of a lens shaped medium with a sponge border, similar to the examples """
+    c = size / 2
+    lens = [(c + size * 0.1, c - size * 0.25), (c + size * 0.2, c), (c + size * 0.1, c + size * 0.25)]
+    return [StaticDampening(np.ones((size, size)), 32),
+            StaticRefractiveIndexPolygon(lens, 1.5),
+            PointSource(c - size * 0.2, c, 0.1, 1.0)]
+
+
+def measure(size, engine, precision, backend, num_steps):
+    """ runs the scene and returns (field as float64 numpy array, cells/s, bytes per cell of the simulator fields) """
+    simulator = sim.WaveSimulator2D(size, size, build_scene(size), backend=backend, engine=get_engine(engine),
+                                    precision=precision)
+
+    # warm up (jit compilation, kernel compilation, memory pools)
+    simulator.run(3)
+    simulator.backend.synchronize()
+
+    start = time.perf_counter()
+    simulator.run(num_steps)
+    simulator.backend.synchronize()
+    elapsed = time.perf_counter() - start
+
+    # every buffer the step loop keeps per cell: the three rotating field buffers, the wave speed, the dampening and
+    # the coefficient read by the engines
+    fields = (simulator.u, simulator.u_prev, simulator.u_next, simulator.c, simulator.d, simulator.coefficient)
+    bytes_per_cell = sum(f.nbytes for f in fields) / (size * size)
+    return simulator.get_field().astype(np.float64), size * size * num_steps / elapsed, bytes_per_cell
+
+
+def main():
+    """
+    The float64 run of each engine is the reference of the reduced precision runs of the same engine, so the
+    error only contains the rounding of the storage and not the discretization error of the engine.
+    """
+    parser = argparse.ArgumentParser(description='Compares accuracy and throughput of the precision policies')
+    parser.add_argument('--backend', default=None, help="'numpy' or 'cupy', default: cupy if available")
+    parser.add_argument('--engines', default='convolution,fused', help='comma separated list of engines')
+    parser.add_argument('--precisions', default='float64,float32,float16', help='comma separated list of precisions')
+    parser.add_argument('--size', type=int, default=1024, help='grid side length')
+    parser.add_argument('--steps', type=int, default=500, help='number of simulated steps')
+    args = parser.parse_args()
+
+    print(f"{'engine':>12} {'precision':>10} {'error':>10} {'cells/s':>10} {'bytes/cell':>10}")
+    for engine in args.engines.split(','):
+        reference = None
+        for precision in args.precisions.split(','):
+            field, cells_per_second, bytes_per_cell = measure(args.size, engine, precision, args.backend, args.steps)
+            if reference is None:
+                reference = field
+            error = np.linalg.norm(field - reference) / np.linalg.norm(reference)
+            print(f'{engine:>12} {precision:>10} {error:10.3e} {cells_per_second:10.3e} {bytes_per_cell:10.1f}')
+
+
+if __name__ == "__main__":
+    main()
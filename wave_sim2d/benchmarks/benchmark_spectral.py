@@ -0,0 +1,88 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))  # noqa
+
+import time
+import argparse
+import numpy as np
+import scipy.fft
+import wave_sim2d.wave_simulation as sim
+from wave_sim2d.engines import get_engine, laplacian_kernel_scale
+
+
+def exact_solution(u0, t, speed):
+    """
+    exact solution of the continuous wave equation with zero boundary at time t for the initial field u0 at rest,
+    computed in the sine transform domain: u(t) = idst(dst(u0) * cos(speed * k * t))
+    """
+    h, w = u0.shape
+    ky = np.pi * np.arange(1, h + 1) / (h + 1)
+    kx = np.pi * np.arange(1, w + 1) / (w + 1)
+    k = np.sqrt(ky[:, None] ** 2 + kx[None, :] ** 2)
+    return scipy.fft.idstn(scipy.fft.dstn(u0, type=1) * np.cos(speed * k * t), type=1)
+
+
+def wave_packet(size, wavelength):
+    """ gaussian wave packet at rest in the center of the grid, travelling outwards with the given wavelength """
+    y, x = np.mgrid[0:size, 0:size].astype(np.float64) - size / 2
+    sigma = 2.0 * wavelength
+    return np.exp(-(x ** 2 + y ** 2) / (2 * sigma ** 2)) * np.cos(2 * np.pi * x / wavelength)
+
+
+def measure(engine, backend, cells_per_wavelength, domain_wavelengths, distance_wavelengths):
+    """
+    propagates a wave packet over the given distance and returns (grid size, relative L2 error, seconds)
+    """
+    # sine transforms are fastest for sizes where size + 1 has only small prime factors
+    size = scipy.fft.next_fast_len(int(round(domain_wavelengths * cells_per_wavelength)) + 1) - 1
+    simulator = sim.WaveSimulator2D(size, size, [], backend=backend, engine=get_engine(engine))
+
+    # the wave speed of the simulator in cells per step, given by the long wavelength limit of its laplacian kernel
+    speed = np.sqrt(laplacian_kernel_scale(simulator.laplacian_kernel)) * simulator.dt
+    num_steps = int(round(distance_wavelengths * cells_per_wavelength / speed))
+
+    # start with the exact fields at t=0 and t=-dt
+    u0 = wave_packet(size, cells_per_wavelength)
+    simulator.u[:] = simulator.backend.asarray(u0.astype(np.float32))
+    simulator.u_prev[:] = simulator.backend.asarray(exact_solution(u0, -simulator.dt, speed).astype(np.float32))
+
+    start = time.perf_counter()
+    simulator.run(num_steps)
+    simulator.backend.synchronize()
+    elapsed = time.perf_counter() - start
+
+    reference = exact_solution(u0, num_steps * simulator.dt, speed)
+    error = np.linalg.norm(simulator.get_field() - reference) / np.linalg.norm(reference)
+    return size, error, elapsed
+
+
+def main():
+    """
+    The wave packet is propagated in a homogeneous medium, where the exact solution is known. The spectral engine is
+    exact in this case up to the float32 rounding, heterogeneous media add an error growing with the contrast.
+    """
+    parser = argparse.ArgumentParser(description='Compares error and wall time of the stencil and spectral engines')
+    parser.add_argument('--backend', default=None, help="'numpy' or 'cupy', default: cupy if available")
+    parser.add_argument('--engines', default='fused,spectral', help='comma separated list of engines')
+    parser.add_argument('--resolutions', default='2.5,3,4,6,8,12,16',
+                        help='comma separated list of cells per wavelength')
+    parser.add_argument('--domain', type=float, default=32.0, help='grid side length in wavelengths')
+    parser.add_argument('--distance', type=float, default=8.0, help='propagation distance in wavelengths')
+    args = parser.parse_args()
+
+    engines = args.engines.split(',')
+    print(f"{'cells/wavelength':>16} {'size':>6} " + ' '.join(f'{e + " error":>18} {"seconds":>8}' for e in engines))
+
+    for resolution in [float(r) for r in args.resolutions.split(',')]:
+        results = []
+        for engine in engines:
+            # run once to exclude jit compilation and plan creation from the timing
+            measure(engine, args.backend, resolution, 4.0, 1.0)
+            size, error, elapsed = measure(engine, args.backend, resolution, args.domain, args.distance)
+            results.append((error, elapsed))
+
+        print(f'{resolution:>16} {size:>6} ' + ' '.join(f'{e:18.3e} {s:8.3f}' for e, s in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))  # noqa
+
+import json
+import time
+import platform
+import argparse
+import datetime
+import subprocess
+import numpy as np
+import wave_sim2d.wave_simulation as sim
+import wave_sim2d.wave_visualizer as vis
+from wave_sim2d.engines import get_engine
+from wave_sim2d.scene_objects.source import PointSource, LineSource
+from wave_sim2d.scene_objects.static_dampening import StaticDampening
+from wave_sim2d.scene_objects.static_refractive_index import StaticRefractiveIndexPolygon
+from wave_sim2d.scene_objects.static_image_scene import StaticImageScene
+from wave_sim2d.scene_objects.strain_refractive_index import StrainRefractiveIndex
+
+
+def time_per_call(function, backend, min_calls=5, min_seconds=0.5, repeats=3):
+    """
+    returns the seconds per call of the function. After one warm up call (jit compilation, kernel compilation and
+    memory pools) the function is called in several batches until both the minimal number of calls and the minimal
+    time per batch are reached, the fastest batch is the least disturbed by other processes.
+    """
+    function()
+    backend.synchronize()
+
+    best = float('inf')
+    for i in range(repeats):
+        calls = 0
+        start = time.perf_counter()
+        while calls < min_calls or time.perf_counter() - start < min_seconds / repeats:
+            function()
+            calls += 1
+        backend.synchronize()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+
+def image_scene(size):
+    """ RGB scene image with a lens, an absorbing corner and a few green source pixels """
+    image = np.zeros((size, size, 3), dtype=np.uint8)
+    image[:, :, 0] = 100
+    y, x = np.mgrid[0:size, 0:size]
+    image[(x - size * 0.6) ** 2 + (y - size * 0.5) ** 2 < (size * 0.2) ** 2, 0] = 150
+    image[:size // 8, :size // 8, 2] = 128
+    image[size // 2 - 4:size // 2 + 4, size // 4, 1] = 40
+    return image
+
+
+def scene_objects(size):
+    """ factories of the scene objects measured by the suite, each returns the scene of a size x size grid """
+    c = size / 2
+    lens = [(c + size * 0.1, c - size * 0.25), (c + size * 0.2, c), (c + size * 0.1, c + size * 0.25)]
+    return {'StaticDampening': lambda: [StaticDampening(np.ones((size, size)), 32)],
+            'StaticRefractiveIndexPolygon': lambda: [StaticRefractiveIndexPolygon(lens, 1.5)],
+            'LineSource': lambda: [LineSource((c, c - size * 0.25), (c, c + size * 0.25), 0.1, 1.0)],
+            'StaticImageScene': lambda: [StaticImageScene(image_scene(size))],
+            'StrainRefractiveIndex': lambda: [PointSource(c, c, 0.1, 1.0), StrainRefractiveIndex(1.0, 0.1)]}
+
+
+def benchmark_update_field(size, engines, backend, min_seconds):
+    """ cells/s of WaveSimulator2D.update_field for each engine """
+    results = []
+    initial_field = np.random.rand(size, size).astype(np.float32)
+    for engine in engines:
+        simulator = sim.WaveSimulator2D(size, size, [], initial_field=initial_field, backend=backend,
+                                        engine=get_engine(engine))
+        seconds = time_per_call(simulator.update_field, simulator.backend, min_seconds=min_seconds)
+        results.append({'benchmark': 'update_field', 'variant': engine, 'size': size, 'seconds': seconds,
+                        'cells_per_second': size * size / seconds})
+    return results
+
+
+def benchmark_update_scene(size, backend, min_seconds):
+    """ per step cost of WaveSimulator2D.update_scene and the cost of the first rendering for each scene object """
+    results = []
+    for name, make_scene in scene_objects(size).items():
+        simulator = sim.WaveSimulator2D(size, size, make_scene(), backend=backend)
+
+        # the first update renders (and bakes) the scene
+        start = time.perf_counter()
+        simulator.update_scene()
+        simulator.backend.synchronize()
+        first_seconds = time.perf_counter() - start
+
+        def step():
+            simulator.update_scene()
+            simulator.t += simulator.dt
+
+        seconds = time_per_call(step, simulator.backend, min_seconds=min_seconds)
+        results.append({'benchmark': 'update_scene', 'variant': name, 'size': size, 'seconds': seconds,
+                        'first_render_seconds': first_seconds})
+    return results
+
+
+def benchmark_visualizer(size, backend, min_seconds):
+    """ per frame cost of WaveVisualizer.update and of render_field / render_intensity """
+    field_colormap = vis.get_colormap_lut('colormap_wave1', invert=False, black_level=-0.05)
+    intensity_colormap = vis.get_colormap_lut('afmhot', invert=False, black_level=0.0)
+    simulator = sim.WaveSimulator2D(size, size, [PointSource(size / 2, size / 2, 0.1, 1.0)], backend=backend,
+                                    initial_field=np.random.rand(size, size).astype(np.float32))
+    visualizer = vis.WaveVisualizer(field_colormap=field_colormap, intensity_colormap=intensity_colormap)
+    visualizer.update(simulator)
+
+    results = []
+    for name, function in [('update', lambda: visualizer.update(simulator)),
+                           ('render_field', lambda: visualizer.render_field(1.0)),
+                           ('render_intensity', lambda: visualizer.render_intensity(1.0))]:
+        seconds = time_per_call(function, simulator.backend, min_seconds=min_seconds)
+        results.append({'benchmark': 'visualizer', 'variant': name, 'size': size, 'seconds': seconds,
+                        'frames_per_second': 1.0 / seconds})
+    return results
+
+
+def metadata(backend):
+    """ description of the measured code and machine, stored with the results """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(__file__), capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit,
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'backend': sim.get_backend(backend).name,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count()}
+
+
+def result_key(result):
+    return result['benchmark'], result['variant'], result['size']
+
+
+def compare(results, baseline_path, tolerance):
+    """ prints the ratio of the seconds of the results to a baseline file, returns the number of regressions """
+    with open(baseline_path) as f:
+        baseline = {result_key(r): r for r in json.load(f)['results']}
+
+    regressions = 0
+    print(f"\n{'benchmark':>14} {'variant':>30} {'size':>6} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for result in results:
+        base = baseline.get(result_key(result))
+        if base is None:
+            continue
+        ratio = result['seconds'] / base['seconds']
+        flag = ''
+        if ratio > 1.0 + tolerance:
+            flag = '  slower'
+            regressions += 1
+        elif ratio < 1.0 - tolerance:
+            flag = '  faster'
+        print(f"{result['benchmark']:>14} {result['variant']:>30} {result['size']:>6} {base['seconds']:10.3e} "
+              f"{result['seconds']:10.3e} {ratio:7.2f}{flag}")
+    return regressions
+
+
+def main():
+    """
+    Runs all benchmarks for each grid size and writes the results as JSON. Results of two commits are compared with
+    --compare, the seconds of each benchmark are matched by (benchmark, variant, size).
+    """
+    parser = argparse.ArgumentParser(description='Benchmark suite of the solver, the scene objects and the visualizer')
+    parser.add_argument('--backend', default=None, help="'numpy' or 'cupy', default: cupy if available")
+    parser.add_argument('--engines', default='convolution,fused', help='comma separated list of engines')
+    parser.add_argument('--sizes', default='256,512,1024,2048,4096,8192', help='comma separated list of grid sizes')
+    parser.add_argument('--benchmarks', default='update_field,update_scene,visualizer',
+                        help='comma separated list of benchmarks')
+    parser.add_argument('--min-seconds', type=float, default=0.5, help='minimal measured time per benchmark')
+    parser.add_argument('--output', default='benchmark_results.json', help='output JSON file')
+    parser.add_argument('--compare', default=None, help='JSON file of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='relative change reported as regression')
+    args = parser.parse_args()
+
+    benchmarks = {'update_field': lambda size: benchmark_update_field(size, args.engines.split(','), args.backend,
+                                                                      args.min_seconds),
+                  'update_scene': lambda size: benchmark_update_scene(size, args.backend, args.min_seconds),
+                  'visualizer': lambda size: benchmark_visualizer(size, args.backend, args.min_seconds)}
+
+    results = []
+    print(f"{'benchmark':>14} {'variant':>30} {'size':>6} {'seconds':>10}")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        for name in args.benchmarks.split(','):
+            for result in benchmarks[name](size):
+                print(f"{result['benchmark']:>14} {result['variant']:>30} {size:>6} {result['seconds']:10.3e}")
+                results.append(result)
+
+    with open(args.output, 'w') as f:
+        json.dump({'meta': metadata(args.backend), 'results': results}, f, indent=2)
+    print(f'results written to {args.output}')
+
+    if args.compare is not None:
+        regressions = compare(results, args.compare, args.tolerance)
+        sys.exit(1 if regressions > 0 else 0)
+
+
+if __name__ == "__main__":
+    main()
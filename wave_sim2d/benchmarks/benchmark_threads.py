@@ -0,0 +1,44 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))  # noqa
+
+import argparse
+import numpy as np
+import wave_sim2d.wave_simulation as sim
+from wave_sim2d.engines import FusedEngine, TiledEngine
+from wave_sim2d.benchmarks.benchmark_update_field import measure_cells_per_second
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures the thread scaling of the tiled CPU engine')
+    parser.add_argument('--size', type=int, default=2048, help='grid side length')
+    parser.add_argument('--max-threads', type=int, default=os.cpu_count(), help='largest number of threads')
+    parser.add_argument('--tile-rows', type=int, default=None, help='rows per tile, default: one tile per thread')
+    parser.add_argument('--steps', type=int, default=20, help='number of measured steps per run')
+    args = parser.parse_args()
+
+    initial_field = np.random.rand(args.size, args.size).astype(np.float32)
+
+    # single threaded reference for speedup and bit-exactness
+    reference = sim.WaveSimulator2D(args.size, args.size, [], initial_field=initial_field, backend='numpy',
+                                    engine=FusedEngine())
+    reference_rate = measure_cells_per_second(reference, args.steps)
+    print(f'fused (1 thread): {reference_rate:.3e} cells/s')
+
+    thread_counts = sorted({2**i for i in range(args.max_threads.bit_length()) if 2**i <= args.max_threads} |
+                           {args.max_threads})
+
+    print(f"{'threads':>8} {'cells/s':>12} {'speedup':>8} {'bit-identical':>14}")
+    for threads in thread_counts:
+        engine = TiledEngine(num_threads=threads, tile_rows=args.tile_rows)
+        simulator = sim.WaveSimulator2D(args.size, args.size, [], initial_field=initial_field, backend='numpy',
+                                        engine=engine)
+        rate = measure_cells_per_second(simulator, args.steps)
+        identical = np.array_equal(simulator.u, reference.u) and np.array_equal(simulator.u_prev, reference.u_prev)
+        engine.close()
+
+        print(f'{threads:>8} {rate:12.3e} {rate / reference_rate:8.2f} {str(identical):>14}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))  # noqa
+
+import time
+import argparse
+import numpy as np
+import wave_sim2d.wave_simulation as sim
+from wave_sim2d.engines import get_engine
+
+
+def measure_cells_per_second(simulator, num_steps):
+    """
+    runs the field update of the simulator and returns the achieved number of cell updates per second
+    """
+    # warm up (jit compilation, kernel compilation, memory pools)
+    for i in range(3):
+        simulator.update_field()
+    simulator.backend.synchronize()
+
+    start = time.perf_counter()
+    for i in range(num_steps):
+        simulator.update_field()
+    simulator.backend.synchronize()
+    elapsed = time.perf_counter() - start
+
+    h, w = simulator.u.shape
+    return w * h * num_steps / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures cells/second of the field update engines')
+    parser.add_argument('--backend', default=None, help="'numpy' or 'cupy', default: cupy if available")
+    parser.add_argument('--engines', default='convolution,fused', help='comma separated list of engines')
+    parser.add_argument('--sizes', default='256,512,1024,2048', help='comma separated list of grid side lengths')
+    parser.add_argument('--steps', type=int, default=20, help='number of measured steps per run')
+    args = parser.parse_args()
+
+    engines = args.engines.split(',')
+    print(f"{'size':>8} " + ' '.join(f'{e:>16}' for e in engines) + '   (cells/s)')
+
+    for size in [int(s) for s in args.sizes.split(',')]:
+        results = []
+        for engine in engines:
+            simulator = sim.WaveSimulator2D(size, size, [], backend=args.backend, engine=get_engine(engine))
+            simulator.u[:] = simulator.backend.asarray(np.random.rand(size, size).astype(np.float32))
+            results.append(measure_cells_per_second(simulator, args.steps))
+
+        print(f'{size:>8} ' + ' '.join(f'{r:16.3e}' for r in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import numpy as np
+from wave_sim2d.backend import backend_of
+from wave_sim2d.engines import laplacian_kernel_scale
+from wave_sim2d.precision import compute_dtype
+
+
+class CPMLBoundary:
+    """
+    Convolutional perfectly matched layer (CPML) at the four borders of the grid, following the second order
+    formulation of Pasalic and McGarry for the scalar wave equation. Inside a layer of the given thickness the
+    wave equation is extended by auxiliary fields psi and zeta per direction:
+        u_tt = c**2 * (laplacian(u) + d/dx(psi_x) + zeta_x + d/dy(psi_y) + zeta_y)
+        psi_x = b * psi_x + a * du/dx
+        zeta_x = b * zeta_x + a * (d2u/dx2 + d/dx(psi_x))
+    with b = exp(-(sigma + alpha) * dt) and a = sigma / (sigma + alpha) * (b - 1). The damping profile sigma rises
+    polynomially towards the outer edge, the frequency shift alpha falls linearly, which damps the low frequencies
+    and grazing waves less aggressively and avoids their late time growth. psi lives on the faces between the cells,
+    so d/dx(du/dx + psi_x) is evaluated with the same compact stencil as d2u/dx2. The 3x3 laplacian kernel of the
+    simulator is the sum of the second differences of each axis smoothed along the other axis with [beta, 1 - 2 *
+    beta, beta], the layer terms are smoothed the same way, otherwise the layer becomes unstable.
+    Outgoing waves are absorbed with reflections of about the given reflection coefficient in 8-16 cells, where a
+    sponge (dampening field) needs several times more. The simulator adds the correction of the layer to the field
+    computed by the engine, so the boundary works with every engine and only costs work on the border strips.
+    The damping profile is scaled for the speed of waves in vacuum (c = 1.0), media of moderate refractive index
+    inside the layer are absorbed as well.
+    The layer replaces the border of StaticDampening, use a border thickness of 0 when the boundary is enabled.
+    """
+    def __init__(self, thickness=12, reflection=1e-4, order=2, alpha=0.05):
+        """
+        @param thickness: Thickness of the layer in cells.
+        @param reflection: Theoretical reflection coefficient of the layer at normal incidence.
+        @param order: Order of the polynomial damping profile.
+        @param alpha: Maximal frequency shift (at the inner edge of the layer), about half the angular frequency
+                      of the sources works well.
+        """
+        self.thickness = thickness
+        self.reflection = reflection
+        self.order = order
+        self.alpha = alpha
+        self._strips = None
+        self._profile_key = None
+        self._kernel = None
+        self._scale = None
+        self._beta = None
+
+    def _profile(self, depth, n, speed, dt, backend, dtype):
+        """ returns the coefficients (a, b) at the given relative depths (0 to 1) into a layer of n cells """
+        sigma_max = -(self.order + 1) * speed * np.log(self.reflection) / (2.0 * n)
+        sigma = sigma_max * depth ** self.order
+        alpha = self.alpha * (1.0 - depth)
+        b = np.exp(-(sigma + alpha) * dt)
+        a = np.where(sigma > 0, sigma / np.maximum(sigma + alpha, 1e-30) * (b - 1.0), 0.0)
+        return backend.asarray(a, dtype=dtype), backend.asarray(b, dtype=dtype)
+
+    def _get_strips(self, u, laplacian_kernel, dt):
+        """
+        Returns the four strips (axis, start, end, cell coefficients, face coefficients, psi, zeta, halo buffer).
+        Strips of the y axis refer to the transposed field. The auxiliary fields are kept as long as the grid stays
+        the same, the profiles follow the time step and the laplacian kernel.
+        """
+        key = (u.shape, u.dtype, dt)
+        if self._strips is not None and self._profile_key == key and laplacian_kernel is self._kernel:
+            return self._strips
+
+        # the kernel is copied to the host only here, not in every step
+        backend = backend_of(u)
+        dtype = compute_dtype(u.dtype)
+        shape = u.shape
+        self._kernel = laplacian_kernel
+        self._scale = laplacian_kernel_scale(laplacian_kernel)
+        self._beta = float(backend_of(laplacian_kernel).to_numpy(laplacian_kernel)[0, 0]) / (2.0 * self._scale)
+        speed = float(np.sqrt(self._scale))
+
+        h, w = shape[-2:]
+        n = min(self.thickness, h // 2, w // 2)
+
+        # depths of the n cells and of their n + 1 faces, the outer face is at depth 1 and the inner face at depth 0,
+        # so psi vanishes at the inner edge of the layer
+        cells = self._profile((n - 0.5 - np.arange(n)) / n, n, speed, dt, backend, dtype)
+        faces = self._profile((n - np.arange(n + 1)) / n, n, speed, dt, backend, dtype)
+        keep_fields = self._strips is not None and self._profile_key[:2] == (shape, u.dtype)
+
+        strips = []
+        for i, (axis, size) in enumerate([(-1, w), (-1, w), (-2, h), (-2, h)]):
+            start, end = (0, n) if i % 2 == 0 else (size - n, size)
+            # the coefficients are ordered from the outer edge, the strips at the end of an axis are mirrored
+            if i % 2 == 0:
+                strip_cells, strip_faces = cells, faces
+            else:
+                strip_cells, strip_faces = [tuple(c[::-1].copy() for c in coefficients)
+                                            for coefficients in (cells, faces)]
+            other = h if axis == -1 else w
+            if keep_fields:
+                psi, zeta, halo = self._strips[i][5:]
+            else:
+                psi = backend.xp.zeros(shape[:-2] + (other, n + 1), dtype=dtype)
+                zeta = backend.xp.zeros(shape[:-2] + (other, n), dtype=dtype)
+                # field of the strip with a one cell halo, the halo cells outside the grid are never written and
+                # stay zero
+                halo = backend.xp.zeros(shape[:-2] + (other, n + 2), dtype=dtype)
+            strips.append((axis, start, end, strip_cells, strip_faces, psi, zeta, halo))
+
+        self._strips = strips
+        self._profile_key = key
+        return strips
+
+    def apply(self, u, out, coefficient, laplacian_kernel, dt):
+        """
+        Adds the layer terms to the field 'out' of the next step, computed by the engine from the current field u.
+        """
+        strips = self._get_strips(u, laplacian_kernel, dt)
+        scale, beta = self._scale, self._beta
+
+        for axis, start, end, (a, b), (a_face, b_face), psi, zeta, p in strips:
+            # the strips of the y axis work on transposed views, so the derivatives are always along the last axis
+            view_u, view_out, view_c = [x if axis == -1 else x.swapaxes(-1, -2) for x in (u, out, coefficient)]
+            size = view_u.shape[-1]
+
+            # field of the strip with a one cell halo, zero outside the grid
+            lo, hi = max(start - 1, 0), min(end + 1, size)
+            p[..., lo - start + 1:hi - start + 1] = view_u[..., lo:hi]
+
+            # psi on the faces, from the difference of the neighbouring cells
+            psi *= b_face
+            psi += a_face * (p[..., 1:] - p[..., :-1])
+            dpsi = psi[..., 1:] - psi[..., :-1]
+
+            zeta *= b
+            zeta += a * (p[..., 2:] - 2.0 * p[..., 1:-1] + p[..., :-2] + dpsi)
+
+            # smoothing across the strip, like the second difference of the laplacian kernel
+            terms = dpsi + zeta
+            smoothed = terms * (1.0 - 2.0 * beta)
+            smoothed[..., 1:, :] += beta * terms[..., :-1, :]
+            smoothed[..., :-1, :] += beta * terms[..., 1:, :]
+
+            view_out[..., start:end] += (scale * view_c[..., start:end]) * smoothed
+
+    def get_pixels(self, shape):
+        """ returns the (y, x) numpy coordinates of the cells of the layer in a grid of the given (h, w) shape """
+        h, w = shape
+        n = min(self.thickness, h // 2, w // 2)
+        mask = np.zeros((h, w), dtype=bool)
+        mask[:n] = mask[-n:] = True
+        mask[:, :n] = mask[:, -n:] = True
+        return np.nonzero(mask)
+
+    def reset(self):
+        """ clears the auxiliary fields """
+        self._strips = None
+        self._profile_key = None
+        self._kernel = None
+
+    def get_state(self):
+        """ returns a copy of the auxiliary fields as dictionary of numpy arrays """
+        if self._strips is None:
+            return {}
+        state = {}
+        for i, strip in enumerate(self._strips):
+            backend = backend_of(strip[5])
+            state[f'psi_{i}'] = backend.to_numpy(strip[5].copy())
+            state[f'zeta_{i}'] = backend.to_numpy(strip[6].copy())
+        return state
+
+    def set_state(self, state, u, laplacian_kernel, dt):
+        """ restores the auxiliary fields returned by get_state for the given simulator fields """
+        self.reset()
+        if not state:
+            return
+        backend = backend_of(u)
+        for i, strip in enumerate(self._get_strips(u, laplacian_kernel, dt)):
+            strip[5][:] = backend.asarray(state[f'psi_{i}'])
+            strip[6][:] = backend.asarray(state[f'zeta_{i}'])
+
+
+def get_boundary(boundary=None):
+    """
+    Returns a boundary.
+    @param boundary: None for the zero (reflecting) boundary of the field, 'cpml' or a CPMLBoundary instance.
+    """
+    if boundary is None or isinstance(boundary, CPMLBoundary):
+        return boundary
+    if boundary == 'cpml':
+        return CPMLBoundary()
+    raise ValueError(f'unknown boundary: {boundary}')
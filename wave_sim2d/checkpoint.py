@@ -0,0 +1,81 @@
+import os
+import json
+import numpy as np
+
+_FORMAT_VERSION = 1
+_VISUALIZER_PREFIX = 'visualizer.'
+
+
+def _npz_path(path):
+    """ file name of an .npz checkpoint, np.savez appends the suffix if it is missing """
+    path = os.fspath(path)
+    return path if path.endswith('.npz') else path + '.npz'
+
+
+def save_checkpoint(path, simulator, visualizer=None, compressed=False, memmap=False):
+    """
+    Writes the state of a simulator (see WaveSimulator2D.get_state) and optionally the intensity accumulator of a
+    visualizer to a checkpoint.
+    @param path: File name of the checkpoint (.npz, appended if missing) or directory name for memmap checkpoints.
+    @param simulator: The simulator.
+    @param visualizer: Optional WaveVisualizer whose state is stored with the simulator.
+    @param compressed: Compress the arrays of an .npz checkpoint (smaller, but slower to write and read).
+    @param memmap: Write a directory with one .npy file per array and a meta.json instead of an .npz file. The
+                   arrays of such checkpoints are memory mapped when loaded, so reading is limited by the disk only.
+    """
+    state = simulator.get_state()
+    if visualizer is not None:
+        state.update({_VISUALIZER_PREFIX + key: value for key, value in visualizer.get_state().items()})
+    state['format_version'] = np.int64(_FORMAT_VERSION)
+
+    if memmap:
+        os.makedirs(path, exist_ok=True)
+        for key, value in state.items():
+            np.save(os.path.join(path, key + '.npy'), value)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'format_version': _FORMAT_VERSION, 'arrays': sorted(state.keys())}, f, indent=2)
+    elif compressed:
+        np.savez_compressed(_npz_path(path), **state)
+    else:
+        np.savez(_npz_path(path), **state)
+
+
+def read_checkpoint(path, mmap=True):
+    """
+    Reads a checkpoint written by save_checkpoint.
+    @param path: File or directory name of the checkpoint, as passed to save_checkpoint.
+    @param mmap: Memory map the arrays of directory checkpoints instead of reading them.
+    @return: Dictionary of numpy arrays.
+    """
+    if os.path.isdir(path):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        mmap_mode = 'r' if mmap else None
+        state = {key: np.load(os.path.join(path, key + '.npy'), mmap_mode=mmap_mode) for key in meta['arrays']}
+    else:
+        with np.load(_npz_path(path)) as data:
+            state = {key: data[key] for key in data.files}
+
+    version = int(state.pop('format_version', 0))
+    if version != _FORMAT_VERSION:
+        raise ValueError(f'unsupported checkpoint version {version} in {path}')
+    return state
+
+
+def load_checkpoint(path, simulator, visualizer=None, mmap=True):
+    """
+    Restores a checkpoint into a simulator. The simulator has to be created with the same grid size and scene as
+    the one the checkpoint was written from, e.g. by calling the same scene builder. Restoring the same checkpoint
+    into several simulators forks independent runs from one warmed up state.
+    @param path: File or directory name of the checkpoint.
+    @param simulator: The simulator to restore.
+    @param visualizer: Optional WaveVisualizer whose intensity accumulator is restored as well.
+    @param mmap: Memory map the arrays of directory checkpoints, see read_checkpoint.
+    """
+    state = read_checkpoint(path, mmap=mmap)
+    visualizer_state = {key[len(_VISUALIZER_PREFIX):]: state.pop(key) for key in list(state.keys())
+                        if key.startswith(_VISUALIZER_PREFIX)}
+
+    simulator.set_state(state)
+    if visualizer is not None:
+        visualizer.set_state(visualizer_state, simulator.backend)
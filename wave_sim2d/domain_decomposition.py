@@ -0,0 +1,198 @@
+import weakref
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from wave_sim2d.engines import FieldUpdateEngine, _update_rows
+from wave_sim2d.precision import compute_dtype
+
+# layout of the shared command block, written by the coordinating process before each step
+_CMD_OPERATION = 0
+_CMD_ARRAYS = slice(1, 6)          # indices of u, u_prev, coefficient, d and out in the list of shared fields
+_CMD_DAMPENING = 6
+_CMD_KERNEL = slice(7, 16)
+_CMD_SIZE = 16
+
+_OP_STEP = 1
+_OP_STOP = 2
+
+
+def _attach_shared_memory(name):
+    """ attaches to an existing shared memory block, the creating process stays responsible for unlinking it """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # python < 3.13 registers attached blocks as well, workers share the resource tracker of the coordinating
+        # process, so the duplicate registration is dropped when the coordinating process unlinks the block
+        return shared_memory.SharedMemory(name=name)
+
+
+def _update_strip(fields, command, row_start, row_end):
+    """ advances the rows [row_start, row_end) as described by the command block """
+    u, u_prev, coefficient, d, out = [fields[int(i)] for i in command[_CMD_ARRAYS]]
+    k = command[_CMD_KERNEL].reshape(3, 3).astype(compute_dtype(u.dtype))
+    _update_rows(u, u_prev, coefficient, d, k.dtype.type(command[_CMD_DAMPENING]), k, out, row_start, row_end)
+
+
+def _strip_worker(field_names, command_name, shape, dtype, barrier, row_start, row_end):
+    """ main loop of a worker process, each step is enclosed by two barrier waits """
+    blocks = [_attach_shared_memory(name) for name in field_names]
+    command_block = _attach_shared_memory(command_name)
+    fields = [np.ndarray(shape, dtype=dtype, buffer=block.buf) for block in blocks]
+    command = np.ndarray((_CMD_SIZE,), dtype=np.float64, buffer=command_block.buf)
+
+    try:
+        while True:
+            barrier.wait()
+            if command[_CMD_OPERATION] == _OP_STOP:
+                break
+            _update_strip(fields, command, row_start, row_end)
+            barrier.wait()
+    except Exception:
+        barrier.abort()
+        raise
+    finally:
+        del fields, command
+        for block in blocks + [command_block]:
+            block.close()
+
+
+def _release(processes, barrier, command, blocks):
+    """ stops the workers and frees the shared memory, also used as finalizer """
+    if processes:
+        command[_CMD_OPERATION] = _OP_STOP
+        try:
+            barrier.wait(timeout=10.0)
+        except Exception:
+            pass
+        for process in processes:
+            process.join(timeout=10.0)
+            if process.is_alive():
+                process.terminate()
+        processes.clear()
+    for block in blocks:
+        try:
+            block.close()
+        except BufferError:
+            # arrays of the simulator still map the block, the memory is freed once they are gone
+            pass
+        block.unlink()
+    blocks.clear()
+
+
+class StripDecompositionEngine(FieldUpdateEngine):
+    """
+    Multi-process CPU engine for grids that are too large for the memory bandwidth of one process. The domain is
+    split into horizontal strips, each advanced by its own process (the coordinating process computes the first
+    strip). All fields the engine touches live in multiprocessing shared memory, so the simulator, the scene
+    objects and the workers operate on the same memory and no field data is sent between processes. Each strip
+    reads its one row halo from the neighbouring strips directly in shared memory, two barriers per step make sure
+    halos are only read after all strips finished the previous step.
+    Only runs on the numpy backend. Call close() to stop the workers and free the shared memory.
+    """
+
+    def __init__(self, num_processes=None, start_method=None):
+        """
+        @param num_processes: Number of strips (and processes), defaults to the number of CPU cores.
+        @param start_method: Multiprocessing start method of the workers, defaults to the platform default.
+        """
+        self.num_processes = num_processes if num_processes is not None else multiprocessing.cpu_count()
+        self._context = multiprocessing.get_context(start_method)
+        self._blocks = []
+        self._fields = []
+        self._processes = []
+        self._barrier = None
+        self._command_block = None
+        self._command = None
+        self._finalizer = None
+        self._strips = None
+        self._failed = False
+
+    def allocate_field(self, shape, dtype, backend):
+        if backend.is_gpu:
+            raise RuntimeError('the strip decomposition engine only runs on the numpy backend')
+        if self._processes:
+            raise RuntimeError('fields can not be added after the workers were started')
+
+        dtype = np.dtype(dtype)
+        block = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+        field = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        field.fill(0)
+
+        self._blocks.append(block)
+        self._fields.append(field)
+        return field
+
+    def _index_of(self, array):
+        for i, field in enumerate(self._fields):
+            if field is array:
+                return i
+        raise ValueError('the strip decomposition engine can only update fields it allocated itself')
+
+    def _start_workers(self, shape, dtype):
+        h = shape[0]
+        num_strips = max(1, min(self.num_processes, h))
+        bounds = np.linspace(0, h, num_strips + 1).round().astype(int)
+        self._strips = list(zip(bounds[:-1], bounds[1:]))
+
+        self._command_block = shared_memory.SharedMemory(create=True, size=_CMD_SIZE * 8)
+        self._blocks.append(self._command_block)
+        self._command = np.ndarray((_CMD_SIZE,), dtype=np.float64, buffer=self._command_block.buf)
+        self._barrier = self._context.Barrier(num_strips)
+
+        field_names = [block.name for block in self._blocks[:len(self._fields)]]
+        for row_start, row_end in self._strips[1:]:
+            process = self._context.Process(target=_strip_worker, daemon=True,
+                                            args=(field_names, self._command_block.name, shape, dtype,
+                                                  self._barrier, row_start, row_end))
+            process.start()
+            self._processes.append(process)
+
+        self._finalizer = weakref.finalize(self, _release, self._processes, self._barrier, self._command,
+                                           self._blocks)
+
+    def step(self, u, u_prev, coefficient, d, global_dampening, laplacian_kernel, out):
+        if u.ndim != 2:
+            raise ValueError('the strip decomposition engine does not support ensembles')
+        if self._failed:
+            raise RuntimeError('the workers of the strip decomposition engine were stopped after a failed step')
+        if self._command is None:
+            self._start_workers(u.shape, u.dtype)
+
+        command = self._command
+        command[_CMD_OPERATION] = _OP_STEP
+        command[_CMD_ARRAYS] = [self._index_of(a) for a in (u, u_prev, coefficient, d, out)]
+        command[_CMD_DAMPENING] = global_dampening
+        command[_CMD_KERNEL] = np.asarray(laplacian_kernel, dtype=np.float64).ravel()
+
+        try:
+            if self._processes:
+                self._barrier.wait()
+
+            row_start, row_end = self._strips[0]
+            _update_strip(self._fields, command, row_start, row_end)
+
+            if self._processes:
+                self._barrier.wait()
+        except BaseException:
+            # the workers would wait for the coordinating process forever
+            self._abort()
+            raise
+
+    def _abort(self):
+        """ breaks the barrier and terminates the workers after a failed step, the shared memory stays mapped """
+        self._failed = True
+        if self._barrier is not None:
+            self._barrier.abort()
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            process.join()
+        self._processes.clear()
+
+    def close(self):
+        """ stops the worker processes and releases the shared memory """
+        self._fields = []
+        if self._finalizer is not None:
+            self._finalizer()
+        else:
+            _release(self._processes, self._barrier, self._command, self._blocks)
@@ -0,0 +1,598 @@
+import os
+import numpy as np
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from wave_sim2d.backend import backend_of
+from wave_sim2d.precision import compute_dtype, as_compute
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def _jit(func):
+    """ compiles a function with numba if it is installed, functions stay plain python otherwise """
+    if numba is None:
+        return func
+    return numba.njit(cache=True, nogil=True)(func)
+
+
+class FieldUpdateEngine(ABC):
+    """
+    Interface for field update engines. An engine advances the wave equation by one time step:
+        out = u + (u - u_prev) * d * global_dampening + laplacian(u) * coefficient
+    where the laplacian is the 3x3 convolution with the simulators laplacian kernel and zero boundary and the
+    coefficient is the precomputed wave speed term (c * dt)**2. The arrays have the shape (h, w), or (batch, h, w)
+    for ensembles of independent simulations, which are all advanced in the same pass. Fields stored in reduced
+    precision (float16) are computed in their compute dtype (see wave_sim2d.precision).
+    """
+
+    @abstractmethod
+    def step(self, u, u_prev, coefficient, d, global_dampening, laplacian_kernel, out):
+        """ computes the field of the next time step and writes it to 'out' """
+        pass
+
+    def allocate_field(self, shape, dtype, backend):
+        """
+        Allocates a zero initialized array for one of the fields the engine reads or writes (field buffers,
+        coefficient and dampening). Engines can override this to place the fields in special memory.
+        """
+        return backend.xp.zeros(shape, dtype=dtype)
+
+    def set_source_pixels(self, ys, xs):
+        """
+        Called by the simulator with the (y, x) numpy coordinates of the pixels the scene writes to the field each
+        step, or None if objects of the scene may write anywhere. Engines that skip work use it, the default
+        ignores it.
+        """
+        pass
+
+    def invalidate(self):
+        """ called when the field buffers were modified outside of step(), e.g. when a state is restored """
+        pass
+
+    def coefficient_changed(self):
+        """
+        Called by the simulator whenever the coefficient field was recomputed (scene rendering or a new time step).
+        Engines that derive values from the coefficient use it to update them, the default ignores it.
+        """
+        pass
+
+
+class ConvolutionEngine(FieldUpdateEngine):
+    """
+    Reference engine using a full grid convolution and array expressions. Runs on every backend, but needs
+    several passes over memory and allocates temporaries each step.
+    """
+
+    def step(self, u, u_prev, coefficient, d, global_dampening, laplacian_kernel, out):
+        backend = backend_of(u)
+        u, u_prev, coefficient, d = [as_compute(a) for a in (u, u_prev, coefficient, d)]
+
+        # calculate laplacian using convolution
+        laplacian = backend.convolve2d(u, laplacian_kernel)
+
+        # update field
+        v = (u - u_prev) * d * global_dampening
+        out[:] = (u + v + laplacian * coefficient)
+
+
+@_jit
+def _fused_update_rows(u, u_prev, coefficient, d, global_dampening, k, out, row_start, row_end):
+    """ fused stencil update of the rows [row_start, row_end) in a single pass, cells outside the grid are zero """
+    h, w = u.shape
+    zero_row = np.zeros(w, dtype=u.dtype)
+    k00, k01, k02 = k[0, 0], k[0, 1], k[0, 2]
+    k10, k11, k12 = k[1, 0], k[1, 1], k[1, 2]
+    k20, k21, k22 = k[2, 0], k[2, 1], k[2, 2]
+
+    for y in range(row_start, row_end):
+        up = u[y - 1] if y > 0 else zero_row
+        mid = u[y]
+        down = u[y + 1] if y < h - 1 else zero_row
+
+        for x in range(w):
+            left = x - 1 if x > 0 else -1
+            right = x + 1 if x < w - 1 else -1
+
+            laplacian = k01 * up[x] + k11 * mid[x] + k21 * down[x]
+            if left >= 0:
+                laplacian += k00 * up[left] + k10 * mid[left] + k20 * down[left]
+            if right >= 0:
+                laplacian += k02 * up[right] + k12 * mid[right] + k22 * down[right]
+
+            out[y, x] = mid[x] + (mid[x] - u_prev[y, x]) * d[y, x] * global_dampening + laplacian * coefficient[y, x]
+
+
+def _numpy_update_rows(u, u_prev, coefficient, d, global_dampening, k, out, row_start, row_end):
+    """ numpy version of _fused_update_rows, used when numba is not available """
+    h, w = u.shape
+    n = row_end - row_start
+
+    # copy the rows and their one cell halo into a zero padded block
+    block = np.zeros((n + 2, w + 2), dtype=u.dtype)
+    y0 = max(row_start - 1, 0)
+    y1 = min(row_end + 1, h)
+    block[y0 - row_start + 1:y1 - row_start + 1, 1:-1] = u[y0:y1]
+
+    laplacian = np.zeros((n, w), dtype=u.dtype)
+    for ky in range(3):
+        for kx in range(3):
+            laplacian += k[ky, kx] * block[ky:ky + n, kx:kx + w]
+
+    rows = slice(row_start, row_end)
+    out[rows] = u[rows] + (u[rows] - u_prev[rows]) * d[rows] * global_dampening + laplacian * coefficient[rows]
+
+
+# rows per block of the conversion of fields stored in reduced precision
+_CONVERSION_ROWS = 64
+
+
+def _update_rows(u, u_prev, coefficient, d, global_dampening, k, out, row_start, row_end):
+    """
+    Fused update of the rows [row_start, row_end). The laplacian kernel k has the compute dtype, fields stored in a
+    different dtype (float16, which numba can not compute with) are converted to it in small blocks of rows, so the
+    converted copies stay in the cache.
+    """
+    update_rows = _fused_update_rows if numba is not None else _numpy_update_rows
+    if u.dtype == k.dtype:
+        update_rows(u, u_prev, coefficient, d, global_dampening, k, out, row_start, row_end)
+        return
+
+    h, w = u.shape
+    for start in range(row_start, row_end, _CONVERSION_ROWS):
+        end = min(start + _CONVERSION_ROWS, row_end)
+        # the block includes the one row halo, its first and last row are only computed at the edges of the grid
+        y0, y1 = max(start - 1, 0), min(end + 1, h)
+        block_out = np.empty((y1 - y0, w), dtype=k.dtype)
+        update_rows(*[a[y0:y1].astype(k.dtype) for a in (u, u_prev, coefficient, d)], global_dampening, k, block_out,
+                    start - y0, end - y0)
+        out[start:end] = block_out[start - y0:end - y0]
+
+
+@_jit
+def _fused_update_stack(u, u_prev, coefficient, d, global_dampening, k, out):
+    """ fused stencil update of a stack of independent fields with the shape (batch, h, w) """
+    for b in range(u.shape[0]):
+        _fused_update_rows(u[b], u_prev[b], coefficient[b], d[b], global_dampening, k, out[b], 0, u.shape[1])
+
+
+def _as_stack(a):
+    """ returns a (batch, h, w) view of a (h, w) or (batch, h, w) array """
+    return a.reshape((-1,) + a.shape[-2:])
+
+
+_FUSED_UPDATE_CUDA_SOURCE = r'''
+#include <cuda_fp16.h>
+
+// T is the storage type of the fields, C the type of the arithmetic (float for half precision fields)
+template<typename T, typename C>
+__global__ void fused_wave_update(const T* u, const T* u_prev, const T* coefficient, const T* d, const C* k,
+                                  const C global_dampening, T* out, const int h, const int w)
+{
+    const int x = blockDim.x * blockIdx.x + threadIdx.x;
+    const int y = blockDim.y * blockIdx.y + threadIdx.y;
+    if (x >= w || y >= h) return;
+
+    // the z index of the grid selects the member of a stack of fields
+    const size_t offset = (size_t)blockIdx.z * h * w;
+    u += offset;
+    u_prev += offset;
+    coefficient += offset;
+    d += offset;
+    out += offset;
+
+    C laplacian = 0;
+    for (int ky = -1; ky <= 1; ky++) {
+        const int yy = y + ky;
+        if (yy < 0 || yy >= h) continue;
+        for (int kx = -1; kx <= 1; kx++) {
+            const int xx = x + kx;
+            if (xx < 0 || xx >= w) continue;
+            laplacian += k[(ky + 1) * 3 + kx + 1] * (C)u[yy * w + xx];
+        }
+    }
+
+    const int i = y * w + x;
+    const C value = (C)u[i];
+    out[i] = (T)(value + (value - (C)u_prev[i]) * (C)d[i] * global_dampening + laplacian * (C)coefficient[i]);
+}
+'''
+
+_cuda_modules = {}
+
+
+def _get_cuda_kernel(dtype):
+    """ compiles the fused cuda kernel for the given storage dtype on first use """
+    import cupy
+    type_names = {np.dtype(np.float16): '__half', np.dtype(np.float32): 'float', np.dtype(np.float64): 'double'}
+    name = f'fused_wave_update<{type_names[np.dtype(dtype)]}, {type_names[compute_dtype(dtype)]}>'
+    if name not in _cuda_modules:
+        module = cupy.RawModule(code=_FUSED_UPDATE_CUDA_SOURCE, options=('-std=c++11',), name_expressions=[name])
+        _cuda_modules[name] = module.get_function(name)
+    return _cuda_modules[name]
+
+
+class FusedEngine(FieldUpdateEngine):
+    """
+    Fused single pass engine. Each cell reads its 3x3 neighbourhood of u and the values of u_prev, the coefficient
+    and d once and writes the new field once, without temporaries. Uses a numba JIT compiled loop on the CPU and a
+    CUDA kernel on the GPU.
+    """
+
+    def __init__(self, cuda_block_size=(32, 8)):
+        """
+        @param cuda_block_size: Thread block size (x, y) of the CUDA kernel.
+        """
+        self.cuda_block_size = cuda_block_size
+        self._kernel_source = None
+        self._kernel = None
+
+    def _get_kernel(self, laplacian_kernel, backend, dtype):
+        """ returns the laplacian kernel in the compute dtype, the conversion is cached between steps """
+        if self._kernel_source is not laplacian_kernel or self._kernel.dtype != dtype or \
+                backend_of(self._kernel) is not backend:
+            self._kernel = backend.asarray(backend.to_numpy(laplacian_kernel), dtype=dtype)
+            self._kernel_source = laplacian_kernel
+        return self._kernel
+
+    def step(self, u, u_prev, coefficient, d, global_dampening, laplacian_kernel, out):
+        backend = backend_of(u)
+        k = self._get_kernel(laplacian_kernel, backend, compute_dtype(u.dtype))
+        g = k.dtype.type(global_dampening)
+
+        if backend.is_gpu:
+            h, w = u.shape[-2:]
+            bx, by = self.cuda_block_size
+            grid = ((w + bx - 1) // bx, (h + by - 1) // by, u.size // (h * w))
+            kernel = _get_cuda_kernel(u.dtype)
+            kernel(grid, (bx, by), (u, u_prev, coefficient, d, k, g, out, np.int32(h), np.int32(w)))
+        else:
+            if numba is None:
+                raise RuntimeError('the fused engine requires numba on the numpy backend')
+            if u.ndim == 2:
+                _update_rows(u, u_prev, coefficient, d, g, k, out, 0, u.shape[0])
+            elif u.dtype == k.dtype:
+                _fused_update_stack(_as_stack(u), _as_stack(u_prev), _as_stack(coefficient), _as_stack(d), g, k,
+                                    _as_stack(out))
+            else:
+                for b in range(_as_stack(u).shape[0]):
+                    _update_rows(*[_as_stack(a)[b] for a in (u, u_prev, coefficient, d)], g, k, _as_stack(out)[b],
+                                 0, u.shape[-2])
+
+
+class TiledEngine(FieldUpdateEngine):
+    """
+    Multi-threaded CPU engine. The grid is split into horizontal tiles of full rows, which are advanced in parallel
+    on a thread pool by the numba compiled fused kernel with the GIL released. Every tile reads its one row halo
+    above and below directly from the shared input field, which is read-only during the step, so no halo copies
+    are needed. As each cell is computed by the same code as in the FusedEngine, the results are bit-identical to
+    the single threaded engine for any number of threads and any tile size.
+    """
+
+    def __init__(self, num_threads=None, tile_rows=None):
+        """
+        @param num_threads: Number of worker threads, defaults to the number of CPU cores.
+        @param tile_rows: Number of rows per tile. Defaults to an equal split into one tile per thread. The kernel
+                          sweeps the rows of a tile in order, so only three rows of the field need to stay in cache
+                          and smaller tiles only help to balance uneven loads.
+        """
+        self.num_threads = num_threads if num_threads is not None else os.cpu_count()
+        self.tile_rows = tile_rows
+        self._executor = None
+        self._fused = FusedEngine()
+
+    def _get_tiles(self, h):
+        tile_rows = self.tile_rows if self.tile_rows is not None else -(-h // self.num_threads)
+        return [(y, min(y + tile_rows, h)) for y in range(0, h, tile_rows)]
+
+    def step(self, u, u_prev, coefficient, d, global_dampening, laplacian_kernel, out):
+        backend = backend_of(u)
+        if backend.is_gpu:
+            raise RuntimeError('the tiled engine only runs on the numpy backend, use the fused engine on the GPU')
+        if numba is None:
+            raise RuntimeError('the tiled engine requires numba')
+
+        k = self._fused._get_kernel(laplacian_kernel, backend, compute_dtype(u.dtype))
+        g = k.dtype.type(global_dampening)
+
+        # one task per tile and member of the stack
+        u, u_prev, coefficient, d, out = [_as_stack(a) for a in (u, u_prev, coefficient, d, out)]
+        tiles = self._get_tiles(u.shape[1])
+        tasks = [(b, row_start, row_end) for b in range(u.shape[0]) for row_start, row_end in tiles]
+
+        if self.num_threads <= 1 or len(tasks) == 1:
+            for b, row_start, row_end in tasks:
+                _update_rows(u[b], u_prev[b], coefficient[b], d[b], g, k, out[b], row_start, row_end)
+            return
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.num_threads, thread_name_prefix='wave_sim2d_tile')
+
+        futures = [self._executor.submit(_update_rows, u[b], u_prev[b], coefficient[b], d[b], g, k, out[b],
+                                         row_start, row_end)
+                   for b, row_start, row_end in tasks]
+        for future in futures:
+            future.result()
+
+    def close(self):
+        """ shuts down the worker threads """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+@_jit
+def _tile_max(a, tile_size, result):
+    """ maximum absolute value of each tile of a """
+    h, w = a.shape
+    for ty in range(result.shape[0]):
+        for tx in range(result.shape[1]):
+            m = 0.0
+            for y in range(ty * tile_size, min((ty + 1) * tile_size, h)):
+                for x in range(tx * tile_size, min((tx + 1) * tile_size, w)):
+                    v = abs(a[y, x])
+                    if v > m:
+                        m = v
+            result[ty, tx] = m
+
+
+@_jit
+def _fused_update_block(u, u_prev, coefficient, d, global_dampening, k, out, y0, y1, x0, x1):
+    """ fused stencil update of the block [y0, y1) x [x0, x1), same arithmetic as _fused_update_rows """
+    h, w = u.shape
+    zero_row = np.zeros(w, dtype=u.dtype)
+    k00, k01, k02 = k[0, 0], k[0, 1], k[0, 2]
+    k10, k11, k12 = k[1, 0], k[1, 1], k[1, 2]
+    k20, k21, k22 = k[2, 0], k[2, 1], k[2, 2]
+    m = 0.0
+
+    for y in range(y0, y1):
+        up = u[y - 1] if y > 0 else zero_row
+        mid = u[y]
+        down = u[y + 1] if y < h - 1 else zero_row
+
+        for x in range(x0, x1):
+            left = x - 1 if x > 0 else -1
+            right = x + 1 if x < w - 1 else -1
+
+            laplacian = k01 * up[x] + k11 * mid[x] + k21 * down[x]
+            if left >= 0:
+                laplacian += k00 * up[left] + k10 * mid[left] + k20 * down[left]
+            if right >= 0:
+                laplacian += k02 * up[right] + k12 * mid[right] + k22 * down[right]
+
+            v = mid[x] + (mid[x] - u_prev[y, x]) * d[y, x] * global_dampening + laplacian * coefficient[y, x]
+            out[y, x] = v
+            if abs(v) > m:
+                m = abs(v)
+    return m
+
+
+@_jit
+def _active_tile_step(u, u_prev, coefficient, d, global_dampening, k, out, tile_size, max_u, max_u_prev, max_out,
+                      forced, threshold):
+    """
+    Advances all tiles whose 3x3 tile neighbourhood holds values above the threshold in u or u_prev or contains a
+    forced tile. The other tiles are set to zero, which is skipped when the output tile is known to be zero.
+    max_out holds the known tile maxima of the output buffer (inf if unknown) and is updated.
+    @return: number of advanced tiles
+    """
+    h, w = u.shape
+    nty, ntx = max_u.shape
+    num_active = 0
+    for ty in range(nty):
+        for tx in range(ntx):
+            active = False
+            for ny in range(max(ty - 1, 0), min(ty + 2, nty)):
+                for nx in range(max(tx - 1, 0), min(tx + 2, ntx)):
+                    if forced[ny, nx] or max_u[ny, nx] > threshold or max_u_prev[ny, nx] > threshold:
+                        active = True
+
+            y0, y1 = ty * tile_size, min((ty + 1) * tile_size, h)
+            x0, x1 = tx * tile_size, min((tx + 1) * tile_size, w)
+            if active:
+                max_out[ty, tx] = _fused_update_block(u, u_prev, coefficient, d, global_dampening, k, out,
+                                                      y0, y1, x0, x1)
+                num_active += 1
+            elif max_out[ty, tx] != 0.0:
+                out[y0:y1, x0:x1] = 0.0
+                max_out[ty, tx] = 0.0
+    return num_active
+
+
+class ActiveTileEngine(FieldUpdateEngine):
+    """
+    CPU engine that only advances the active parts of the grid. The grid is split into square tiles and the engine
+    keeps the maximum absolute value of each tile of the field buffers. A tile is advanced if a tile in its 3x3
+    neighbourhood (the stencil reaches one cell into the neighbouring tiles) holds a value above the threshold in
+    the current or previous field, or contains pixels written by sources. All other tiles are quiescent and set to
+    zero, so wavefronts activate tiles as they arrive. With the default threshold of 0.0 only exactly zero regions
+    are skipped and the results are bit-identical to the FusedEngine. A positive threshold also skips regions where
+    the field has decayed, the field dropped per cell and step is then bounded by
+    threshold * (3 + sum(abs(laplacian_kernel)) * max(coefficient)).
+    Tile maxima of the output are computed while the active tiles are advanced, so quiescent tiles cost no memory
+    traffic. If the scene contains objects that write to the field themselves (see SceneObject.modifies_field),
+    the maxima of the current field are rescanned each step. Call invalidate() after writing to the fields directly.
+    Only runs on the numpy backend and requires numba.
+    """
+
+    def __init__(self, tile_size=32, threshold=0.0):
+        """
+        @param tile_size: Side length of the tiles in cells.
+        @param threshold: Values up to this magnitude count as quiescent.
+        """
+        self.tile_size = tile_size
+        self.threshold = threshold
+        self.active_fraction = 1.0
+        self._fused = FusedEngine()
+        self._tile_maxima = {}
+        self._source_pixels = None
+        self._forced = None
+        self._rescan_field = True
+
+    def set_source_pixels(self, ys, xs):
+        self._source_pixels = None if ys is None else (np.asarray(ys), np.asarray(xs))
+        self._rescan_field = ys is None
+        self._forced = None
+
+    def invalidate(self):
+        self._tile_maxima = {}
+
+    def _maxima(self, a, num_tiles):
+        """ known tile maxima of a buffer, scanned if unknown """
+        maxima = self._tile_maxima.get(id(a))
+        if maxima is None or maxima.shape != num_tiles:
+            maxima = np.empty(num_tiles, dtype=np.float64)
+            _tile_max(a, self.tile_size, maxima)
+            self._tile_maxima[id(a)] = maxima
+        return maxima
+
+    def step(self, u, u_prev, coefficient, d, global_dampening, laplacian_kernel, out):
+        backend = backend_of(u)
+        if backend.is_gpu:
+            raise RuntimeError('the active tile engine only runs on the numpy backend')
+        if numba is None:
+            raise RuntimeError('the active tile engine requires numba')
+        if u.ndim != 2:
+            raise ValueError('the active tile engine does not support ensembles')
+        if compute_dtype(u.dtype) != u.dtype:
+            raise ValueError('the active tile engine does not support fields of reduced precision')
+
+        h, w = u.shape
+        ts = self.tile_size
+        num_tiles = (-(-h // ts), -(-w // ts))
+
+        if self._forced is None or self._forced.shape != num_tiles:
+            self._forced = np.zeros(num_tiles, dtype=np.bool_)
+            if self._source_pixels is not None:
+                ys, xs = self._source_pixels
+                self._forced[ys // ts, xs // ts] = True
+
+        # the fields written between the steps are only known at the source pixels, other writers need a rescan
+        if self._rescan_field:
+            self._tile_maxima.pop(id(u), None)
+        max_u = self._maxima(u, num_tiles)
+        max_u_prev = self._maxima(u_prev, num_tiles)
+        max_out = self._tile_maxima.get(id(out))
+        if max_out is None or max_out.shape != num_tiles:
+            max_out = np.full(num_tiles, np.inf)
+
+        k = self._fused._get_kernel(laplacian_kernel, backend, u.dtype)
+        num_active = _active_tile_step(u, u_prev, coefficient, d, u.dtype.type(global_dampening), k, out, ts,
+                                       max_u, max_u_prev, max_out, self._forced, self.threshold)
+        self._tile_maxima[id(out)] = max_out
+        self.active_fraction = num_active / max_out.size
+
+
+def laplacian_kernel_scale(laplacian_kernel):
+    """
+    Returns the factor of the long wavelength limit of a 3x3 laplacian kernel, i.e. the convolution of u with the
+    kernel approximates scale * laplacian(u). The waves of the simulator travel with the speed sqrt(scale) * c cells
+    per unit of time.
+    """
+    k = backend_of(laplacian_kernel).to_numpy(laplacian_kernel).astype(np.float64)
+    offsets = np.array([-1.0, 0.0, 1.0])
+    return 0.5 * float(np.sum(k * offsets[None, :] ** 2))
+
+
+class SpectralEngine(FieldUpdateEngine):
+    """
+    Pseudo-spectral (k-space) engine. The laplacian is evaluated in the sine transform domain (DST-I over the last
+    two axes), which has the same zero boundary as the 3x3 stencil, and is exact for all wavelengths down to two
+    cells instead of the roughly ten cells per wavelength the stencil needs. The spectral laplacian is scaled to the
+    long wavelength limit of the simulators laplacian kernel, so waves travel with the same speed as with the other
+    engines and scenes need no changes. The k-space correction replaces the operator -k**2 by
+        -k**2 * sinc(c_ref * dt * k / 2)**2
+    with the reference speed c_ref, which cancels the time stepping error of the leapfrog scheme, so a homogeneous
+    medium with c = c_ref is propagated exactly. c_ref is the maximal wave speed of the grid, which also keeps the
+    scheme stable for any time step. In weakly varying media the remaining error grows with the contrast
+    (c_ref - c) / c_ref. The damping is applied to the velocity like in the stencil engines. The corrected operator
+    reaches eigenvalues of -4 / (c_ref * dt)**2, twice the ones of the stencil, and the damped leapfrog update is
+    only stable for coefficient * 4 / (c_ref * dt)**2 <= 2 * (1 + d). Cells beyond this limit (damped cells at
+    speeds close to c_ref, e.g. sponge borders) use the coefficient at the limit, so only there the waves travel
+    slower, undamped cells and cells within the limit keep their speed. Sources and scene objects write single
+    pixels, whose spectrum is broadband, so the field next to them is less accurate than the propagation itself.
+    The transforms are fastest for grid sizes where w + 1 and h + 1 only have small prime factors (e.g. 2**n - 1).
+    Runs on every backend (the cupy backend needs a cupy version providing cupyx.scipy.fft.dstn).
+    """
+
+    def __init__(self, num_threads=None):
+        """
+        @param num_threads: Number of threads of the transforms on the CPU, defaults to one.
+        """
+        self.num_threads = num_threads
+        self._filter = None
+        self._filter_key = None
+        self._c_dt = None
+        self._scale = None
+
+    def invalidate(self):
+        self._c_dt = None
+
+    def coefficient_changed(self):
+        self._c_dt = None
+
+    def _get_filter(self, shape, c_dt, scale, backend, dtype):
+        """ k-space corrected laplacian in the sine transform domain, cached between steps """
+        key = (shape, c_dt, scale, backend.name, np.dtype(dtype))
+        if key != self._filter_key:
+            h, w = shape
+            ky = np.pi * np.arange(1, h + 1) / (h + 1)
+            kx = np.pi * np.arange(1, w + 1) / (w + 1)
+            k = np.sqrt(ky[:, None] ** 2 + kx[None, :] ** 2)
+            # np.sinc(x) = sin(pi * x) / (pi * x)
+            correction = np.sinc(np.sqrt(scale) * c_dt * k / (2.0 * np.pi)) ** 2
+            self._filter = backend.asarray(-scale * k ** 2 * correction, dtype=dtype)
+            self._filter_key = key
+        return self._filter
+
+    def step(self, u, u_prev, coefficient, d, global_dampening, laplacian_kernel, out):
+        backend = backend_of(u)
+        xp = backend.xp
+        options = {} if backend.is_gpu else {'workers': self.num_threads}
+        u, u_prev, coefficient, d = [as_compute(a) for a in (u, u_prev, coefficient, d)]
+
+        # the coefficient is (c * dt)**2, its maximum gives the reference speed of the k-space correction. The
+        # reduction synchronizes with the device, so it only runs after the simulator reported a new coefficient
+        if self._c_dt is None:
+            self._c_dt = float(np.sqrt(float(xp.max(coefficient))))
+            self._scale = laplacian_kernel_scale(laplacian_kernel)
+        laplacian_filter = self._get_filter(u.shape[-2:], self._c_dt, self._scale, backend, u.dtype)
+
+        spectrum = backend.fft.dstn(u, type=1, axes=(-2, -1), **options)
+        spectrum *= laplacian_filter
+        laplacian = backend.fft.idstn(spectrum, type=1, axes=(-2, -1), overwrite_x=True, **options)
+
+        # update field, the coefficient is clamped to the stability limit of the damped update (see class docstring),
+        # which leaves undamped cells (d = 1) unchanged
+        damping = d * global_dampening
+        v = (u - u_prev) * damping
+        coefficient = xp.minimum(coefficient, (0.5 * self._c_dt ** 2) * (1.0 + damping))
+        out[:] = (u + v + laplacian * coefficient)
+
+
+def get_engine(engine=None):
+    """
+    Returns a field update engine.
+    @param engine: 'convolution', 'fused', 'tiled', 'active', 'spectral', 'strip' (see domain_decomposition), a
+                   FieldUpdateEngine instance or None for the convolution engine.
+    """
+    if isinstance(engine, FieldUpdateEngine):
+        return engine
+    if engine is None or engine == 'convolution':
+        return ConvolutionEngine()
+    if engine == 'fused':
+        return FusedEngine()
+    if engine == 'tiled':
+        return TiledEngine()
+    if engine == 'active':
+        return ActiveTileEngine()
+    if engine == 'spectral':
+        return SpectralEngine()
+    if engine == 'strip':
+        # imported here, the domain decomposition module builds on this one
+        from wave_sim2d.domain_decomposition import StripDecompositionEngine
+        return StripDecompositionEngine()
+    raise ValueError(f'unknown field update engine: {engine}')
@@ -0,0 +1,176 @@
+from wave_sim2d.wave_simulation import WaveSimulator2D
+from wave_sim2d.source_table import EmitterSet, SourceTable
+
+
+class _EnsembleMember(WaveSimulator2D):
+    """
+    View of one member of an ensemble. Its fields are views into the stacked fields of the ensemble, so its scene
+    objects render and update the member in place. Members do not own any memory and are advanced by the ensemble.
+    """
+    def __init__(self, ensemble, index, scene_objects):
+        self.ensemble = ensemble
+        self.index = index
+        self._init_common(ensemble.backend, ensemble.engine, ensemble.boundary, ensemble.dtype, [], ensemble.profiler,
+                          scene_objects)
+        self.laplacian_kernel = ensemble.laplacian_kernel
+        self.bind()
+
+    def bind(self):
+        """ points the member fields to the current buffers of the ensemble and takes over its time """
+        e = self.ensemble
+        i = self.index
+        self.c = e.c[i]
+        self.d = e.d[i]
+        self.coefficient = e.coefficient[i]
+        self.u = e.u[i]
+        self.u_prev = e.u_prev[i]
+        self.u_next = e.u_next[i]
+        self.global_dampening = e.global_dampening
+        self.t = e.t
+        self.dt = e.dt
+        self.step_count = e.step_count
+
+    def update_field(self):
+        raise RuntimeError('members of an ensemble are advanced by the ensemble, call update_field of the ensemble')
+
+    def run(self, num_steps, callbacks=None, callbacks_every=1, scene_every=1):
+        raise RuntimeError('members of an ensemble are advanced by the ensemble, call run of the ensemble')
+
+
+class EnsembleWaveSimulator2D(WaveSimulator2D):
+    """
+    Simulates a batch of independent scenes of the same size at once. The fields u, u_prev, c and d are stored as
+    (batch, h, w) arrays and all members are advanced by one pass of the field update engine per step, which uses
+    the hardware much better than many small independent simulations.
+    Every member has its own list of scene objects, so variants of a scene (e.g. different source frequencies,
+    refractive indices or absorber strengths) are described by giving each member objects with its parameters.
+    The sinusoidal emitters of all members are merged into source tables for the whole batch.
+    """
+    def __init__(self, w, h, scenes, initial_field=None, backend=None, engine=None, boundary=None, precision=None,
+                 profiler=None):
+        """
+        @param w: Width of the simulation grid.
+        @param h: Height of the simulation grid.
+        @param scenes: List with one list of scene objects per member. Scene objects must not be shared between
+                       members if they keep state.
+        @param initial_field: Optional initial field, either (h, w) for all members or (batch, h, w).
+        @param backend: Array backend, see WaveSimulator2D.
+        @param engine: Field update engine, see WaveSimulator2D. The strip decomposition engine is not supported.
+        @param boundary: Boundary of the grid of all members, see WaveSimulator2D.
+        @param precision: Storage precision of the fields, see WaveSimulator2D.
+        @param profiler: Optional Profiler, see WaveSimulator2D. The phases of the members are recorded under the
+                         same names, e.g. scene.render.0:PointSource sums the first object of all members.
+        """
+        self.batch_size = len(scenes)
+        super().__init__(w, h, [], initial_field=initial_field, backend=backend, engine=engine, boundary=boundary,
+                         precision=precision, profiler=profiler)
+        self.members = [_EnsembleMember(self, i, list(scene)) for i, scene in enumerate(scenes)]
+        self._stacked_updates = None
+        self._rounds = []
+
+    @classmethod
+    def from_factory(cls, w, h, batch_size, make_scene, **kwargs):
+        """
+        Creates an ensemble whose members are built by a function.
+        @param make_scene: Callable returning the list of scene objects of the member with the given index.
+        @param kwargs: Further arguments of the constructor.
+        """
+        return cls(w, h, [make_scene(i) for i in range(batch_size)], **kwargs)
+
+    def _grid_shape(self, w, h):
+        return self.batch_size, h, w
+
+    def _state_objects(self):
+        return [obj for member in self.members for obj in member.scene_objects]
+
+    def member(self, index):
+        """
+        Returns the simulator view of one member, e.g. to pass it to a WaveVisualizer. The view is bound to the
+        current state of the ensemble and must be fetched again after the ensemble was advanced.
+        """
+        member = self.members[index]
+        member.bind()
+        return member
+
+    def add_scene_object(self, scene_object, member=0):
+        """
+        Adds a scene object to the end of the scene of one member.
+        """
+        self.members[member].add_scene_object(scene_object)
+
+    def remove_scene_object(self, scene_object, member=0):
+        """
+        Removes a scene object from the scene of one member.
+        """
+        self.members[member].remove_scene_object(scene_object)
+
+    def invalidate_scene(self):
+        """
+        Forces the static scenes of all members to be rendered again at the next scene update.
+        """
+        for member in self.members:
+            member.invalidate_scene()
+
+    def render_scene(self):
+        """
+        Renders the wave speed and dampening fields of all members.
+        """
+        for member in self.members:
+            member.bind()
+            member.render_scene()
+
+    def _stack_field_updates(self):
+        """
+        Merges the field updates of all members. The k-th field update of every member runs in round k, so each
+        member keeps the order of its scene objects. The source tables of a round are merged into one table that
+        addresses the stacked field as one (batch * h, w) array, the rows of each member are offset by index * h.
+        """
+        h = self.u.shape[1]
+        self._rounds = []
+        for k in range(max(len(member._field_updates) for member in self.members)):
+            objects = []
+            emitter_sets = []
+            for member in self.members:
+                if k >= len(member._field_updates):
+                    continue
+                updater = member._field_updates[k][1]
+                if isinstance(updater, SourceTable):
+                    for e in updater.emitter_sets:
+                        emitter_sets.append(EmitterSet(e.ys + member.index * h, e.xs, e.phase, e.frequency,
+                                                       e.amplitude, e.modulator, e.opacity))
+                else:
+                    objects.append((member, updater))
+            self._rounds.append((objects, SourceTable(emitter_sets, self.backend) if emitter_sets else None))
+        self._stacked_updates = [member._field_updates for member in self.members]
+
+    def update_scene_field(self):
+        """
+        Applies the field updates of the scene objects of all members for the current time.
+        """
+        for member in self.members:
+            member.bind()
+            if member._scene_changed():
+                member._bake_static_scene()
+
+        updates = [member._field_updates for member in self.members]
+        if self._stacked_updates is None or any(a is not b for a, b in zip(updates, self._stacked_updates)):
+            self._stack_field_updates()
+
+        b, h, w = self.u.shape
+        for objects, table in self._rounds:
+            for member, obj in objects:
+                obj.update_field(member.u, self.t)
+            if table is not None:
+                table.update_field(self.u.reshape(b * h, w), self.t)
+
+    def get_field(self, member=None):
+        """
+        Get the current state of the simulation fields.
+        @param member: Index of a member or None for the stacked (batch, h, w) array of all members.
+        @return: The field buffer or a view of it, see WaveSimulator2D.get_field.
+        """
+        return self.u if member is None else self.u[member]
+
+    def render_visualization(self, image=None, member=0):
+        """ renders the scene objects of one member """
+        return self.member(member).render_visualization(image)
@@ -44,24 +44,26 @@ def main():
     simulator = sim.WaveSimulator2D(w, h, scene_objects)
     visualizer = vis.WaveVisualizer(field_colormap=field_colormap, intensity_colormap=intensity_colormap)
 
-    # run simulation
-    for i in range(2000):
-        simulator.update_scene()
-        simulator.update_field()
-        visualizer.update(simulator)
-
-        # visualize very N frames
-        if (i % 4) == 0:
-            # show field
-            frame_field = visualizer.render_field(1.0)
-            cv2.imshow("Wave Simulation Field", frame_field)
-
-            # show intensity
-            # frame_int = visualizer.render_intensity(1.0)
-            # cv2.imshow("Wave Simulation Intensity", frame_int)
+    def show_frame(sim_instance):
+        # the intensity is accumulated every step, the frames are only shown every N steps
+        visualizer.update(sim_instance)
+        if sim_instance.step_count % 4 != 0:
+            return
+
+        # show field
+        frame_field = visualizer.render_field(1.0)
+        cv2.imshow("Wave Simulation Field", frame_field)
+
+        # show intensity
+        # frame_int = visualizer.render_intensity(1.0)
+        # cv2.imshow("Wave Simulation Intensity", frame_int)
 
         cv2.waitKey(1)
 
+    # run simulation, the static scene only needs to be rendered once
+    stats = simulator.run(2000, callbacks=[show_frame], scene_every=2000)
+    print(stats)
+
 
 if __name__ == "__main__":
     main()
@@ -3,12 +3,12 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '../'))  # noqa
 
 import numpy as np
-import cupy as cp
 import math
 import cv2
 
 import wave_sim2d.wave_visualizer as vis
 import wave_sim2d.wave_simulation as sim
+from wave_sim2d.backend import backend_of
 from wave_sim2d.scene_objects.static_dampening import StaticDampening
 from wave_sim2d.scene_objects.static_refractive_index import StaticRefractiveIndex
 
@@ -39,7 +39,7 @@ class MovingCharge(sim.SceneObject):
         self.size = 11
 
         # create a smooth source shape
-        self.source_array = cp.array(gaussian_kernel(self.size, self.size/3))
+        self.source_array = gaussian_kernel(self.size, self.size/3)
 
     def render(self, field, wave_speed_field, dampening_field):
         # no changes to the refractive index or dampening field required for this class
@@ -48,12 +48,19 @@ class MovingCharge(sim.SceneObject):
     def render_visualization(self, image: np.ndarray):
         pass
 
+    def is_static(self):
+        # the charge moves, but it only writes to the field in update_field
+        return True
+
     def update_field(self, field, t):
         fade_in = math.sin(min(t*0.1, math.pi/2))
 
+        # move the source shape to the backend of the simulation (only copies on the first call)
+        self.source_array = backend_of(field).asarray(self.source_array)
+
         # write the moving charge to the field
-        x = self.x + math.sin(self.frequency * t*0.05)*200
-        y = self.y + math.sin(self.frequency * t)*self.amplitude
+        x = int(self.x + math.sin(self.frequency * t*0.05)*200)
+        y = int(self.y + math.sin(self.frequency * t)*self.amplitude)
 
         # copy source shape to current position into field
         wh = self.source_array.shape[1]//2
@@ -4,9 +4,10 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '../'))  # noqa
 
 import cv2
 import numpy as np
-import cupy as cp
 import wave_sim2d.wave_visualizer as vis
 import wave_sim2d.wave_simulation as sim
+from wave_sim2d.backend import backend_of
+from wave_sim2d.frame_output import FramePipeline, VideoSink
 from wave_sim2d.scene_objects.source import *
 from wave_sim2d.scene_objects.static_refractive_index import *
 from wave_sim2d.scene_objects.static_dampening import *
@@ -36,8 +37,9 @@ def build_scene():
 
 
 def show_field(field, brightness_scale):
-    gray = (cp.clip(field*brightness_scale, -1.0, 1.0) * 127 + 127).astype(np.uint8)
-    img = gray.get()
+    backend = backend_of(field)
+    gray = (backend.xp.clip(field*brightness_scale, -1.0, 1.0) * 127 + 127).astype(np.uint8)
+    img = backend.to_numpy(gray)
     cv2.imshow("Strain Simulation Field", cv2.cvtColor(img, cv2.COLOR_RGB2BGR))
 
 
@@ -56,10 +58,10 @@ def main():
     simulator = sim.WaveSimulator2D(w, h, scene_objects)
     visualizer = vis.WaveVisualizer(field_colormap=field_colormap, intensity_colormap=intensity_colormap)
 
-    # optional create video writers
+    # optional video output, frames are color mapped and encoded in background threads
     if write_videos:
-        video_writer1 = cv2.VideoWriter('simulation_field.avi', cv2.VideoWriter_fourcc(*'FFV1'), 60, (w, h))
-        video_writer2 = cv2.VideoWriter('simulation_intensity.avi', cv2.VideoWriter_fourcc(*'FFV1'), 60, (w, h))
+        frame_pipeline = FramePipeline([VideoSink('simulation_field.avi', 'field', field_colormap),
+                                        VideoSink('simulation_intensity.avi', 'intensity', intensity_colormap)])
 
     # run simulation
     for i in range(100000):
@@ -71,16 +73,15 @@ def main():
         frame_field = visualizer.render_field(1.0)
         cv2.imshow("Wave Simulation Field", frame_field)
 
-        # show intensity
-        frame_int = visualizer.render_intensity(1.0)
-        # cv2.imshow("Wave Simulation Intensity", frame_int)
-
         if write_videos and (i % write_video_frame_every) == 0:
-            video_writer1.write(frame_field)
-            video_writer2.write(frame_int)
+            frame_pipeline.submit(visualizer, simulator.t)
 
         cv2.waitKey(1)
 
+    if write_videos:
+        frame_pipeline.close()
+        print(frame_pipeline.statistics())
+
 
 if __name__ == "__main__":
     main()
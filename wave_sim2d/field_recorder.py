@@ -0,0 +1,236 @@
+import os
+import json
+import queue
+import threading
+import numpy as np
+from wave_sim2d.backend import backend_of
+
+_FORMAT_VERSION = 2
+
+
+def _chunk_path(directory, chunk):
+    return os.path.join(directory, f'chunk_{chunk:06d}.npy')
+
+
+def _chunk_index_path(directory, chunk):
+    return os.path.join(directory, f'chunk_{chunk:06d}_index.npz')
+
+
+class FieldRecorder:
+    """
+    Records the field history of a simulation into a directory of chunked, memory mapped .npy files and a
+    meta.json header. The steps and times of the frames of each chunk are stored next to it (chunk_*_index.npz),
+    so the header stays small and closing a chunk takes constant time. Frames can be spatially downsampled (block
+    average) and stored with a smaller dtype (e.g. float16). The simulation loop only takes the (downsampled) copy
+    of the field, the transfer to the host and the writing is done by a background thread. Use FieldRecording to
+    read the recording.
+    The recorder can be passed to WaveSimulator2D.run as callback, it records the steps that are a multiple of
+    'every'.
+    """
+    def __init__(self, directory, every=1, downsample=1, dtype=np.float32, chunk_frames=64, queue_size=16):
+        """
+        @param directory: Output directory, created if it does not exist.
+        @param every: Record only steps which are a multiple of this number when called as callback.
+        @param downsample: Spatial downsampling factor, frames are averaged over blocks of this size.
+        @param dtype: Storage dtype of the frames, e.g. np.float16 to halve the size.
+        @param chunk_frames: Number of frames per chunk file.
+        @param queue_size: Maximal number of frames waiting for the writer thread, recording blocks when it is full.
+        """
+        self.directory = directory
+        self.every = every
+        self.downsample = downsample
+        self.dtype = np.dtype(dtype)
+        self.chunk_frames = chunk_frames
+        self.num_frames = 0
+
+        self._meta = None
+        self._steps = []
+        self._times = []
+        self._chunk = None
+        self._error = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._writer = threading.Thread(target=self._write_frames, name='wave_sim2d_field_recorder', daemon=True)
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, simulator):
+        if simulator.step_count % self.every == 0:
+            self.record(simulator)
+
+    def _downsample(self, field):
+        """ block average of the last two axes on the backend of the field, always returns a new array """
+        f = self.downsample
+        if f == 1:
+            return field.astype(self.dtype, copy=True)
+        h, w = field.shape[-2] // f, field.shape[-1] // f
+        blocks = field[..., :h * f, :w * f].reshape(field.shape[:-2] + (h, f, w, f))
+        return blocks.mean(axis=(-3, -1)).astype(self.dtype)
+
+    def record(self, simulator):
+        """ records the current field of the simulator """
+        if self._error is not None:
+            raise RuntimeError('the field recorder failed') from self._error
+
+        field = simulator.get_field()
+        frame = self._downsample(field)
+
+        if self._meta is None:
+            self._meta = self._new_meta(list(field.shape), list(frame.shape), float(simulator.dt))
+            self._write_meta()
+            self._writer.start()
+
+        self._queue.put((frame, simulator.step_count, float(simulator.t)))
+
+    def _new_meta(self, grid_shape, frame_shape, dt):
+        return {'format_version': _FORMAT_VERSION,
+                'grid_shape': grid_shape,
+                'frame_shape': frame_shape,
+                'dtype': self.dtype.str,
+                'downsample': self.downsample,
+                'every': self.every,
+                'dt': dt,
+                'chunk_frames': self.chunk_frames,
+                'num_frames': 0}
+
+    def _write_frames(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._error is None:
+                    self._write_frame(*item)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _write_frame(self, frame, step, t):
+        index = self.num_frames % self.chunk_frames
+        if index == 0:
+            chunk_shape = (self.chunk_frames,) + tuple(self._meta['frame_shape'])
+            self._chunk = np.lib.format.open_memmap(_chunk_path(self.directory, self.num_frames // self.chunk_frames),
+                                                    mode='w+', dtype=self.dtype, shape=chunk_shape)
+
+        self._chunk[index] = backend_of(frame).to_numpy(frame)
+        self._steps.append(int(step))
+        self._times.append(t)
+        self.num_frames += 1
+
+        # the header is updated whenever a chunk is complete, so a crashed run keeps all completed chunks
+        if index == self.chunk_frames - 1:
+            self._close_chunk()
+
+    def _close_chunk(self):
+        if self._chunk is not None:
+            self._chunk.flush()
+            self._chunk = None
+        if self._steps:
+            chunk = (self.num_frames - 1) // self.chunk_frames
+            np.savez(_chunk_index_path(self.directory, chunk), steps=np.asarray(self._steps, dtype=np.int64),
+                     times=np.asarray(self._times, dtype=np.float64))
+            self._steps = []
+            self._times = []
+        self._write_meta()
+
+    def _write_meta(self):
+        self._meta['num_frames'] = self.num_frames
+        tmp_path = os.path.join(self.directory, 'meta.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self._meta, f)
+        os.replace(tmp_path, os.path.join(self.directory, 'meta.json'))
+
+    def close(self):
+        """ writes all queued frames and the final header """
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        if self._meta is None:
+            # nothing was recorded, the header marks the directory as an empty recording of unknown grid size
+            self._meta = self._new_meta(None, [], None)
+        self._close_chunk()
+        if self._error is not None:
+            raise RuntimeError('the field recorder failed') from self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class FieldRecording:
+    """
+    Lazy reader of a FieldRecorder directory. Indexing works like on an array of the shape
+    (num_frames, *frame_shape), but only the chunks of the selected frames are memory mapped and only the selected
+    part of each frame is read, e.g. recording[1000:2000:10, 100:200, 50] reads 100 frames of a small region.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+        if self.meta['format_version'] != _FORMAT_VERSION:
+            raise ValueError(f"unsupported recording version {self.meta['format_version']} in {directory}")
+
+        self.num_frames = self.meta['num_frames']
+        self.frame_shape = tuple(self.meta['frame_shape'])
+        self.dtype = np.dtype(self.meta['dtype'])
+        self.dt = self.meta['dt']
+        self.downsample = self.meta['downsample']
+        self.chunk_frames = self.meta['chunk_frames']
+        self._chunks = {}
+
+        # steps and times of the frames, stored per chunk
+        steps, times = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.float64)]
+        for chunk in range(-(-self.num_frames // self.chunk_frames)):
+            with np.load(_chunk_index_path(directory, chunk)) as index:
+                steps.append(index['steps'])
+                times.append(index['times'])
+        self.steps = np.concatenate(steps)
+        self.times = np.concatenate(times)
+
+    @property
+    def shape(self):
+        return (self.num_frames,) + self.frame_shape
+
+    def __len__(self):
+        return self.num_frames
+
+    def _get_chunk(self, chunk):
+        if chunk not in self._chunks:
+            self._chunks[chunk] = np.load(_chunk_path(self.directory, chunk), mmap_mode='r')
+        return self._chunks[chunk]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        frame_key, space_key = key[0], key[1:]
+
+        if isinstance(frame_key, (int, np.integer)):
+            frame = int(frame_key) + self.num_frames if frame_key < 0 else int(frame_key)
+            if not 0 <= frame < self.num_frames:
+                raise IndexError(f'frame {frame_key} out of range for a recording of {self.num_frames} frames')
+            return np.array(self._get_chunk(frame // self.chunk_frames)[(frame % self.chunk_frames,) + space_key])
+
+        if isinstance(frame_key, slice):
+            frames = np.arange(*frame_key.indices(self.num_frames))
+        else:
+            frames = np.asarray(frame_key, dtype=np.int64)
+            frames = np.where(frames < 0, frames + self.num_frames, frames)
+            if np.any((frames < 0) | (frames >= self.num_frames)):
+                raise IndexError(f'frame index out of range for a recording of {self.num_frames} frames')
+
+        # read the selected frames chunk by chunk, consecutive frames of a chunk are read with one index operation
+        parts = []
+        chunk_ids = frames // self.chunk_frames
+        start = 0
+        while start < len(frames):
+            end = start
+            while end < len(frames) and chunk_ids[end] == chunk_ids[start]:
+                end += 1
+            chunk = self._get_chunk(int(chunk_ids[start]))
+            parts.append(np.asarray(chunk[(frames[start:end] % self.chunk_frames,) + space_key]))
+            start = end
+
+        if not parts:
+            return np.zeros((0,) + self.frame_shape, dtype=self.dtype)[(slice(None),) + space_key]
+        return np.concatenate(parts)
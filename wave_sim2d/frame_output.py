@@ -0,0 +1,277 @@
+import os
+import time
+import queue
+import threading
+import numpy as np
+import cv2
+from abc import ABC, abstractmethod
+from wave_sim2d.backend import backend_of
+from wave_sim2d.wave_visualizer import colorize_field, colorize_intensity
+
+
+class FrameSnapshot:
+    """
+    Copy of the data of one output frame, taken from the visualizer in the simulation loop. The arrays stay on the
+    backend of the simulation, the transfer to the host happens in the worker threads.
+    """
+    def __init__(self, index, t, field, intensity, visualization_image):
+        self.index = index
+        self.t = t
+        self.field = field
+        self.intensity = intensity
+        self.visualization_image = visualization_image
+
+
+class FrameSink(ABC):
+    """
+    Interface for the outputs of a FramePipeline. A sink renders the quantity it needs from a snapshot and writes it.
+    Sinks that write into one stream (e.g. videos) are ordered, their frames are written one at a time in frame
+    order. Unordered sinks (e.g. one file per frame) are written concurrently by the worker threads.
+    """
+    ordered = True
+
+    def __init__(self, quantity):
+        """
+        @param quantity: 'field' or 'intensity'
+        """
+        assert quantity in ('field', 'intensity'), "quantity must be 'field' or 'intensity'"
+        self.quantity = quantity
+
+    @abstractmethod
+    def write(self, snapshot):
+        """ renders and writes one frame, called from a worker thread """
+        pass
+
+    def close(self):
+        """ finishes the output, called after the last frame """
+        pass
+
+
+class _ImageSink(FrameSink):
+    """ base class of sinks writing color mapped images """
+    def __init__(self, quantity, colormap, brightness_scale, exp, overlay_visualization):
+        super().__init__(quantity)
+        # the workers do the lookup on the host, colormaps already moved to the GPU by a visualizer are copied back
+        self.colormap = None if colormap is None else backend_of(colormap).to_numpy(colormap)
+        self.brightness_scale = brightness_scale
+        self.exp = exp
+        self.overlay_visualization = overlay_visualization
+
+    def render(self, snapshot):
+        """ renders the color mapped BGR image of the snapshot on the host """
+        overlay = snapshot.visualization_image if self.overlay_visualization else None
+        if self.quantity == 'field':
+            field = backend_of(snapshot.field).to_numpy(snapshot.field)
+            return colorize_field(field, self.colormap, self.brightness_scale, overlay)
+        intensity = backend_of(snapshot.intensity).to_numpy(snapshot.intensity)
+        return colorize_intensity(intensity, self.colormap, self.brightness_scale, self.exp, overlay)
+
+
+class VideoSink(_ImageSink):
+    """
+    Writes the frames to a video file using OpenCV, lossless FFV1 by default.
+    """
+    def __init__(self, filename, quantity='field', colormap=None, fps=60, fourcc='FFV1', brightness_scale=1.0,
+                 exp=0.5, overlay_visualization=True):
+        """
+        @param filename: Name of the video file.
+        @param quantity: 'field' or 'intensity'.
+        @param colormap: Colormap lookup table, see get_colormap_lut, or None for gray values.
+        @param fps: Frame rate of the video.
+        @param fourcc: Four character code of the codec.
+        @param brightness_scale: Brightness of the rendered quantity.
+        @param exp: Exponent of the intensity rendering.
+        @param overlay_visualization: Add the visualization of the scene objects.
+        """
+        super().__init__(quantity, colormap, brightness_scale, exp, overlay_visualization)
+        self.filename = filename
+        self.fps = fps
+        self.fourcc = fourcc
+        self._writer = None
+
+    def write(self, snapshot):
+        image = self.render(snapshot)
+        if self._writer is None:
+            self._writer = cv2.VideoWriter(self.filename, cv2.VideoWriter_fourcc(*self.fourcc), self.fps,
+                                           (image.shape[1], image.shape[0]))
+        self._writer.write(image)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+
+
+class PngSequenceSink(_ImageSink):
+    """
+    Writes each frame to its own PNG file.
+    """
+    ordered = False
+
+    def __init__(self, directory, quantity='field', colormap=None, pattern='frame_{:06d}.png', brightness_scale=1.0,
+                 exp=0.5, overlay_visualization=True):
+        """
+        @param directory: Output directory, created if it does not exist.
+        @param pattern: File name pattern, formatted with the frame index.
+        For the other parameters see VideoSink.
+        """
+        super().__init__(quantity, colormap, brightness_scale, exp, overlay_visualization)
+        self.directory = directory
+        self.pattern = pattern
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, snapshot):
+        cv2.imwrite(os.path.join(self.directory, self.pattern.format(snapshot.index)), self.render(snapshot))
+
+
+class NpySink(FrameSink):
+    """
+    Writes the raw float values of each frame to its own .npy file.
+    """
+    ordered = False
+
+    def __init__(self, directory, quantity='field', pattern='frame_{:06d}.npy'):
+        """
+        @param directory: Output directory, created if it does not exist.
+        @param quantity: 'field' or 'intensity'.
+        @param pattern: File name pattern, formatted with the frame index.
+        """
+        super().__init__(quantity)
+        self.directory = directory
+        self.pattern = pattern
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, snapshot):
+        values = snapshot.field if self.quantity == 'field' else snapshot.intensity
+        np.save(os.path.join(self.directory, self.pattern.format(snapshot.index)), backend_of(values).to_numpy(values))
+
+
+class FramePipeline:
+    """
+    Moves the rendering and encoding of output frames out of the simulation loop. submit() only copies the field,
+    the intensity and the scene visualization of a visualizer and puts the copy into a bounded queue. Worker threads
+    take the frames from the queue, do the color mapping, the overlay and the encoding and write the frames to the
+    sinks. Frames of ordered sinks are written in frame order, although the workers render them in parallel.
+    When the queue is full, submit either blocks until a worker is free ('block') or drops the frame ('drop').
+    """
+    def __init__(self, sinks, num_workers=2, queue_size=8, back_pressure='block'):
+        """
+        @param sinks: List of FrameSink objects.
+        @param num_workers: Number of worker threads.
+        @param queue_size: Maximal number of frames waiting in the queue.
+        @param back_pressure: 'block' or 'drop', behaviour of submit when the queue is full.
+        """
+        assert back_pressure in ('block', 'drop'), "back_pressure must be 'block' or 'drop'"
+        self.sinks = sinks
+        self.back_pressure = back_pressure
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._needs_field = any(s.quantity == 'field' for s in sinks)
+        self._needs_intensity = any(s.quantity == 'intensity' for s in sinks)
+        self._needs_visualization = any(getattr(s, 'overlay_visualization', False) for s in sinks)
+
+        # frames of ordered sinks are written by the worker holding the next frame index
+        self._order_condition = threading.Condition()
+        self._next_ordered_index = 0
+
+        self._error = None
+        self.frames_submitted = 0
+        self.frames_dropped = 0
+        self.frames_written = 0
+        self.wait_seconds = 0.0
+
+        self._workers = [threading.Thread(target=self._work, name=f'wave_sim2d_frames_{i}', daemon=True)
+                         for i in range(num_workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, visualizer, t=None):
+        """
+        Takes a snapshot of the current frame of the visualizer (call visualizer.update first) and queues it.
+        @param t: Optional simulation time stored with the frame.
+        @return: False if the frame was dropped because the queue was full.
+        """
+        self._raise_worker_error()
+
+        def copy(a):
+            return None if a is None else a.copy()
+
+        snapshot = FrameSnapshot(self.frames_submitted, t,
+                                 copy(visualizer.field) if self._needs_field else None,
+                                 copy(visualizer.intensity) if self._needs_intensity else None,
+                                 copy(visualizer.visualization_image) if self._needs_visualization else None)
+
+        if self.back_pressure == 'drop':
+            try:
+                self._queue.put_nowait(snapshot)
+            except queue.Full:
+                self.frames_dropped += 1
+                return False
+        else:
+            start = time.perf_counter()
+            self._queue.put(snapshot)
+            self.wait_seconds += time.perf_counter() - start
+
+        self.frames_submitted += 1
+        return True
+
+    def _raise_worker_error(self):
+        if self._error is not None:
+            raise RuntimeError('a frame output worker failed') from self._error
+
+    def _work(self):
+        while True:
+            snapshot = self._queue.get()
+            try:
+                if snapshot is None:
+                    return
+                if self._error is None:
+                    self._write(snapshot)
+            except Exception as e:
+                self._error = e
+                with self._order_condition:
+                    self._order_condition.notify_all()
+            finally:
+                self._queue.task_done()
+
+    def _write(self, snapshot):
+        for sink in self.sinks:
+            if not sink.ordered:
+                sink.write(snapshot)
+
+        with self._order_condition:
+            while self._next_ordered_index != snapshot.index and self._error is None:
+                self._order_condition.wait()
+            if self._error is not None:
+                return
+            try:
+                for sink in self.sinks:
+                    if sink.ordered:
+                        sink.write(snapshot)
+                self.frames_written += 1
+            finally:
+                self._next_ordered_index += 1
+                self._order_condition.notify_all()
+
+    def close(self):
+        """
+        Writes all queued frames, stops the workers and closes the sinks. Raises if a worker failed.
+        """
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+        for sink in self.sinks:
+            sink.close()
+        self._raise_worker_error()
+
+    def statistics(self):
+        """ returns a dictionary with the frame counts and the time submit spent waiting for a free queue slot """
+        return {'frames_submitted': self.frames_submitted, 'frames_dropped': self.frames_dropped,
+                'frames_written': self.frames_written, 'wait_seconds': self.wait_seconds}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,33 @@
+import numpy as np
+
+_STORAGE_DTYPES = {'float64': np.float64, 'float32': np.float32, 'float16': np.float16}
+
+
+def get_precision(precision=None):
+    """
+    Returns the storage dtype of the fields of a simulation for a precision policy.
+    @param precision: 'float64' (reference), 'float32' (default), 'float16' (half the memory of float32, arithmetic
+                      in float32), a numpy dtype of these or None for float32.
+    """
+    if precision is None:
+        return np.dtype(np.float32)
+    name = np.dtype(precision).name if not isinstance(precision, str) else precision
+    if name not in _STORAGE_DTYPES:
+        raise ValueError(f'unsupported precision: {precision}, use one of {", ".join(_STORAGE_DTYPES)}')
+    return np.dtype(_STORAGE_DTYPES[name])
+
+
+def compute_dtype(dtype):
+    """
+    Returns the dtype of the arithmetic on fields stored in the given dtype. Fields of reduced precision are
+    converted to float32 for all computations and only stored with reduced precision, everything else computes in
+    its storage dtype.
+    """
+    dtype = np.dtype(dtype)
+    return np.dtype(np.float32) if dtype.itemsize < 4 else dtype
+
+
+def as_compute(a):
+    """ returns the array converted to its compute dtype, arrays that already have it are returned without copying """
+    dtype = compute_dtype(a.dtype)
+    return a if a.dtype == dtype else a.astype(dtype)
@@ -0,0 +1,198 @@
+import os
+import json
+import math
+import time
+import threading
+import contextlib
+import numpy as np
+
+
+class _PhaseStatistics:
+    """
+    Running statistics of the durations of a phase. Instead of the durations, a histogram with logarithmic bins
+    from 1 ns to 10000 s (40 bins per decade) is kept, the percentiles are read from it with a relative error of
+    less than 3 percent and the memory stays the same however long the profiler runs.
+    """
+    low = 1e-9
+    bins_per_decade = 40
+    num_bins = 13 * bins_per_decade
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.counts = np.zeros(self.num_bins, dtype=np.int64)
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.min = min(self.min, duration)
+        self.max = max(self.max, duration)
+        i = int(math.log10(max(duration, self.low) / self.low) * self.bins_per_decade)
+        self.counts[min(i, self.num_bins - 1)] += 1
+
+    def bin_centers(self):
+        """ geometric centers of the bins in seconds """
+        return self.low * 10.0 ** ((np.arange(self.num_bins) + 0.5) / self.bins_per_decade)
+
+    def percentile(self, q):
+        """ q-th percentile (0 to 100), the center of the bin it falls into, clipped to the observed range """
+        i = int(np.searchsorted(np.cumsum(self.counts), q / 100.0 * self.count))
+        return float(np.clip(self.bin_centers()[min(i, self.num_bins - 1)], self.min, self.max))
+
+
+class Profiler:
+    """
+    Opt-in instrumentation of the step loop. Pass a profiler to WaveSimulator2D and WaveVisualizer (profiler=...)
+    and they record the wall time of their phases:
+        scene.bake                          rendering of the static scene (only when the scene changed)
+        scene.render.<i>:<type>             render() of the i-th scene object
+        scene.update_field.<i>:<type>       update_field() of the i-th scene object
+        scene.sources                       merged source table
+        field.engine                        field update (laplacian and time step) of the engine
+        field.boundary                      absorbing boundary layer
+        field.patch.<i>                     refined patch, including its fine steps
+        visualizer.update                   intensity accumulation
+        visualizer.render_field             color mapping, overlay and transfer to the host
+        visualizer.render_intensity
+    Phases nest, e.g. scene.render.<i> runs inside scene.bake. On the GPU calls return before the device has
+    finished, with synchronize=True the device is synchronized before and after each phase, so the times include
+    the device work (at the cost of the overlap between host and device). The profiler aggregates the durations
+    per phase as they come in (see summary, histogram and report), so its memory does not grow with the number of
+    steps, and keeps the individual events for save_chrome_trace up to max_events.
+    Without a profiler (or with a NullProfiler) the simulator skips the timing of its phases altogether, the
+    visualizer uses the NullProfiler, whose calls do nothing.
+    """
+    def __init__(self, synchronize=False, max_events=1000000):
+        """
+        @param synchronize: Synchronize the device around each phase to measure the device time.
+        @param max_events: Maximal number of events kept for the trace, later events are only aggregated.
+        """
+        self.synchronize = synchronize
+        self.max_events = max_events
+        self.dropped_events = 0
+        self._statistics = {}
+        self._events = []
+        self._origin = time.perf_counter()
+
+    def begin(self, backend=None):
+        """ returns the start time of a phase, call end with it when the phase is complete """
+        if self.synchronize and backend is not None:
+            backend.synchronize()
+        return time.perf_counter()
+
+    def end(self, name, start, backend=None, **args):
+        """
+        Records a phase that started at 'start' (see begin).
+        @param args: Optional values stored with the event in the trace.
+        """
+        if self.synchronize and backend is not None:
+            backend.synchronize()
+        end = time.perf_counter()
+
+        statistics = self._statistics.get(name)
+        if statistics is None:
+            statistics = self._statistics[name] = _PhaseStatistics()
+        statistics.add(end - start)
+        if len(self._events) < self.max_events:
+            self._events.append((name, start, end, threading.get_ident(), args))
+        else:
+            self.dropped_events += 1
+
+    @contextlib.contextmanager
+    def phase(self, name, backend=None, **args):
+        """ context manager recording the enclosed code as phase, e.g. for callbacks of the step loop """
+        start = self.begin(backend)
+        try:
+            yield
+        finally:
+            self.end(name, start, backend, **args)
+
+    def reset(self):
+        """ discards all recorded phases """
+        self.dropped_events = 0
+        self._statistics = {}
+        self._events = []
+        self._origin = time.perf_counter()
+
+    def summary(self):
+        """
+        Returns a dictionary phase name -> statistics (count, total, mean, min, p50, p95, max in seconds), ordered
+        by decreasing total time. The percentiles are approximate, see _PhaseStatistics.
+        """
+        summary = {}
+        for name, s in self._statistics.items():
+            summary[name] = {'count': s.count, 'total': s.total, 'mean': s.total / s.count, 'min': s.min,
+                             'p50': s.percentile(50), 'p95': s.percentile(95), 'max': s.max}
+        return dict(sorted(summary.items(), key=lambda item: -item[1]['total']))
+
+    def histogram(self, name, bins=20):
+        """
+        Returns the histogram (counts, bin edges in seconds) of the durations of a phase. The bins are spaced
+        logarithmically, since the durations of a phase often spread over orders of magnitude (e.g. jit compilation
+        in the first step). The durations are counted in the bin of the center of their aggregation bin.
+        """
+        s = self._statistics.get(name)
+        if s is None:
+            return np.zeros(bins, dtype=np.int64), np.zeros(bins + 1)
+        low, high = max(s.min, 1e-9), max(s.max, 1e-9)
+        edges = np.geomspace(low, high * (1.0 + 1e-9), bins + 1)
+        centers = np.clip(s.bin_centers(), low, edges[-1] * (1.0 - 1e-12))
+        counts, edges = np.histogram(centers, bins=edges, weights=s.counts)
+        return counts.astype(np.int64), edges
+
+    def report(self):
+        """ returns the summary as text table, times in milliseconds """
+        lines = [f"{'phase':<40} {'count':>8} {'total':>10} {'mean':>9} {'p50':>9} {'p95':>9} {'max':>9}"]
+        for name, s in self.summary().items():
+            lines.append(f"{name:<40} {s['count']:>8} {s['total'] * 1e3:10.1f} {s['mean'] * 1e3:9.3f} "
+                         f"{s['p50'] * 1e3:9.3f} {s['p95'] * 1e3:9.3f} {s['max'] * 1e3:9.3f}")
+        if self.dropped_events:
+            lines.append(f'{self.dropped_events} events were not kept for the trace')
+        return '\n'.join(lines)
+
+    def save_chrome_trace(self, filename):
+        """
+        Writes the events as Chrome trace event JSON file, which can be opened in chrome://tracing or
+        https://ui.perfetto.dev. The category of an event is the first component of its phase name.
+        """
+        pid = os.getpid()
+        events = [{'name': name, 'cat': name.split('.')[0], 'ph': 'X', 'pid': pid, 'tid': tid,
+                   'ts': (start - self._origin) * 1e6, 'dur': (end - start) * 1e6,
+                   'args': {key: str(value) for key, value in args.items()}}
+                  for name, start, end, tid, args in self._events]
+        with open(filename, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms',
+                       'otherData': {'synchronize': self.synchronize, 'dropped_events': self.dropped_events}}, f)
+
+
+class NullProfiler:
+    """
+    Profiler that records nothing, the visualizer times its phases with it when no profiler is set, so there is a
+    single code path with and without profiling. The step loop of the simulator does not call it at all, see
+    active_profiler.
+    """
+    _null_context = contextlib.nullcontext()
+
+    def begin(self, backend=None):
+        return 0.0
+
+    def end(self, name, start, backend=None, **args):
+        pass
+
+    def phase(self, name, backend=None, **args):
+        return self._null_context
+
+
+_null_profiler = NullProfiler()
+
+
+def get_profiler(profiler=None):
+    """ returns the profiler, or a NullProfiler for None """
+    return _null_profiler if profiler is None else profiler
+
+
+def active_profiler(profiler=None):
+    """ returns the profiler, or None if nothing is recorded (None or a NullProfiler) """
+    return None if profiler is None or isinstance(profiler, NullProfiler) else profiler
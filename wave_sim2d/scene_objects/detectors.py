@@ -0,0 +1,302 @@
+from wave_sim2d.wave_simulation import SceneObject
+from wave_sim2d.backend import backend_of
+from wave_sim2d.engines import _jit, numba
+from wave_sim2d.precision import as_compute
+import numpy as np
+import cv2
+import scipy.io.wavfile
+from abc import abstractmethod
+
+
+class Detector(SceneObject):
+    """
+    Base class of detectors. A detector samples the field at its pixels each step into a preallocated ring buffer
+    on the backend of the simulation, only the detector pixels are gathered and no field data leaves the device.
+    The buffer is copied to the host in bulk every 'flush_every' samples.
+    The series are sampled in update_field, i.e. before the sources of the step are written to the field.
+    :param flush_every: number of samples kept on the device before they are copied to the host
+    :param average: average over the detector pixels instead of recording each pixel
+    """
+    def __init__(self, flush_every=1024, average=False):
+        self.flush_every = flush_every
+        self.average = average
+        self._ys = None
+        self._xs = None
+        self._buffer = None
+        self._position = 0
+        self._times = []
+        self._chunks = []
+
+    @abstractmethod
+    def _coordinates(self, field_shape):
+        """ returns the (y, x) numpy coordinates of the detector pixels inside a field of the given shape """
+        pass
+
+    def render(self, field, wave_speed_field, dampening_field):
+        pass
+
+    def is_static(self):
+        # detectors only read the field
+        return True
+
+    def modifies_field(self):
+        return False
+
+    def update_field(self, field, t):
+        backend = backend_of(field)
+        if self._buffer is None or backend_of(self._buffer) is not backend:
+            self.flush()
+            ys, xs = self._coordinates(field.shape)
+            self._ys = backend.asarray(ys)
+            self._xs = backend.asarray(xs)
+            width = 1 if self.average else len(ys)
+            self._buffer = backend.xp.zeros((self.flush_every, width), dtype=field.dtype)
+            self._position = 0
+
+        values = field[self._ys, self._xs]
+        if self.average:
+            self._buffer[self._position, 0] = values.mean()
+        else:
+            self._buffer[self._position] = values
+        self._times.append(t)
+        self._position += 1
+
+        if self._position == self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """ copies the samples of the device ring buffer to the host """
+        if self._buffer is not None and self._position > 0:
+            self._chunks.append(backend_of(self._buffer).to_numpy(self._buffer[:self._position]).copy())
+            self._position = 0
+
+    def get_series(self):
+        """
+        Returns the recorded samples as numpy arrays (times, values). Values has the shape (samples,) for point
+        and averaging detectors and (samples, pixels) otherwise.
+        """
+        self.flush()
+        width = 1 if self.average or self._ys is None else len(self._ys)
+        values = np.concatenate(self._chunks) if self._chunks else np.zeros((0, width), dtype=np.float32)
+        if values.shape[1] == 1:
+            values = values[:, 0]
+        return np.asarray(self._times, dtype=np.float64), values
+
+    def clear(self):
+        """ discards all recorded samples """
+        self._times = []
+        self._chunks = []
+        self._position = 0
+
+    def save_npy(self, filename):
+        """ writes the recorded values to a .npy file """
+        np.save(filename, self.get_series()[1])
+
+    def save_wav(self, filename, sample_rate=44100, normalize=True):
+        """
+        Writes the recorded values as 16 bit WAV file, one sample per simulation step and one channel per pixel.
+        :param normalize: scale the peak value to full range, otherwise values are clipped to [-1, 1]
+        """
+        values = self.get_series()[1].astype(np.float64)
+        if normalize and values.size > 0:
+            peak = np.abs(values).max()
+            if peak > 0:
+                values = values / peak
+        scipy.io.wavfile.write(filename, sample_rate, (np.clip(values, -1.0, 1.0) * 32767).astype(np.int16))
+
+    def get_state(self):
+        times, values = self.get_series()
+        return {'times': times, 'values': values}
+
+    def set_state(self, state):
+        self.clear()
+        self._times = list(np.asarray(state['times']))
+        values = np.asarray(state['values'])
+        self._chunks = [values.reshape(len(values), -1)] if len(values) > 0 else []
+
+
+class PointDetector(Detector):
+    """
+    Records the field value at one pixel.
+    :param x: detector position x
+    :param y: detector position y
+    """
+    def __init__(self, x, y, flush_every=1024):
+        super().__init__(flush_every)
+        self.x = x
+        self.y = y
+
+    def _coordinates(self, field_shape):
+        return np.array([self.y]), np.array([self.x])
+
+    def render_visualization(self, image: np.ndarray):
+        cv2.circle(image, (int(self.x), int(self.y)), 3, (80, 80, 200), 1, lineType=cv2.LINE_AA)
+
+
+class LineDetector(Detector):
+    """
+    Records the field along a line segment, one value per pixel or the average over the line.
+    :param start: starting (x, y) coordinates of the line
+    :param end: ending (x, y) coordinates of the line
+    """
+    def __init__(self, start, end, average=False, flush_every=1024):
+        super().__init__(flush_every, average)
+        self.start = start
+        self.end = end
+
+    def _coordinates(self, field_shape):
+        x1, y1 = self.start
+        x2, y2 = self.end
+        num_points = int(np.sqrt((x2 - x1)**2 + (y2 - y1)**2)) + 1
+        xs = np.linspace(x1, x2, num_points).round().astype(int)
+        ys = np.linspace(y1, y2, num_points).round().astype(int)
+        valid = (xs >= 0) & (xs < field_shape[-1]) & (ys >= 0) & (ys < field_shape[-2])
+        return ys[valid], xs[valid]
+
+    def render_visualization(self, image: np.ndarray):
+        cv2.line(image, tuple(int(v) for v in self.start), tuple(int(v) for v in self.end), (80, 80, 200), 1,
+                 lineType=cv2.LINE_AA)
+
+
+class PolygonDetector(Detector):
+    """
+    Records the average field inside a polygon.
+    :param vertices: list of polygon vertices (x, y)
+    """
+    def __init__(self, vertices, flush_every=1024):
+        super().__init__(flush_every, average=True)
+        self.vertices = np.array(vertices)
+
+    def _coordinates(self, field_shape):
+        mask = np.zeros(field_shape[-2:], dtype=np.uint8)
+        cv2.fillPoly(mask, [np.round(self.vertices).astype(np.int32)], 1)
+        return np.nonzero(mask)
+
+    def render_visualization(self, image: np.ndarray):
+        cv2.polylines(image, [np.round(self.vertices).astype(np.int32)], True, (80, 80, 200), 1,
+                      lineType=cv2.LINE_AA)
+
+
+@_jit
+def _lock_in_accumulate(field, cos_wt, sin_wt, re, im):
+    """ adds the projections of the field onto cos(w*t) and sin(w*t) for all frequencies in a single pass """
+    for k in range(cos_wt.shape[0]):
+        c = cos_wt[k]
+        s = sin_wt[k]
+        for y in range(field.shape[0]):
+            for x in range(field.shape[1]):
+                f = field[y, x]
+                re[k, y, x] += f * c
+                im[k, y, x] += f * s
+
+
+_lock_in_cupy_kernel = None
+
+
+def _get_lock_in_cupy_kernel():
+    global _lock_in_cupy_kernel
+    if _lock_in_cupy_kernel is None:
+        import cupy
+        _lock_in_cupy_kernel = cupy.ElementwiseKernel('T f, float64 c, float64 s', 'float64 re, float64 im',
+                                                      're += (double)f * c; im += (double)f * s',
+                                                      'wave_sim2d_lock_in_accumulate')
+    return _lock_in_cupy_kernel
+
+
+class LockInDetector(SceneObject):
+    """
+    Per pixel lock-in amplifier (running DFT at given frequencies). Each step the field is projected onto
+    cos(frequency*t) and sin(frequency*t) and the projections are summed per pixel, so the complex amplitude of a
+    steady state at the source frequencies is available for the whole grid without storing frames. With the
+    field u = A*cos(frequency*t + phase) the maps converge to A and phase. Sampling whole periods avoids leakage
+    from other frequencies.
+    :param frequencies: frequency or list of frequencies, in the units of the sources (angular frequency per step)
+    :param start_time: samples before this simulation time are ignored (e.g. the transient)
+    """
+    def __init__(self, frequencies, start_time=0.0):
+        self.frequencies = np.atleast_1d(np.asarray(frequencies, dtype=np.float64))
+        self.start_time = start_time
+        self.num_samples = 0
+        self._re = None
+        self._im = None
+        self._last_amplitude = None
+
+    def render(self, field, wave_speed_field, dampening_field):
+        pass
+
+    def render_visualization(self, image: np.ndarray):
+        pass
+
+    def is_static(self):
+        # the detector only reads the field
+        return True
+
+    def modifies_field(self):
+        return False
+
+    def update_field(self, field, t):
+        if t < self.start_time:
+            return
+
+        backend = backend_of(field)
+        if self._re is None or self._re.shape[1:] != field.shape:
+            shape = (len(self.frequencies),) + field.shape
+            self._re = backend.xp.zeros(shape, dtype=np.float64)
+            self._im = backend.xp.zeros(shape, dtype=np.float64)
+            self.num_samples = 0
+        else:
+            # accumulators restored by set_state are moved to the backend of the field (no copy afterwards)
+            self._re = backend.asarray(self._re)
+            self._im = backend.asarray(self._im)
+
+        cos_wt = np.cos(self.frequencies * t)
+        sin_wt = np.sin(self.frequencies * t)
+        if backend.is_gpu:
+            kernel = _get_lock_in_cupy_kernel()
+            for k in range(len(self.frequencies)):
+                kernel(field, cos_wt[k], sin_wt[k], self._re[k], self._im[k])
+        elif numba is not None:
+            _lock_in_accumulate(as_compute(field), cos_wt, sin_wt, self._re, self._im)
+        else:
+            for k in range(len(self.frequencies)):
+                self._re[k] += field * cos_wt[k]
+                self._im[k] += field * sin_wt[k]
+        self.num_samples += 1
+
+    def get_complex_amplitude(self):
+        """
+        Returns the complex amplitude maps (frequencies, h, w) as numpy array, u = Re(Z * exp(i*frequency*t)).
+        """
+        if self._re is None or self.num_samples == 0:
+            raise RuntimeError('the lock-in detector has not recorded any samples yet')
+        backend = backend_of(self._re)
+        scale = 2.0 / self.num_samples
+        return (backend.to_numpy(self._re) - 1j * backend.to_numpy(self._im)) * scale
+
+    def get_maps(self):
+        """ returns the amplitude and phase maps (frequencies, h, w) as numpy arrays """
+        z = self.get_complex_amplitude()
+        return np.abs(z), np.angle(z)
+
+    def convergence(self):
+        """
+        Returns the relative change of the amplitude maps since the last call (inf on the first call), e.g. to stop
+        the simulation once the change is small enough.
+        """
+        amplitude = np.abs(self.get_complex_amplitude())
+        last, self._last_amplitude = self._last_amplitude, amplitude
+        if last is None or last.shape != amplitude.shape:
+            return float('inf')
+        return float(np.linalg.norm(amplitude - last) / max(np.linalg.norm(amplitude), 1e-30))
+
+    def get_state(self):
+        if self._re is None:
+            return None
+        backend = backend_of(self._re)
+        return {'re': backend.to_numpy(self._re.copy()), 'im': backend.to_numpy(self._im.copy()),
+                'num_samples': self.num_samples}
+
+    def set_state(self, state):
+        self._re = np.array(state['re'])
+        self._im = np.array(state['im'])
+        self.num_samples = int(state['num_samples'])
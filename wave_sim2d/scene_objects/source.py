@@ -1,5 +1,6 @@
-from wave_sim2d.wave_simulation import SceneObject
-import cupy as cp
+from wave_sim2d.wave_simulation import SceneObject, SceneParameter
+from wave_sim2d.backend import backend_of
+from wave_sim2d.source_table import EmitterSet
 import numpy as np
 import math
 
@@ -14,7 +15,15 @@ class PointSource(SceneObject):
     :param phase: emitter phase
     :param amp_modulator: optional amplitude modulator. This can be used to change the amplitude of the source
                           over time.
+    The parameters can be changed while the simulation runs, the simulator picks up the new values.
     """
+    x = SceneParameter()
+    y = SceneParameter()
+    frequency = SceneParameter()
+    amplitude = SceneParameter()
+    phase = SceneParameter()
+    amplitude_modulator = SceneParameter()
+
     def __init__(self, x, y, frequency, amplitude=1.0, phase=0, amp_modulator=None):
         self.x = x
         self.y = y
@@ -26,7 +35,7 @@ class PointSource(SceneObject):
     def set_amplitude_modulator(self, func):
         self.amplitude_modulator = func
 
-    def render(self, field: cp.ndarray, wave_speed_field: cp.ndarray, dampening_field: cp.ndarray):
+    def render(self, field, wave_speed_field, dampening_field):
         pass
 
     def update_field(self, field, t):
@@ -35,13 +44,20 @@ class PointSource(SceneObject):
         else:
             amplitude = self.amplitude
 
-        v = cp.sin(self.phase + self.frequency * t) * amplitude
+        v = math.sin(self.phase + self.frequency * t) * amplitude
         field[self.y, self.x] = v
 
+    def get_emitters(self, field_shape):
+        return EmitterSet([self.y], [self.x], self.phase, self.frequency, self.amplitude, self.amplitude_modulator)
+
     def render_visualization(self, image: np.ndarray):
         """ renders a visualization of the scene object to the image """
         pass
 
+    def is_static(self):
+        # sources only modify the field, they do not contribute to the wave speed and dampening fields
+        return True
+
 
 class LineSource(SceneObject):
     """
@@ -54,7 +70,15 @@ class LineSource(SceneObject):
     :param phase: emitter phase
     :param amp_modulator: optional amplitude modulator. This can be used to change the amplitude of the source
                           over time.
+    The parameters can be changed while the simulation runs, the simulator picks up the new values.
     """
+    start = SceneParameter()
+    end = SceneParameter()
+    frequency = SceneParameter()
+    amplitude = SceneParameter()
+    phase = SceneParameter()
+    amplitude_modulator = SceneParameter()
+
     def __init__(self, start, end, frequency, amplitude=1.0, phase=0, amp_modulator=None):
         self.start = start
         self.end = end
@@ -62,11 +86,41 @@ class LineSource(SceneObject):
         self.amplitude = amplitude
         self.phase = phase
         self.amplitude_modulator = amp_modulator
+        self._cached_coords = None
+        self._cached_key = None
 
     def set_amplitude_modulator(self, func):
         self.amplitude_modulator = func
 
-    def render(self, field: cp.ndarray, wave_speed_field: cp.ndarray, dampening_field: cp.ndarray):
+    def _line_coordinates(self, field_shape):
+        """
+        Returns the (y, x) pixel coordinates of the line inside a field of the given shape. The coordinates only
+        depend on the geometry and are cached until the parameters change.
+        """
+        key = (field_shape, self.get_version())
+        if self._cached_coords is not None and self._cached_key == key:
+            return self._cached_coords
+
+        # Determine the points along the line using NumPy
+        x1, y1 = self.start
+        x2, y2 = self.end
+
+        distance = np.sqrt((x2 - x1)**2 + (y2 - y1)**2)
+        num_points = int(distance) + 1
+
+        x_coords = np.linspace(x1, x2, num_points).round().astype(int)
+        y_coords = np.linspace(y1, y2, num_points).round().astype(int)
+
+        # Create boolean masks for valid indices
+        valid_x = (x_coords >= 0) & (x_coords < field_shape[1])
+        valid_y = (y_coords >= 0) & (y_coords < field_shape[0])
+        valid_indices = valid_x & valid_y
+
+        self._cached_coords = (y_coords[valid_indices], x_coords[valid_indices])
+        self._cached_key = key
+        return self._cached_coords
+
+    def render(self, field, wave_speed_field, dampening_field):
         pass
 
     def update_field(self, field, t):
@@ -75,33 +129,30 @@ class LineSource(SceneObject):
         else:
             amplitude = self.amplitude
 
-        v = cp.sin(self.phase + self.frequency * t) * amplitude
+        v = math.sin(self.phase + self.frequency * t) * amplitude
 
-        # Determine the points along the line using NumPy
-        x1, y1 = self.start
-        x2, y2 = self.end
+        # move the cached coordinates to the backend of the field (only copies on the first call)
+        backend = backend_of(field)
+        y_coords, x_coords = self._line_coordinates(field.shape)
+        self._cached_coords = (backend.asarray(y_coords), backend.asarray(x_coords))
 
-        distance = np.sqrt((x2 - x1)**2 + (y2 - y1)**2)
-        num_points = int(distance) + 1
-
-        if num_points > 0:
-            x_coords = cp.linspace(x1, x2, num_points).round().astype(int)
-            y_coords = cp.linspace(y1, y2, num_points).round().astype(int)
+        # Use the valid indices to update the field directly
+        field[self._cached_coords[0], self._cached_coords[1]] = v
 
-            # Create boolean masks for valid indices
-            valid_x = (x_coords >= 0) & (x_coords < field.shape[1])
-            valid_y = (y_coords >= 0) & (y_coords < field.shape[0])
-            valid_indices = valid_x & valid_y
-
-            # Use these valid indices to update the field directly
-            valid_y_coords = y_coords[valid_indices]
-            valid_x_coords = x_coords[valid_indices]
-            field[valid_y_coords, valid_x_coords] = v
+    def get_emitters(self, field_shape):
+        y_coords, x_coords = self._line_coordinates(field_shape)
+        backend = backend_of(y_coords)
+        return EmitterSet(backend.to_numpy(y_coords), backend.to_numpy(x_coords), self.phase, self.frequency,
+                          self.amplitude, self.amplitude_modulator)
 
     def render_visualization(self, image: np.ndarray):
         """ renders a visualization of the scene object to the image """
         pass
 
+    def is_static(self):
+        # sources only modify the field, they do not contribute to the wave speed and dampening fields
+        return True
+
 # --- Modulators -------------------------------------------------------------------------------------------------------
 
 
@@ -1,5 +1,5 @@
 from wave_sim2d.wave_simulation import SceneObject
-import cupy as cp
+from wave_sim2d.backend import backend_of
 import numpy as np
 
 
@@ -17,8 +17,7 @@ class StaticDampening(SceneObject):
         """
         w = dampening_field.shape[1]
         h = dampening_field.shape[0]
-        self.d = cp.ones((h, w), dtype=cp.float32)
-        self.d = cp.clip(cp.array(dampening_field), 0.0, 1.0)
+        self.d = np.clip(np.array(dampening_field), 0.0, 1.0)
 
         # apply border dampening
         for i in range(border_thickness):
@@ -28,15 +27,24 @@ class StaticDampening(SceneObject):
             self.d[i:h - i, i] = v
             self.d[i:h - i, -(1 + i)] = v
 
-    def render(self, field: cp.ndarray, wave_speed_field: cp.ndarray, dampening_field: cp.ndarray):
+    def render(self, field, wave_speed_field, dampening_field):
         assert (dampening_field.shape == self.d.shape)
 
+        # move the dampening field to the backend and dtype of the simulation once, later calls do not copy
+        self.d = backend_of(dampening_field).asarray(self.d, dtype=dampening_field.dtype)
+
         # overwrite existing dampening field
         dampening_field[:] = self.d
 
-    def update_field(self, field: cp.ndarray, t):
+    def update_field(self, field, t):
         pass
 
+    def modifies_field(self):
+        return False
+
     def render_visualization(self, image: np.ndarray):
         """ renders a visualization of the scene object to the image """
         pass
+
+    def is_static(self):
+        return True
@@ -1,7 +1,8 @@
 from wave_sim2d.wave_simulation import SceneObject
 
 import numpy as np
-import cupy as cp
+from wave_sim2d.backend import backend_of
+from wave_sim2d.source_table import EmitterSet
 from wave_sim2d.scene_objects.static_dampening import StaticDampening
 from wave_sim2d.scene_objects.static_refractive_index import StaticRefractiveIndex
 
@@ -40,23 +41,35 @@ class StaticImageScene(SceneObject):
 
         # set source frequency to channel value
         self.sources[:, 4] = scene_image[sources_pos[:, 1], sources_pos[:, 0], 1] / 255 * 0.5 * source_fequency_scale
-        self.sources = cp.array(self.sources).astype(cp.float32)
+        self.sources = self.sources.astype(np.float32)
 
-    def render(self, field: cp.ndarray, wave_speed_field: cp.ndarray, dampening_field: cp.ndarray):
+    def render(self, field, wave_speed_field, dampening_field):
         """
         render the stat
         """
         self.dampening.render(field, wave_speed_field, dampening_field)
         self.refractive_index.render(field, wave_speed_field, dampening_field)
 
-    def update_field(self, field: cp.ndarray, t):
+    def update_field(self, field, t):
+        backend = backend_of(field)
+        self.sources = backend.asarray(self.sources)
+
         # Update the sources in the simulation field based on their properties.
-        v = cp.sin(self.sources[:, 2]+self.sources[:, 4]*t)*self.sources[:, 3]
-        coords = self.sources[:, 0:2].astype(cp.int32)
+        v = backend.xp.sin(self.sources[:, 2]+self.sources[:, 4]*t)*self.sources[:, 3]
+        coords = self.sources[:, 0:2].astype(np.int32)
 
         o = self.source_opacity
         field[coords[:, 1], coords[:, 0]] = field[coords[:, 1], coords[:, 0]]*o + v*(1.0-o)
 
+    def get_emitters(self, field_shape):
+        sources = backend_of(self.sources).to_numpy(self.sources)
+        coords = sources[:, 0:2].astype(np.int32)
+        return EmitterSet(coords[:, 1], coords[:, 0], sources[:, 2], sources[:, 4], sources[:, 3],
+                          opacity=self.source_opacity)
+
     def render_visualization(self, image: np.ndarray):
         """ renders a visualization of the scene object to the image """
         pass
+
+    def is_static(self):
+        return True
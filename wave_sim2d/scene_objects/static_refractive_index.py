@@ -1,5 +1,5 @@
 from wave_sim2d.wave_simulation import SceneObject
-import cupy as cp
+from wave_sim2d.backend import backend_of
 import numpy as np
 import cv2
 
@@ -17,21 +17,28 @@ class StaticRefractiveIndex(SceneObject):
                                        Note that values below 0.9 are clipped to prevent the simulation
                                        from becoming instable
         """
-        shape = refractive_index_field.shape
-        self.c = cp.ones((shape[0], shape[1]), dtype=cp.float32)
-        self.c = 1.0/cp.clip(cp.array(refractive_index_field), 0.9, 10.0)
+        self.c = 1.0/np.clip(np.array(refractive_index_field), 0.9, 10.0)
 
-    def render(self, field: cp.ndarray, wave_speed_field: cp.ndarray, dampening_field: cp.ndarray):
+    def render(self, field, wave_speed_field, dampening_field):
         assert (wave_speed_field.shape == self.c.shape)
+
+        # move the wave speed field to the backend and dtype of the simulation once, later calls do not copy
+        self.c = backend_of(wave_speed_field).asarray(self.c, dtype=wave_speed_field.dtype)
         wave_speed_field[:] = self.c
 
-    def update_field(self, field: cp.ndarray, t):
+    def update_field(self, field, t):
         pass
 
+    def modifies_field(self):
+        return False
+
     def render_visualization(self, image: np.ndarray):
         """ renders a visualization of the scene object to the image """
         pass
 
+    def is_static(self):
+        return True
+
 
 class StaticRefractiveIndexPolygon(SceneObject):
     """
@@ -52,20 +59,23 @@ class StaticRefractiveIndexPolygon(SceneObject):
         self._cached_coords = None
         self._cached_mask_values = None
         self._cached_field_shape = (0, 0)
+        self._cached_backend = None
 
-    def _create_polygon_data(self, field_shape):
+    def _create_polygon_data(self, field_shape, backend):
         """
         Creates and caches the pixel coordinates and anti-aliased mask values for the polygon.
 
         Args:
             field_shape (tuple): The shape (rows, cols) of the simulation field.
+            backend (ArrayBackend): The backend the cached arrays are created on.
 
         Returns:
             tuple: A tuple containing:
-                - coords (tuple of cp.ndarray): (y_coordinates, x_coordinates) of the polygon pixels within the field.
-                - mask_values (cp.ndarray): Corresponding anti-aliased mask values (0.0 to 1.0).
+                - coords (tuple of arrays): (y_coordinates, x_coordinates) of the polygon pixels within the field.
+                - mask_values (array): Corresponding anti-aliased mask values (0.0 to 1.0).
         """
-        if self._cached_coords is not None and self._cached_field_shape == field_shape:
+        if self._cached_coords is not None and self._cached_field_shape == field_shape and \
+                self._cached_backend is backend:
             return self._cached_coords, self._cached_mask_values
 
         rows, cols = field_shape
@@ -103,26 +113,38 @@ class StaticRefractiveIndexPolygon(SceneObject):
         valid_global_x = global_coords_x[in_bounds]
         valid_mask_values = mask_values[in_bounds]
 
-        self._cached_coords = (cp.array(valid_global_y), cp.array(valid_global_x))
-        self._cached_mask_values = cp.array(valid_mask_values, dtype=cp.float32)
+        self._cached_coords = (backend.asarray(valid_global_y), backend.asarray(valid_global_x))
+        self._cached_mask_values = backend.asarray(valid_mask_values, dtype=np.float32)
         self._cached_field_shape = field_shape
+        self._cached_backend = backend
         return self._cached_coords, self._cached_mask_values
 
-    def render(self, field: cp.ndarray, wave_speed_field: cp.ndarray, dampening_field: cp.ndarray):
-        coords, mask_values = self._create_polygon_data(wave_speed_field.shape)
+    def render(self, field, wave_speed_field, dampening_field):
+        coords, mask_values = self._create_polygon_data(wave_speed_field.shape, backend_of(wave_speed_field))
 
         # Use advanced indexing to update the field and perform alpha blending
         bg_wave_speed = wave_speed_field[coords[0], coords[1]]
         wave_speed_field[coords[0], coords[1]] = (bg_wave_speed * (1.0 - mask_values) +
                                                   mask_values / self.refractive_index)
 
-    def update_field(self, field: cp.ndarray, t):
+    def update_field(self, field, t):
         pass
 
+    def modifies_field(self):
+        return False
+
+    def get_refined(self, x, y, factor):
+        # the polygon is rasterised again in the coordinates of the fine grid
+        vertices = (self.vertices - [x - 0.5, y - 0.5]) * factor - 0.5
+        return StaticRefractiveIndexPolygon(vertices, self.refractive_index)
+
     def render_visualization(self, image: np.ndarray):
         vertices = np.round(self.vertices).astype(np.int32)
         cv2.fillPoly(image, [vertices], (60, 60, 60), lineType=cv2.LINE_AA)
 
+    def is_static(self):
+        return True
+
 
 class StaticRefractiveIndexBox(StaticRefractiveIndexPolygon):
     """
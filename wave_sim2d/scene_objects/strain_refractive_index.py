@@ -1,43 +1,140 @@
 from wave_sim2d.wave_simulation import SceneObject
-import cupy as cp
-import cupyx.scipy.signal
+from wave_sim2d.backend import backend_of
+from wave_sim2d.engines import _jit, numba
+from wave_sim2d.precision import compute_dtype, as_compute
 import numpy as np
 
+
+@_jit
+def _strain_wave_speed(u, offset, coupling, out, strain, keep_strain):
+    """
+    wave speed 1 / clip(offset + coupling * |grad(u)|, 0.9, 10) in a single pass, the gradient is the central
+    difference with zero boundary. The strain is written to 'strain' if keep_strain is set.
+    """
+    h, w = u.shape
+    for y in range(h):
+        for x in range(w):
+            left = u[y, x - 1] if x > 0 else 0.0
+            right = u[y, x + 1] if x < w - 1 else 0.0
+            up = u[y - 1, x] if y > 0 else 0.0
+            down = u[y + 1, x] if y < h - 1 else 0.0
+            du_dx = right - left
+            du_dy = down - up
+            s = np.sqrt(du_dx * du_dx + du_dy * du_dy)
+            if keep_strain:
+                strain[y, x] = s
+            n = min(max(offset + s * coupling, 0.9), 10.0)
+            out[y, x] = 1.0 / n
+
+
+_strain_cupy_kernel = None
+
+
+def _get_strain_cupy_kernel():
+    global _strain_cupy_kernel
+    if _strain_cupy_kernel is None:
+        import cupy
+        _strain_cupy_kernel = cupy.ElementwiseKernel(
+            'raw T u, int32 h, int32 w, T offset, T coupling', 'T c, raw T strain, bool keep_strain',
+            '''
+            const int y = i / w;
+            const int x = i % w;
+            const T left = x > 0 ? u[i - 1] : (T)0;
+            const T right = x < w - 1 ? u[i + 1] : (T)0;
+            const T up = y > 0 ? u[i - w] : (T)0;
+            const T down = y < h - 1 ? u[i + w] : (T)0;
+            const T du_dx = right - left;
+            const T du_dy = down - up;
+            const T s = sqrt(du_dx * du_dx + du_dy * du_dy);
+            if (keep_strain) strain[i] = s;
+            c = (T)1 / min(max(offset + s * coupling, (T)0.9), (T)10);
+            ''', 'wave_sim2d_strain_wave_speed')
+    return _strain_cupy_kernel
+
+
 class StrainRefractiveIndex(SceneObject):
     """
     Implements a dynamic refractive index field that linearly depends on the strain of the current field.
     The refractive index within the entire domain is overwritten
+    The strain (magnitude of the central difference gradient) and the wave speed are computed by a fused kernel in
+    a single pass over the field (numba or cupy, array expressions without numba).
     """
 
-    def __init__(self, refractive_index_offset, coupling_constant):
+    def __init__(self, refractive_index_offset, coupling_constant, update_every=1, keep_strain_field=True):
         """
         Creates a strain refractive index field object
         :param coupling_constant: coupling constant between the strain and the refractive index
+        :param update_every: recompute the wave speed only every k-th rendering and reuse it in between, for slowly
+                             varying strain
+        :param keep_strain_field: store the strain of the last computation in strain_field, False saves one write
+                                  per cell when the strain is not needed
         """
         self.coupling_constant = coupling_constant
         self.refractive_index_offset = refractive_index_offset
-
-        self.du_dx_kernel = cp.array([[-1, 0.0, 1]])
-        self.du_dy_kernel = cp.array([[-1], [0.0], [1]])
+        self.update_every = update_every
+        self.keep_strain_field = keep_strain_field
 
         self.strain_field = None
+        self._wave_speed = None
+        self._num_renders = 0
+
+    def _compute(self, field, out):
+        """ computes the wave speed of the field into out, both in the compute dtype """
+        backend = backend_of(field)
+        dtype = field.dtype.type
+        offset, coupling = dtype(self.refractive_index_offset), dtype(self.coupling_constant)
+        if self.keep_strain_field and (self.strain_field is None or self.strain_field.shape != field.shape or
+                                       backend_of(self.strain_field) is not backend):
+            self.strain_field = backend.xp.empty(field.shape, dtype=field.dtype)
+        strain = self.strain_field if self.keep_strain_field else out
 
-    def render(self, field: cp.ndarray, wave_speed_field: cp.ndarray, dampening_field: cp.ndarray):
-        # compute strain
-        du_dx = cupyx.scipy.signal.convolve2d(field, self.du_dx_kernel, mode='same', boundary='fill')
-        du_dy = cupyx.scipy.signal.convolve2d(field, self.du_dy_kernel, mode='same', boundary='fill')
+        if backend.is_gpu:
+            h, w = field.shape
+            _get_strain_cupy_kernel()(backend.xp.ascontiguousarray(field), h, w, offset, coupling, out, strain,
+                                      self.keep_strain_field)
+        elif numba is not None:
+            _strain_wave_speed(field, offset, coupling, out, strain, self.keep_strain_field)
+        else:
+            xp = backend.xp
+            padded = xp.pad(field, 1)
+            du_dx = padded[1:-1, 2:] - padded[1:-1, :-2]
+            du_dy = padded[2:, 1:-1] - padded[:-2, 1:-1]
+            du_dx *= du_dx
+            du_dy *= du_dy
+            du_dx += du_dy
+            xp.sqrt(du_dx, out=du_dx)
+            if self.keep_strain_field:
+                strain[:] = du_dx
+            du_dx *= coupling
+            du_dx += offset
+            xp.clip(du_dx, 0.9, 10.0, out=du_dx)
+            xp.divide(1.0, du_dx, out=out)
 
-        self.strain_field = cp.sqrt(du_dx**2 + du_dy**2)
+    def render(self, field, wave_speed_field, dampening_field):
+        field = as_compute(field)
+        update = self._num_renders % self.update_every == 0
+        self._num_renders += 1
 
-        # compute refractive index from strain
-        refractive_index_field = self.refractive_index_offset + self.strain_field*self.coupling_constant
+        # without a cadence the wave speed is written to the simulator field directly
+        if self.update_every == 1 and wave_speed_field.dtype == field.dtype and wave_speed_field.ndim == 2:
+            self._compute(field, wave_speed_field)
+            return
 
-        # assign wave speed using refractive index from above
-        wave_speed_field[:] = 1.0/cp.clip(cp.array(refractive_index_field), 0.9, 10.0)
+        backend = backend_of(field)
+        if self._wave_speed is None or self._wave_speed.shape != field.shape or \
+                backend_of(self._wave_speed) is not backend:
+            self._wave_speed = backend.xp.empty(field.shape, dtype=compute_dtype(field.dtype))
+            update = True
+        if update:
+            self._compute(field, self._wave_speed)
+        wave_speed_field[:] = self._wave_speed
 
-    def update_field(self, field: cp.ndarray, t):
+    def update_field(self, field, t):
         pass
 
+    def modifies_field(self):
+        return False
+
     def render_visualization(self, image: np.ndarray):
         """ renders a visualization of the scene object to the image """
         pass
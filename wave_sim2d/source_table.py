@@ -0,0 +1,92 @@
+import numpy as np
+
+
+class EmitterSet:
+    """
+    Describes the sinusoidal emitters of one scene object: value = sin(phase + frequency*t) * amplitude * modulator(t)
+    Phase, frequency and amplitude are either scalars or arrays with one entry per emitter.
+    :param ys: emitter y coordinates (integer array)
+    :param xs: emitter x coordinates (integer array)
+    :param phase: emitter phase
+    :param frequency: emitting frequency
+    :param amplitude: emitting amplitude
+    :param modulator: optional amplitude modulator, a callable returning a factor for the time t
+    :param opacity: opacity of the emitter pixels to incoming waves, 0.0 overwrites the field with the source value
+    """
+    def __init__(self, ys, xs, phase, frequency, amplitude, modulator=None, opacity=0.0):
+        self.ys = np.asarray(ys, dtype=np.int64).ravel()
+        self.xs = np.asarray(xs, dtype=np.int64).ravel()
+        n = len(self.ys)
+        self.phase = np.broadcast_to(np.asarray(phase, dtype=np.float64), (n,))
+        self.frequency = np.broadcast_to(np.asarray(frequency, dtype=np.float64), (n,))
+        self.amplitude = np.broadcast_to(np.asarray(amplitude, dtype=np.float64), (n,))
+        self.opacity = np.broadcast_to(np.asarray(opacity, dtype=np.float64), (n,))
+        self.modulator = modulator
+
+    def __len__(self):
+        return len(self.ys)
+
+
+class SourceTable:
+    """
+    Merges the emitters of many scene objects into one cached table of coordinates, phases, frequencies and
+    amplitudes. Each step all emitters are evaluated and scattered into the field with a few vectorised operations,
+    instead of one small operation per source object. Emitters later in the table win where coordinates overlap.
+    """
+    def __init__(self, emitter_sets, backend):
+        """
+        @param emitter_sets: list of EmitterSet objects
+        @param backend: ArrayBackend the table is stored on
+        """
+        emitter_sets = [e for e in emitter_sets if len(e) > 0]
+        self.emitter_sets = emitter_sets
+        self.backend = backend
+        self.num_emitters = sum(len(e) for e in emitter_sets)
+
+        def concat(name, dtype):
+            values = [getattr(e, name) for e in emitter_sets]
+            return backend.asarray(np.concatenate(values).astype(dtype) if values else np.zeros(0, dtype))
+
+        self.ys = concat('ys', np.int64)
+        self.xs = concat('xs', np.int64)
+        self.phase = concat('phase', np.float64)
+        self.frequency = concat('frequency', np.float64)
+        self.amplitude = concat('amplitude', np.float64)
+
+        opacity = np.concatenate([e.opacity for e in emitter_sets]) if emitter_sets else np.zeros(0)
+        self.opacity = backend.asarray(opacity) if np.any(opacity != 0.0) else None
+
+        # all emitters of one set share the modulator, the index points into the per step factor array, where the
+        # last entry (1.0) is used by unmodulated emitters
+        self.modulators = [e.modulator for e in emitter_sets if e.modulator is not None]
+        self._modulator_factors = np.ones(len(self.modulators) + 1, dtype=np.float64)
+        if self.modulators:
+            modulator_index = []
+            i = 0
+            for e in emitter_sets:
+                if e.modulator is not None:
+                    modulator_index.append(np.full(len(e), i))
+                    i += 1
+                else:
+                    modulator_index.append(np.full(len(e), len(self.modulators)))
+            self.modulator_index = backend.asarray(np.concatenate(modulator_index))
+        else:
+            self.modulator_index = None
+
+    def update_field(self, field, t):
+        """ evaluates all emitters for the time t and writes them to the field """
+        if self.num_emitters == 0:
+            return
+
+        xp = self.backend.xp
+        v = xp.sin(self.phase + self.frequency * t) * self.amplitude
+
+        if self.modulator_index is not None:
+            for i, modulator in enumerate(self.modulators):
+                self._modulator_factors[i] = modulator(t)
+            v *= self.backend.asarray(self._modulator_factors)[self.modulator_index]
+
+        if self.opacity is not None:
+            v = field[self.ys, self.xs] * self.opacity + v * (1.0 - self.opacity)
+
+        field[self.ys, self.xs] = v
@@ -0,0 +1,295 @@
+import numpy as np
+import cv2
+from wave_sim2d.wave_simulation import WaveSimulator2D, SceneObject
+from wave_sim2d.precision import as_compute, compute_dtype
+
+
+class _CoarseLevelScene(SceneObject):
+    """
+    Base layer of the fine level of a patch, the coarse scene rendered at the fine cells. It is static unless the
+    coarse scene has dynamic objects, whose contribution changes with every rendering of the coarse scene.
+    """
+    def __init__(self):
+        self.c = None
+        self.d = None
+        self.dynamic = False
+
+    def render(self, field, wave_speed_field, dampening_field):
+        wave_speed_field[:] = self.c
+        dampening_field[:] = self.d
+
+    def update_field(self, field, t):
+        pass
+
+    def render_visualization(self, image: np.ndarray):
+        pass
+
+    def is_static(self):
+        return not self.dynamic
+
+    def modifies_field(self):
+        return False
+
+
+class RefinedPatch:
+    """
+    Locally refined region of a WaveSimulator2D (subgridding). The patch covers the rectangle of w x h coarse cells
+    at (x, y) with a fine grid of factor times the resolution, which is advanced with factor steps of dt / factor
+    per coarse step, so the Courant number and the coefficient (c * dt)**2 of both levels are the same.
+    The levels overlap and are coupled in two bands at the border of the patch, so that neither level is
+    overwritten abruptly (a hard exchange of the fields feeds the interpolation errors back and forth between the
+    levels, which grows exponentially in long runs):
+        - in the margin of 'margin' coarse cells the coarse level leads. The fine field there is relaxed towards the
+          coarse field (bilinear in space, linear in time), with a weight decreasing from 'relaxation' next to the
+          border to 0 at the inner edge of the margin. The outermost ring of fine cells is set to the coarse field.
+        - inside the margin the fine level leads. The coarse field is blended with the average of the fine cells of
+          each coarse cell, with a weight increasing from 0 to 1 over 'band' coarse cells.
+    The relaxation damps the waves that are not resolved by the coarse level at the border of the patch, keep the
+    fine features at least margin + band coarse cells away from the border.
+
+    The coarse scene is rendered into both levels: whenever the coarse level renders a scene object, the patch
+    renders it into its fine wave speed and dampening fields as well (the dampening applied once per fine step).
+    Objects with a fine representation (see SceneObject.get_refined, e.g. polygons) are rasterised at the fine
+    resolution, the other objects set the fine cells of the coarse cells they changed to the coarse values. Dynamic
+    coarse objects are rendered into the fine level each time the coarse level renders them. The scene objects of
+    the patch are rendered on top, e.g. thin slits or fibre cores that the coarse grid can not resolve, they use the
+    coordinates of the fine grid, see to_fine. Sources that are covered by the patch have to be part of the patch
+    scene, since the coarse field there is replaced. The dampening of patch scene objects is applied per fine step.
+    """
+    def __init__(self, x, y, w, h, factor=2, scene_objects=None, engine=None, margin=2, band=4, relaxation=0.3):
+        """
+        @param x: Left coarse cell of the patch.
+        @param y: Top coarse cell of the patch.
+        @param w: Width of the patch in coarse cells.
+        @param h: Height of the patch in coarse cells.
+        @param factor: Refinement factor of the grid spacing and the time step.
+        @param scene_objects: Scene objects rendered into the fine grid, in fine grid coordinates.
+        @param engine: Field update engine of the fine level, see WaveSimulator2D.
+        @param margin: Coarse cells at the border of the patch that are not replaced by the fine solution, the fine
+                       field is relaxed towards the coarse field there. At least 1 is required.
+        @param band: Coarse cells inside the margin over which the coarse field is blended into the fine solution.
+        @param relaxation: Weight of the coarse field in the relaxation of the fine field next to the border of the
+                           patch per fine step, between 0 and 1.
+        """
+        assert factor >= 1, 'the refinement factor has to be at least 1'
+        assert margin >= 1 and w > 2 * margin and h > 2 * margin, 'the patch has to be larger than twice its margin'
+        assert band >= 0, 'the band can not be negative'
+        assert 0.0 <= relaxation <= 1.0, 'the relaxation has to be between 0 and 1'
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+        self.factor = factor
+        self.scene_objects = scene_objects if scene_objects is not None else []
+        self.engine = engine
+        self.margin = margin
+        self.band = band
+        self.relaxation = relaxation
+        self.simulator = None
+        self._base = _CoarseLevelScene()
+        self._refined = {}
+        self._fine_c = None
+        self._fine_d = None
+        self._static_c = None
+        self._static_d = None
+        self._region_c = None
+        self._region_d = None
+        self._upsample = None
+        self._initialized = False
+        self._border = None
+        self._border_coordinates = None
+        self._border_weights = None
+        self._restriction_weights = None
+
+    def to_fine(self, x, y):
+        """ converts coarse grid coordinates (of cell centers) to the coordinates of the fine grid of the patch """
+        r = self.factor
+        return (x - self.x + 0.5) * r - 0.5, (y - self.y + 0.5) * r - 0.5
+
+    def _fine_coordinates(self):
+        """ coarse (y, x) coordinates of the centers of all fine cells, each of the shape (h * factor, w * factor) """
+        r = self.factor
+        ys = self.y + (np.arange(self.h * r) + 0.5) / r - 0.5
+        xs = self.x + (np.arange(self.w * r) + 0.5) / r - 0.5
+        return np.meshgrid(ys, xs, indexing='ij')
+
+    def _setup(self, coarse):
+        """ creates the fine level for the given coarse simulator """
+        ch, cw = coarse.u.shape
+        assert coarse.u.ndim == 2, 'patches are not supported by ensembles'
+        assert self.x >= 1 and self.y >= 1 and self.x + self.w < cw and self.y + self.h < ch, \
+            'the patch has to keep a distance of one cell to the border of the grid'
+
+        r = self.factor
+        self.simulator = WaveSimulator2D(self.w * r, self.h * r, [self._base] + self.scene_objects,
+                                         backend=coarse.backend, engine=self.engine, precision=coarse.dtype)
+
+        # fine cells in the margin, their coarse coordinates and relaxation weights (1 for the outermost ring)
+        backend = coarse.backend
+        dtype = compute_dtype(coarse.dtype)
+        ys, xs = self._fine_coordinates()
+        distance = np.minimum.outer(self._border_distance(self.h * r), self._border_distance(self.w * r))
+        weights = self.relaxation * (1.0 - distance / (self.margin * r))
+        weights[distance == 0] = 1.0
+        border = weights > 0
+        self._border = tuple(backend.asarray(a) for a in np.nonzero(border))
+        self._border_coordinates = backend.asarray(np.stack([ys[border], xs[border]]))
+        self._border_weights = backend.asarray(weights[border].astype(dtype))
+
+        # weights of the fine solution in the coarse cells inside the margin
+        m = self.margin
+        ramp_y = np.clip((self._border_distance(self.h)[m:self.h - m] - m + 1) / (self.band + 1), 0.0, 1.0)
+        ramp_x = np.clip((self._border_distance(self.w)[m:self.w - m] - m + 1) / (self.band + 1), 0.0, 1.0)
+        self._restriction_weights = backend.asarray(np.minimum.outer(ramp_y, ramp_x).astype(dtype))
+
+        # wave speed and dampening of the coarse scene at the fine cells and in the coarse cells of the patch
+        xp = backend.xp
+        self._fine_c = xp.ones((self.h * r, self.w * r), dtype=coarse.dtype)
+        self._fine_d = xp.ones((self.h * r, self.w * r), dtype=coarse.dtype)
+        self._region_c = xp.ones((self.h, self.w), dtype=coarse.dtype)
+        self._region_d = xp.ones((self.h, self.w), dtype=coarse.dtype)
+        self._upsample = (backend.asarray(np.arange(self.h * r)[:, None] // r),
+                          backend.asarray(np.arange(self.w * r)[None, :] // r))
+
+    @staticmethod
+    def _border_distance(n):
+        """ distance of the cells of an axis of n cells to the nearest end of the axis """
+        i = np.arange(n)
+        return np.minimum(i, n - 1 - i)
+
+    def _interpolate(self, coarse_field, coordinates):
+        """ bilinear interpolation of the coarse field at the given (2, ...) coarse coordinates """
+        ndimage = self.simulator.backend.ndimage
+        return ndimage.map_coordinates(as_compute(coarse_field), coordinates, order=1, mode='nearest')
+
+    def _get_refined(self, obj):
+        """ fine representation of a coarse scene object (or None), cached as long as the object is unchanged """
+        key = id(obj)
+        version = obj.get_version()
+        if key not in self._refined or self._refined[key][0] is not obj or self._refined[key][1] != version:
+            self._refined[key] = (obj, version, obj.get_refined(self.x, self.y, self.factor))
+        return self._refined[key][2]
+
+    def begin_scene(self, coarse, bake):
+        """
+        Called by the coarse level before it renders its scene objects. A bake starts from the empty scene, the
+        rendering of the dynamic objects from the baked static objects.
+        """
+        if self.simulator is None:
+            self._setup(coarse)
+        if bake:
+            self._refined = {}
+            self._fine_c.fill(1.0)
+            self._fine_d.fill(1.0)
+        else:
+            self._fine_c[:] = self._static_c
+            self._fine_d[:] = self._static_d
+        region = (slice(self.y, self.y + self.h), slice(self.x, self.x + self.w))
+        self._region_c[:] = coarse.c[region]
+        self._region_d[:] = coarse.d[region]
+
+    def render_object(self, coarse, obj):
+        """ called by the coarse level after it rendered the scene object obj, renders it into the fine level """
+        region = (slice(self.y, self.y + self.h), slice(self.x, self.x + self.w))
+        c, d = coarse.c[region], coarse.d[region]
+        refined = self._get_refined(obj)
+        if refined is not None:
+            refined.render(self.simulator.u, self._fine_c, self._fine_d)
+        else:
+            # the fine cells of the coarse cells changed by the object take the coarse values
+            xp = coarse.backend.xp
+            rows, cols = self._upsample
+            changed = ((c != self._region_c) | (d != self._region_d))[rows, cols]
+            xp.copyto(self._fine_c, c[rows, cols], where=changed)
+            xp.copyto(self._fine_d, d[rows, cols], where=changed)
+        self._region_c[:] = c
+        self._region_d[:] = d
+
+    def end_scene(self, coarse, bake, dynamic):
+        """
+        Called by the coarse level after it rendered its scene objects, hands the fine fields to the base layer of
+        the fine level. After a bake, dynamic tells if dynamic objects are rendered on top of the static ones.
+        """
+        if bake:
+            if dynamic:
+                self._static_c = self._fine_c.copy()
+                self._static_d = self._fine_d.copy()
+            else:
+                self._static_c = None
+                self._static_d = None
+            self._base.dynamic = dynamic
+            # the fine level bakes its scene again at the next rendering
+            self._base.mark_changed()
+        self._base.c = self._fine_c
+        self._base.d = as_compute(self._fine_d) ** (1.0 / self.factor)
+
+    def step(self, coarse, u_prev, u, u_next):
+        """
+        Advances the fine level by one coarse step from the coarse time coarse.t and replaces the interior of the
+        patch in u_next, the coarse field of the next step.
+        """
+        if self._base.c is None:
+            # the coarse scene was not rendered yet
+            coarse.render_scene()
+
+        fine = self.simulator
+        r = self.factor
+        if not self._initialized:
+            # start from the coarse fields
+            coordinates = coarse.backend.asarray(np.stack(self._fine_coordinates()))
+            fine.u[:] = self._interpolate(u, coordinates)
+            fine.u_prev[:] = self._interpolate(u_prev, coordinates)
+            fine.engine.invalidate()
+            self._initialized = True
+
+        # coarse field in the margin at the current and next coarse time
+        border_current, border_next = [self._interpolate(a, self._border_coordinates) for a in (u, u_next)]
+
+        fine.dt = coarse.dt
+        fine.global_dampening = coarse.global_dampening ** (1.0 / r)
+        for j in range(r):
+            fine.t = coarse.t + j * coarse.dt / r
+            fine.render_scene()
+            fine.update_scene_field()
+            fine.update_field()
+
+            # relaxation towards the coarse field, linear in time, s is the time since the current coarse step
+            s = (j + 1) / r
+            target = (1.0 - s) * border_current + s * border_next
+            current = as_compute(fine.u[self._border])
+            fine.u[self._border] = current + self._border_weights * (target - current)
+        fine.t = coarse.t + coarse.dt
+
+        # restriction: average of the fine cells of each coarse cell, blended into the coarse field inside the margin
+        m = self.margin
+        blocks = as_compute(fine.u).reshape(self.h, r, self.w, r).mean(axis=(1, 3))[m:self.h - m, m:self.w - m]
+        region = (slice(self.y + m, self.y + self.h - m), slice(self.x + m, self.x + self.w - m))
+        current = as_compute(u_next[region])
+        u_next[region] = current + self._restriction_weights * (blocks - current)
+
+    def get_field(self):
+        """ returns the field of the fine level, see WaveSimulator2D.get_field """
+        return self.simulator.get_field() if self.simulator is not None else None
+
+    def get_pixels(self, shape):
+        """ returns the (y, x) numpy coordinates of the coarse cells the patch writes to """
+        ys, xs = np.mgrid[self.y:self.y + self.h, self.x:self.x + self.w]
+        return ys.ravel(), xs.ravel()
+
+    def get_state(self):
+        """ returns the state of the fine level as dictionary of numpy arrays """
+        return self.simulator.get_state() if self.simulator is not None else {}
+
+    def set_state(self, state, coarse):
+        """ restores the state returned by get_state for the given coarse simulator """
+        if not state:
+            self._initialized = False
+            return
+        if self.simulator is None:
+            self._setup(coarse)
+        self.simulator.set_state(state)
+        self._initialized = True
+
+    def render_visualization(self, image: np.ndarray):
+        """ renders the outline of the patch to the image of the coarse level """
+        cv2.rectangle(image, (self.x, self.y), (self.x + self.w - 1, self.y + self.h - 1), (120, 120, 120), 1)
@@ -0,0 +1,299 @@
+import os
+import itertools
+import multiprocessing
+import numpy as np
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from wave_sim2d.wave_simulation import WaveSimulator2D
+from wave_sim2d.precision import as_compute
+
+
+class Reduction(ABC):
+    """
+    Interface for the quantities recorded during a sweep. Instead of keeping full fields, each point of a sweep only
+    records its reductions, which are returned as numpy arrays.
+    """
+    def __init__(self, name):
+        """
+        @param name: Key of the result in the aggregated results.
+        """
+        self.name = name
+
+    @abstractmethod
+    def reset(self, simulator):
+        """ called once before recording starts """
+        pass
+
+    @abstractmethod
+    def record(self, simulator):
+        """ called with the simulator after every recorded step """
+        pass
+
+    @abstractmethod
+    def result(self):
+        """ returns the recorded quantity as numpy array """
+        pass
+
+
+class ProbeSeries(Reduction):
+    """
+    Records the field values at probe points for every recorded step, result shape (steps, num_points).
+    """
+    def __init__(self, points, name='probe_series'):
+        """
+        @param points: list of (x, y) probe coordinates
+        """
+        super().__init__(name)
+        self.points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        self._xs = self._ys = None
+        self._backend = None
+        self._values = []
+
+    def reset(self, simulator):
+        self._backend = simulator.backend
+        self._xs = simulator.backend.asarray(self.points[:, 0])
+        self._ys = simulator.backend.asarray(self.points[:, 1])
+        self._values = []
+
+    def record(self, simulator):
+        self._values.append(simulator.get_field()[self._ys, self._xs])
+
+    def result(self):
+        if not self._values:
+            return np.zeros((0, len(self.points)), dtype=np.float32)
+        return self._backend.to_numpy(self._backend.xp.stack(self._values))
+
+
+class ProbeIntensity(Reduction):
+    """
+    Time averaged intensity (squared field) at probe points, result shape (num_points,).
+    """
+    def __init__(self, points, name='probe_intensity'):
+        """
+        @param points: list of (x, y) probe coordinates
+        """
+        super().__init__(name)
+        self.points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        self._xs = self._ys = None
+        self._backend = None
+        self._sum = None
+        self._count = 0
+
+    def reset(self, simulator):
+        self._backend = simulator.backend
+        self._xs = simulator.backend.asarray(self.points[:, 0])
+        self._ys = simulator.backend.asarray(self.points[:, 1])
+        self._sum = simulator.backend.xp.zeros(len(self.points), dtype=np.float64)
+        self._count = 0
+
+    def record(self, simulator):
+        v = simulator.get_field()[self._ys, self._xs]
+        self._sum += v * v
+        self._count += 1
+
+    def result(self):
+        return self._backend.to_numpy(self._sum) / max(self._count, 1)
+
+
+class Energy(Reduction):
+    """
+    Sum of the squared field over the grid for every recorded step, result shape (steps,).
+    """
+    def __init__(self, name='energy'):
+        super().__init__(name)
+        self._values = []
+
+    def reset(self, simulator):
+        self._values = []
+
+    def record(self, simulator):
+        u = as_compute(simulator.get_field())
+        self._values.append(float(simulator.backend.xp.vdot(u, u)))
+
+    def result(self):
+        return np.asarray(self._values, dtype=np.float64)
+
+
+class TimeAveragedIntensity(Reduction):
+    """
+    Time averaged intensity map (squared field), result shape (h, w). The sum is kept in float64, in float32 the
+    contributions of late steps would be rounded away in long runs.
+    """
+    def __init__(self, name='intensity'):
+        super().__init__(name)
+        self._backend = None
+        self._sum = None
+        self._count = 0
+
+    def reset(self, simulator):
+        self._backend = simulator.backend
+        self._sum = simulator.backend.xp.zeros(simulator.get_field().shape, dtype=np.float64)
+        self._count = 0
+
+    def record(self, simulator):
+        u = as_compute(simulator.get_field())
+        self._sum += u * u
+        self._count += 1
+
+    def result(self):
+        return self._backend.to_numpy(self._sum) / max(self._count, 1)
+
+
+def _settings(num_steps, skip_steps, record_every, reductions):
+    """ the settings of a sweep the results of a point depend on, stored with the results of each point """
+    return {'sweep_num_steps': np.asarray(num_steps), 'sweep_skip_steps': np.asarray(skip_steps),
+            'sweep_record_every': np.asarray(record_every),
+            'sweep_reductions': np.asarray([f'{type(r).__name__}:{r.name}' for r in reductions])}
+
+
+def _run_point(build_scene, params, num_steps, skip_steps, record_every, reductions, simulator_kwargs, path):
+    """ simulates one point of the sweep and writes its reductions to path, runs in a worker process """
+    scene_objects, w, h = build_scene(**params)
+    simulator = WaveSimulator2D(w, h, scene_objects, **simulator_kwargs)
+
+    simulator.run(skip_steps)
+    for reduction in reductions:
+        reduction.reset(simulator)
+
+    def record(sim):
+        for r in reductions:
+            r.record(sim)
+
+    simulator.run(num_steps - skip_steps, callbacks=[record], callbacks_every=record_every)
+
+    # write to a temporary file first, so a crash never leaves a partial result that looks finished
+    tmp_path = path + '.tmp.npz'
+    results = {'param_' + name: np.asarray(value) for name, value in params.items()}
+    results.update(_settings(num_steps, skip_steps, record_every, reductions))
+    results.update({r.name: r.result() for r in reductions})
+    np.savez(tmp_path, **results)
+    os.replace(tmp_path, path)
+    return path
+
+
+class ParameterSweep:
+    """
+    Runs a scene for every combination of a parameter grid on a pool of worker processes. The scene builder is
+    called with one value of each parameter as keyword arguments and returns (scene_objects, width, height) like
+    the build_scene functions of the examples. Each point only records the requested reductions and stores them
+    in its own file together with its parameter values and the settings of the sweep. Points whose results exist
+    in the output directory for the same parameters and settings are skipped, so a crashed or interrupted sweep
+    resumes where it stopped. The builder and the reductions are sent to
+    the workers and must be picklable (e.g. module level functions).
+    """
+    def __init__(self, build_scene, parameters, num_steps, reductions, output_dir, skip_steps=0, record_every=1,
+                 num_workers=None, simulator_kwargs=None, start_method='spawn'):
+        """
+        @param build_scene: Callable build_scene(**params) -> (scene_objects, width, height).
+        @param parameters: Dictionary mapping each parameter name to the list of its values.
+        @param num_steps: Number of simulated steps per point.
+        @param reductions: List of Reduction objects recorded at each point.
+        @param output_dir: Directory for the per point results and the aggregated results.npz.
+        @param skip_steps: Number of initial steps that are not recorded (e.g. until the field is settled).
+        @param record_every: Number of steps between two recordings.
+        @param num_workers: Number of worker processes, defaults to the number of CPU cores.
+        @param simulator_kwargs: Further arguments of WaveSimulator2D, e.g. backend and engine.
+        @param start_method: Multiprocessing start method of the workers, 'spawn' is safe with cupy and threads.
+        """
+        assert 0 <= skip_steps <= num_steps, 'skip_steps must be within [0, num_steps]'
+        names = [r.name for r in reductions]
+        assert len(set(names)) == len(names), 'reduction names must be unique'
+        self.build_scene = build_scene
+        self.parameters = {name: list(values) for name, values in parameters.items()}
+        self.num_steps = num_steps
+        self.reductions = reductions
+        self.output_dir = output_dir
+        self.skip_steps = skip_steps
+        self.record_every = record_every
+        self.num_workers = num_workers if num_workers is not None else os.cpu_count()
+        self.simulator_kwargs = simulator_kwargs if simulator_kwargs is not None else {}
+        self.start_method = start_method
+
+    @property
+    def shape(self):
+        """ shape of the parameter grid """
+        return tuple(len(values) for values in self.parameters.values())
+
+    def points(self):
+        """ returns a list of (grid index, parameter dictionary) of all points """
+        names = list(self.parameters.keys())
+        indices = itertools.product(*[range(n) for n in self.shape])
+        return [(index, {name: self.parameters[name][i] for name, i in zip(names, index)}) for index in indices]
+
+    def point_path(self, index):
+        """ file of the results of the point with the given grid index """
+        return os.path.join(self.output_dir, 'point_' + '_'.join(str(i) for i in index) + '.npz')
+
+    def is_finished(self, index, params):
+        """
+        returns True if the output directory holds the results of the point for the same parameter values, number
+        of steps, recording cadence and reductions
+        """
+        path = self.point_path(index)
+        if not os.path.exists(path):
+            return False
+        expected = {'param_' + name: np.asarray(value) for name, value in params.items()}
+        expected.update(_settings(self.num_steps, self.skip_steps, self.record_every, self.reductions))
+        try:
+            with np.load(path) as data:
+                return all(np.array_equal(data[key], value) for key, value in expected.items())
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def pending_points(self):
+        """ points without results in the output directory """
+        return [(index, params) for index, params in self.points() if not self.is_finished(index, params)]
+
+    def run(self, progress=None):
+        """
+        Simulates all pending points and aggregates the results.
+        @param progress: Optional callable, called with (num_finished, num_points) after each finished point.
+        @return: Dictionary of the aggregated results, see aggregate.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        pending = self.pending_points()
+        num_points = int(np.prod(self.shape))
+        num_finished = num_points - len(pending)
+        failures = []
+
+        if pending:
+            context = multiprocessing.get_context(self.start_method)
+            with ProcessPoolExecutor(max_workers=max(1, min(self.num_workers, len(pending))),
+                                     mp_context=context) as executor:
+                futures = {executor.submit(_run_point, self.build_scene, params, self.num_steps, self.skip_steps,
+                                           self.record_every, self.reductions, self.simulator_kwargs,
+                                           self.point_path(index)): params
+                           for index, params in pending}
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                        num_finished += 1
+                    except Exception as e:
+                        failures.append((futures[future], e))
+                    if progress is not None:
+                        progress(num_finished, num_points)
+
+        if failures:
+            params, error = failures[0]
+            raise RuntimeError(f'{len(failures)} sweep points failed, first failure at {params}: {error!r}') from error
+
+        return self.aggregate()
+
+    def aggregate(self):
+        """
+        Collects the results of all points into one dictionary, which is also written to results.npz in the
+        output directory. For each parameter 'param_<name>' holds its values, each reduction is stored as array
+        of the shape (*grid shape, *result shape), indexed by the parameter indices in the order of the parameters.
+        """
+        results = {'param_' + name: np.asarray(values) for name, values in self.parameters.items()}
+
+        for index, params in self.points():
+            with np.load(self.point_path(index)) as data:
+                for r in self.reductions:
+                    value = data[r.name]
+                    if r.name not in results:
+                        results[r.name] = np.zeros(self.shape + value.shape, dtype=value.dtype)
+                    results[r.name][index] = value
+
+        np.savez(os.path.join(self.output_dir, 'results.npz'), **results)
+        return results
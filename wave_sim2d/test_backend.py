@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+import scipy.signal
+from wave_sim2d.backend import get_backend, backend_of
+
+
+def test_numpy_backend():
+    backend = get_backend('numpy')
+    assert backend.name == 'numpy' and not backend.is_gpu
+    assert get_backend(backend) is backend
+    a = np.arange(12, dtype=np.float32).reshape(3, 4)
+    assert backend.asarray(a) is a
+    assert backend.to_numpy(a) is a
+    assert backend_of(a) is backend
+
+
+def test_convolve2d_has_zero_boundary():
+    backend = get_backend('numpy')
+    a = np.random.default_rng(0).random((7, 9)).astype(np.float32)
+    kernel = np.array([[0.066, 0.184, 0.066], [0.184, -1.0, 0.184], [0.066, 0.184, 0.066]])
+    expected = scipy.signal.convolve2d(np.pad(a, 1), kernel, mode='valid')
+    np.testing.assert_allclose(backend.convolve2d(a, kernel), expected, rtol=1e-6, atol=1e-7)
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        get_backend('opencl')
@@ -0,0 +1,56 @@
+import numpy as np
+import wave_sim2d.wave_simulation as sim
+import wave_sim2d.boundary as boundary_module
+from wave_sim2d.boundary import CPMLBoundary
+
+
+def pulse_energy_after(boundary, num_steps):
+    ys, xs = np.mgrid[0:96, 0:96]
+    pulse = np.exp(-((xs - 48) ** 2 + (ys - 48) ** 2) / 10.0).astype(np.float32)
+    simulator = sim.WaveSimulator2D(96, 96, [], initial_field=pulse, backend='numpy', boundary=boundary)
+    simulator.run(num_steps)
+    u = simulator.get_field().astype(np.float64)
+    return np.sum(u * u)
+
+
+def test_cpml_absorbs_outgoing_waves():
+    # after 300 steps the wave front has crossed the border several times, the reflecting grid keeps it
+    reflecting = pulse_energy_after(None, 300)
+    absorbed = pulse_energy_after('cpml', 300)
+    assert absorbed < 1e-3 * reflecting
+
+
+def test_cpml_state_round_trip():
+    ys, xs = np.mgrid[0:64, 0:64]
+    pulse = np.exp(-((xs - 20) ** 2 + (ys - 32) ** 2) / 10.0).astype(np.float32)
+
+    def make():
+        return sim.WaveSimulator2D(64, 64, [], initial_field=pulse, backend='numpy', boundary='cpml')
+
+    simulator = make()
+    simulator.run(40)
+    state = simulator.get_state()
+    simulator.run(40)
+
+    restored = make()
+    restored.set_state(state)
+    restored.run(40)
+    np.testing.assert_array_equal(restored.get_field(), simulator.get_field())
+
+
+def test_cpml_coefficients_follow_field_dtype_and_kernel(monkeypatch):
+    boundary = CPMLBoundary()
+    simulator = sim.WaveSimulator2D(64, 64, [], backend='numpy', boundary=boundary, precision='float64')
+    simulator.run(2)
+    strips = boundary._strips
+    for axis, start, end, cells, faces, psi, zeta, halo in strips:
+        assert all(c.dtype == np.float64 for c in cells + faces + (psi, zeta, halo))
+
+    # the kernel is only read again after it was replaced
+    monkeypatch.setattr(boundary_module, 'laplacian_kernel_scale', None)
+    simulator.run(2)
+    assert boundary._strips is strips
+    monkeypatch.undo()
+    simulator.laplacian_kernel = simulator.laplacian_kernel.copy()
+    simulator.run(1)
+    assert boundary._strips is not strips
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+import wave_sim2d.wave_simulation as sim
+import wave_sim2d.wave_visualizer as vis
+from wave_sim2d.checkpoint import save_checkpoint, load_checkpoint
+from wave_sim2d.scene_objects.source import PointSource
+from wave_sim2d.scene_objects.static_dampening import StaticDampening
+
+
+def make_simulator():
+    return sim.WaveSimulator2D(64, 48, [StaticDampening(np.ones((48, 64)), 8), PointSource(30, 24, 0.1, 1.0)],
+                               backend='numpy')
+
+
+def make_visualizer():
+    return vis.WaveVisualizer(field_colormap=vis.get_colormap_lut('colormap_wave1', invert=False, black_level=-0.05),
+                              intensity_colormap=vis.get_colormap_lut('afmhot', invert=False, black_level=0.0))
+
+
+@pytest.mark.parametrize('memmap', [False, True])
+def test_checkpoint_round_trip(tmp_path, memmap):
+    simulator, visualizer = make_simulator(), make_visualizer()
+    simulator.run(100, callbacks=[visualizer.update])
+    path = str(tmp_path / ('checkpoint' if memmap else 'checkpoint.npz'))
+    save_checkpoint(path, simulator, visualizer, memmap=memmap)
+    simulator.run(100, callbacks=[visualizer.update])
+
+    restored, restored_visualizer = make_simulator(), make_visualizer()
+    load_checkpoint(path, restored, restored_visualizer)
+    assert restored.step_count == 100
+    restored.run(100, callbacks=[restored_visualizer.update])
+
+    assert restored.step_count == simulator.step_count
+    np.testing.assert_array_equal(restored.get_field(), simulator.get_field())
+    np.testing.assert_array_equal(restored_visualizer.render_intensity(1.0), visualizer.render_intensity(1.0))
+
+
+@pytest.mark.parametrize('name', ['checkpoint', 'checkpoint.npz'])
+def test_checkpoint_suffix_is_optional(tmp_path, name):
+    simulator = make_simulator()
+    simulator.run(20)
+    save_checkpoint(str(tmp_path / name), simulator)
+    assert (tmp_path / 'checkpoint.npz').exists()
+
+    restored = make_simulator()
+    load_checkpoint(str(tmp_path / name), restored)
+    np.testing.assert_array_equal(restored.get_field(), simulator.get_field())
@@ -0,0 +1,57 @@
+import numpy as np
+import wave_sim2d.wave_simulation as sim
+from wave_sim2d.scene_objects.detectors import PointDetector, LineDetector, PolygonDetector, LockInDetector
+from wave_sim2d.scene_objects.source import PointSource
+
+
+def test_detectors_record_the_field():
+    point = PointDetector(30, 20, flush_every=7)
+    line = LineDetector((10, 12), (10, 28), average=True, flush_every=7)
+    polygon = PolygonDetector([(36, 10), (44, 10), (44, 18), (36, 18)], flush_every=7)
+    simulator = sim.WaveSimulator2D(48, 40, [PointSource(24, 20, 0.2, 1.0), point, line, polygon], backend='numpy')
+
+    # detectors sample the field before the sources of the step are written
+    expected_point, expected_line, expected_polygon = [], [], []
+    for i in range(50):
+        simulator.render_scene()
+        expected_point.append(simulator.u[20, 30])
+        expected_line.append(simulator.u[12:29, 10].mean())
+        expected_polygon.append(simulator.u[10:19, 36:45].mean())
+        simulator.update_scene_field()
+        simulator.update_field()
+
+    times, values = point.get_series()
+    np.testing.assert_allclose(times, np.arange(50) * simulator.dt)
+    np.testing.assert_array_equal(values, expected_point)
+    np.testing.assert_allclose(line.get_series()[1], expected_line, rtol=1e-5, atol=1e-7)
+    np.testing.assert_allclose(polygon.get_series()[1], expected_polygon, rtol=1e-5, atol=1e-7)
+
+
+def test_lock_in_recovers_amplitude_and_phase():
+    frequency = 0.3
+    amplitude = np.linspace(0.5, 2.0, 12, dtype=np.float32).reshape(3, 4)
+    phase = np.linspace(-2.0, 2.0, 12, dtype=np.float32).reshape(3, 4)
+    lock_in = LockInDetector(frequency)
+
+    # sample whole periods
+    period_steps = 2.0 * np.pi / frequency
+    num_steps = int(round(20 * period_steps))
+    for t in np.arange(num_steps) * (20 * period_steps / num_steps):
+        lock_in.update_field((amplitude * np.cos(frequency * t + phase)).astype(np.float32), t)
+
+    amplitude_map, phase_map = lock_in.get_maps()
+    np.testing.assert_allclose(amplitude_map[0], amplitude, rtol=1e-3)
+    np.testing.assert_allclose(phase_map[0], phase, atol=1e-3)
+
+
+def test_lock_in_state_is_a_copy():
+    lock_in = LockInDetector(0.3)
+    field = np.ones((3, 4), dtype=np.float32)
+    lock_in.update_field(field, 0.0)
+    state = lock_in.get_state()
+    lock_in.update_field(field, 1.0)
+
+    restored = LockInDetector(0.3)
+    restored.set_state(state)
+    restored.update_field(field, 1.0)
+    np.testing.assert_array_equal(restored.get_complex_amplitude(), lock_in.get_complex_amplitude())
@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+import wave_sim2d.wave_simulation as sim
+import wave_sim2d.domain_decomposition as domain_decomposition
+from wave_sim2d.engines import TiledEngine, ActiveTileEngine, SpectralEngine, get_engine
+from wave_sim2d.domain_decomposition import StripDecompositionEngine
+from wave_sim2d.scene_objects.source import PointSource
+from wave_sim2d.scene_objects.static_dampening import StaticDampening
+from wave_sim2d.scene_objects.static_refractive_index import StaticRefractiveIndexPolygon
+
+
+def make_scene():
+    return [StaticDampening(np.ones((64, 80)), 12),
+            StaticRefractiveIndexPolygon([(40, 16), (60, 32), (40, 48)], 1.5),
+            PointSource(24, 32, 0.1, 1.0)]
+
+
+def run(engine, num_steps=150):
+    simulator = sim.WaveSimulator2D(80, 64, make_scene(), backend='numpy', engine=engine)
+    simulator.run(num_steps)
+    return simulator.get_field().copy()
+
+
+@pytest.mark.parametrize('engine', ['fused', 'tiled', 'active'])
+def test_engine_matches_convolution(engine):
+    np.testing.assert_allclose(run(engine), run('convolution'), rtol=0, atol=1e-5)
+
+
+def test_tiled_engine_is_bit_identical_to_fused():
+    reference = run('fused')
+    for num_threads, tile_rows in [(1, None), (3, 5), (4, 64)]:
+        np.testing.assert_array_equal(run(TiledEngine(num_threads=num_threads, tile_rows=tile_rows)), reference)
+
+
+def test_strip_decomposition_matches_fused():
+    # the fields live in the shared memory of the engine, run returns a copy before it is released
+    engine = StripDecompositionEngine(num_processes=2)
+    try:
+        field = run(engine)
+    finally:
+        engine.close()
+    np.testing.assert_array_equal(field, run('fused'))
+
+
+def test_active_engine_skips_quiescent_tiles_bit_identically():
+    engine = ActiveTileEngine(tile_size=8)
+    simulator = sim.WaveSimulator2D(80, 64, make_scene(), backend='numpy', engine=engine)
+    simulator.run(10)
+    # the wave of the source has not reached most of the grid yet
+    assert engine.active_fraction < 0.5
+    np.testing.assert_array_equal(simulator.get_field(), run('fused', num_steps=10))
+
+
+def test_spectral_engine_is_stable_in_dampened_regions():
+    field = run('spectral', num_steps=2000)
+    assert np.all(np.isfinite(field))
+    assert np.abs(field).max() < 10.0
+
+
+def test_spectral_engine_only_limits_cells_beyond_the_stability_limit():
+    rng = np.random.default_rng(0)
+    u = rng.standard_normal((32, 40)).astype(np.float32)
+    u_prev = rng.standard_normal((32, 40)).astype(np.float32)
+    kernel = sim.WaveSimulator2D(40, 32, [], backend='numpy').laplacian_kernel
+    # slow medium (c_ref / 2) in the top half, c_ref in the bottom half, both damped on the left
+    coefficient = np.full((32, 40), 0.2, dtype=np.float32)
+    coefficient[:16] = 0.05
+    d = np.ones((32, 40), dtype=np.float32)
+    d[:, :20] = 0.8
+
+    engine = SpectralEngine()
+    undamped = np.empty_like(u)
+    engine.step(u, u, coefficient, np.ones_like(d), 1.0, kernel, undamped)
+    out = np.empty_like(u)
+    engine.step(u, u_prev, coefficient, d, 1.0, kernel, out)
+
+    # cells within the limit are updated like in the stencil engines, damped cells at c_ref are limited
+    expected = u + (u - u_prev) * d + (undamped - u)
+    np.testing.assert_allclose(out[:16], expected[:16], atol=1e-5)
+    np.testing.assert_allclose(out[16:, 20:], expected[16:, 20:], atol=1e-5)
+    limited = u + (u - u_prev) * d + (undamped - u) * 0.9
+    np.testing.assert_allclose(out[16:, :20], limited[16:, :20], atol=1e-5)
+
+
+def test_spectral_engine_propagates_like_stencil():
+    # long wavelength pulse, both engines agree up to the dispersion error of the stencil
+    ys, xs = np.mgrid[0:64, 0:80]
+    pulse = np.exp(-((xs - 40) ** 2 + (ys - 32) ** 2) / 50.0).astype(np.float32)
+    fields = []
+    for engine in ['convolution', 'spectral']:
+        simulator = sim.WaveSimulator2D(80, 64, [], initial_field=pulse, backend='numpy', engine=engine)
+        simulator.run(30)
+        fields.append(simulator.get_field())
+    assert np.abs(fields[1] - fields[0]).max() < 0.05 * np.abs(fields[0]).max()
+
+
+def test_strip_engine_is_registered():
+    engine = get_engine('strip')
+    try:
+        assert isinstance(engine, StripDecompositionEngine)
+    finally:
+        engine.close()
+
+
+def test_failed_strip_step_stops_workers(monkeypatch):
+    engine = StripDecompositionEngine(num_processes=2)
+    try:
+        simulator = sim.WaveSimulator2D(80, 64, make_scene(), backend='numpy', engine=engine)
+        simulator.run(2)
+        workers = list(engine._processes)
+        assert workers and all(worker.is_alive() for worker in workers)
+
+        # the strip of the coordinating process fails between the two barriers of the step
+        def fail(*args):
+            raise MemoryError('strip failed')
+        monkeypatch.setattr(domain_decomposition, '_update_strip', fail)
+        with pytest.raises(MemoryError):
+            simulator.run(1)
+        assert not any(worker.is_alive() for worker in workers)
+        with pytest.raises(RuntimeError):
+            simulator.run(1)
+    finally:
+        engine.close()
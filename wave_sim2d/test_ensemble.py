@@ -0,0 +1,74 @@
+import numpy as np
+import wave_sim2d.wave_simulation as sim
+from wave_sim2d.ensemble import EnsembleWaveSimulator2D
+from wave_sim2d.scene_objects.source import PointSource
+from wave_sim2d.scene_objects.static_dampening import StaticDampening
+from wave_sim2d.scene_objects.static_refractive_index import StaticRefractiveIndex
+
+
+def make_scene(i):
+    return [StaticDampening(np.ones((48, 64)), 8),
+            StaticRefractiveIndex(np.full((48, 64), 1.0 + 0.25 * i)),
+            PointSource(20 + 4 * i, 24, 0.1 + 0.02 * i, 1.0)]
+
+
+def test_ensemble_matches_independent_runs():
+    ensemble = EnsembleWaveSimulator2D.from_factory(64, 48, 3, make_scene, backend='numpy')
+    ensemble.run(200)
+
+    for i in range(3):
+        simulator = sim.WaveSimulator2D(64, 48, make_scene(i), backend='numpy')
+        simulator.run(200)
+        np.testing.assert_allclose(ensemble.get_field(i), simulator.get_field(), rtol=0, atol=1e-6)
+
+
+def test_member_view_follows_ensemble():
+    ensemble = EnsembleWaveSimulator2D.from_factory(64, 48, 2, make_scene, backend='numpy')
+    ensemble.run(10)
+    member = ensemble.member(1)
+    assert member.step_count == 10
+    np.testing.assert_array_equal(member.get_field(), ensemble.get_field(1))
+
+
+class Marker(sim.SceneObject):
+    """ writes a constant into one pixel of the field """
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+    def render(self, field, wave_speed_field, dampening_field):
+        pass
+
+    def update_field(self, field, t):
+        field[self.y, self.x] = 0.5
+
+    def render_visualization(self, image):
+        pass
+
+
+def make_interleaved_scene(i):
+    if i == 0:
+        return [PointSource(10, 10, 0.1), Marker(10, 10), PointSource(30, 20, 0.2)]
+    return [Marker(12, 12), PointSource(12, 12, 0.15), StaticDampening(np.ones((48, 64)), 8)]
+
+
+def test_ensemble_keeps_member_update_order():
+    ensemble = EnsembleWaveSimulator2D.from_factory(64, 48, 2, make_interleaved_scene, backend='numpy')
+    simulators = [sim.WaveSimulator2D(64, 48, make_interleaved_scene(i), backend='numpy') for i in range(2)]
+    ensemble.run(40)
+    for simulator in simulators:
+        simulator.run(40)
+
+    # a changed source parameter rebuilds the merged tables of the ensemble
+    ensemble.members[1].scene_objects[1].frequency = 0.3
+    simulators[1].scene_objects[1].frequency = 0.3
+    ensemble.run(40)
+    for i, simulator in enumerate(simulators):
+        simulator.run(40)
+        np.testing.assert_allclose(ensemble.get_field(i), simulator.get_field(), rtol=0, atol=1e-6)
+
+
+def test_members_have_the_attributes_of_a_simulator():
+    # members share the setup of WaveSimulator2D, attributes added to the simulator are available on members
+    ensemble = EnsembleWaveSimulator2D.from_factory(64, 48, 2, make_scene, backend='numpy')
+    simulator = sim.WaveSimulator2D(64, 48, make_scene(0), backend='numpy')
+    assert set(vars(simulator)) <= set(vars(ensemble.member(0)))
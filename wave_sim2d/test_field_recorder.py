@@ -0,0 +1,34 @@
+import numpy as np
+import wave_sim2d.wave_simulation as sim
+from wave_sim2d.field_recorder import FieldRecorder, FieldRecording
+from wave_sim2d.scene_objects.source import PointSource
+
+
+def test_recording_round_trip(tmp_path):
+    simulator = sim.WaveSimulator2D(48, 40, [PointSource(24, 20, 0.1, 1.0)], backend='numpy')
+    frames, steps = [], []
+
+    with FieldRecorder(str(tmp_path), every=3, downsample=2, chunk_frames=5) as recorder:
+        def record(s):
+            recorder(s)
+            if s.step_count % 3 == 0:
+                frames.append(s.get_field().reshape(20, 2, 24, 2).mean(axis=(1, 3)))
+                steps.append(s.step_count)
+        simulator.run(100, callbacks=[record])
+
+    recording = FieldRecording(str(tmp_path))
+    assert recording.shape == (33, 20, 24)
+    np.testing.assert_array_equal(recording.steps, steps)
+    np.testing.assert_allclose(recording.times, np.asarray(steps) * simulator.dt)
+    np.testing.assert_allclose(recording[:], np.array(frames), rtol=1e-6, atol=1e-7)
+    np.testing.assert_allclose(recording[4:17:3, 10, 5:9], np.array(frames)[4:17:3, 10, 5:9], rtol=1e-6, atol=1e-7)
+    np.testing.assert_allclose(recording[-1], frames[-1], rtol=1e-6, atol=1e-7)
+
+
+def test_empty_recording_can_be_read(tmp_path):
+    with FieldRecorder(str(tmp_path)):
+        pass
+    recording = FieldRecording(str(tmp_path))
+    assert len(recording) == 0
+    assert recording.steps.shape == (0,) and recording.times.shape == (0,)
+    assert recording[:].shape[0] == 0
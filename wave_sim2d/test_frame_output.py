@@ -0,0 +1,126 @@
+import random
+import threading
+import time
+import cv2
+import numpy as np
+import pytest
+from wave_sim2d.frame_output import FramePipeline, FrameSink, NpySink, PngSequenceSink
+from wave_sim2d.wave_visualizer import get_colormap_lut, colorize_field
+
+
+class FakeVisualizer:
+    def __init__(self):
+        self.field = np.zeros((8, 10), dtype=np.float32)
+        self.intensity = np.zeros((8, 10), dtype=np.float32)
+        self.visualization_image = None
+
+
+class RecordingSink(FrameSink):
+    """ records the written frame indices, optionally waits for a gate or sleeps a random time per frame """
+    def __init__(self, ordered=True, gate=None, jitter=0.0, fail_at=None):
+        super().__init__('field')
+        self.ordered = ordered
+        self.gate = gate
+        self.jitter = jitter
+        self.fail_at = fail_at
+        self.indices = []
+        self.values = []
+        self.closed = False
+
+    def write(self, snapshot):
+        if self.gate is not None:
+            self.gate.wait()
+        if self.jitter > 0:
+            time.sleep(random.uniform(0, self.jitter))
+        if snapshot.index == self.fail_at:
+            raise ValueError('sink failed')
+        self.indices.append(snapshot.index)
+        self.values.append(float(snapshot.field[0, 0]))
+
+    def close(self):
+        self.closed = True
+
+
+def submit_frames(pipeline, visualizer, num_frames):
+    for i in range(num_frames):
+        visualizer.field[:] = i
+        pipeline.submit(visualizer, t=float(i))
+
+
+def test_ordered_sinks_receive_frames_in_order():
+    random.seed(0)
+    ordered = RecordingSink(jitter=0.005)
+    unordered = RecordingSink(ordered=False, jitter=0.005)
+    pipeline = FramePipeline([ordered, unordered], num_workers=4, queue_size=4)
+    submit_frames(pipeline, FakeVisualizer(), 30)
+    pipeline.close()
+
+    assert ordered.indices == list(range(30))
+    # snapshots are copies, later changes of the visualizer do not leak into queued frames
+    assert ordered.values == [float(i) for i in range(30)]
+    assert sorted(unordered.indices) == list(range(30))
+    assert pipeline.frames_written == 30
+
+
+def test_block_back_pressure_waits_for_free_slot():
+    gate = threading.Event()
+    sink = RecordingSink(gate=gate)
+    pipeline = FramePipeline([sink], num_workers=1, queue_size=2, back_pressure='block')
+    timer = threading.Timer(0.2, gate.set)
+    timer.start()
+    submit_frames(pipeline, FakeVisualizer(), 6)
+    pipeline.close()
+
+    statistics = pipeline.statistics()
+    assert statistics['frames_submitted'] == 6 and statistics['frames_dropped'] == 0
+    assert statistics['wait_seconds'] > 0.1
+    assert sink.indices == list(range(6))
+
+
+def test_drop_back_pressure_drops_frames_without_waiting():
+    gate = threading.Event()
+    sink = RecordingSink(gate=gate)
+    pipeline = FramePipeline([sink], num_workers=1, queue_size=2, back_pressure='drop')
+    submit_frames(pipeline, FakeVisualizer(), 10)
+    gate.set()
+    pipeline.close()
+
+    statistics = pipeline.statistics()
+    assert statistics['frames_dropped'] > 0
+    assert statistics['frames_submitted'] + statistics['frames_dropped'] == 10
+    assert statistics['wait_seconds'] == 0.0
+    # dropped frames do not use up a frame index, the ordered sink sees a gapless sequence
+    assert sink.indices == list(range(statistics['frames_submitted']))
+
+
+def test_close_flushes_queue_and_closes_sinks(tmp_path):
+    recording = RecordingSink()
+    npy = NpySink(str(tmp_path))
+    with FramePipeline([recording, npy], num_workers=2, queue_size=16) as pipeline:
+        submit_frames(pipeline, FakeVisualizer(), 5)
+    assert recording.closed
+    assert recording.indices == list(range(5))
+    assert np.load(tmp_path / 'frame_000004.npy')[0, 0] == 4.0
+
+
+def test_worker_error_is_raised():
+    gate = threading.Event()
+    sink = RecordingSink(gate=gate, fail_at=2)
+    pipeline = FramePipeline([sink], num_workers=2, queue_size=8)
+    submit_frames(pipeline, FakeVisualizer(), 6)
+    gate.set()
+    with pytest.raises(RuntimeError):
+        pipeline.close()
+    assert sink.closed
+    assert sink.indices == [0, 1]
+
+
+def test_png_sink_renders_with_colormap(tmp_path):
+    colormap = get_colormap_lut('colormap_wave1', invert=False)
+    visualizer = FakeVisualizer()
+    visualizer.field[:] = np.linspace(-1, 1, 10, dtype=np.float32)
+    with FramePipeline([PngSequenceSink(str(tmp_path), colormap=colormap, overlay_visualization=False)]) as pipeline:
+        pipeline.submit(visualizer)
+    image = cv2.imread(str(tmp_path / 'frame_000000.png'))
+    assert image.shape == (8, 10, 3)
+    np.testing.assert_array_equal(image, colorize_field(visualizer.field, np.asarray(colormap), 1.0, None))
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+import wave_sim2d.wave_simulation as sim
+from wave_sim2d.scene_objects.source import PointSource
+from wave_sim2d.scene_objects.static_dampening import StaticDampening
+from wave_sim2d.scene_objects.static_refractive_index import StaticRefractiveIndexPolygon
+
+
+def run(precision, engine=None):
+    scene = [StaticDampening(np.ones((48, 64)), 8), StaticRefractiveIndexPolygon([(30, 10), (44, 24), (30, 38)], 1.5),
+             PointSource(16, 24, 0.1, 1.0)]
+    simulator = sim.WaveSimulator2D(64, 48, scene, backend='numpy', engine=engine, precision=precision)
+    simulator.run(200)
+    assert simulator.u.dtype == np.dtype(precision)
+    return simulator.get_field().astype(np.float64)
+
+
+@pytest.mark.parametrize('engine', ['convolution', 'fused'])
+def test_reduced_precision_follows_float64(engine):
+    reference = run('float64', engine)
+    scale = np.abs(reference).max()
+    assert np.abs(run('float32', engine) - reference).max() < 1e-5 * scale
+    assert np.abs(run('float16', engine) - reference).max() < 1e-2 * scale
+
+
+def test_unknown_precision_is_rejected():
+    with pytest.raises(ValueError):
+        sim.WaveSimulator2D(8, 8, [], backend='numpy', precision='int8')
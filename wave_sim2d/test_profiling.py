@@ -0,0 +1,75 @@
+import json
+import time
+import numpy as np
+import wave_sim2d.wave_simulation as sim
+import wave_sim2d.wave_visualizer as vis
+from wave_sim2d.ensemble import EnsembleWaveSimulator2D
+from wave_sim2d.profiling import Profiler, NullProfiler
+from wave_sim2d.scene_objects.source import PointSource
+from wave_sim2d.scene_objects.static_dampening import StaticDampening
+
+
+def make_scene():
+    return [StaticDampening(np.ones((40, 48)), 8), PointSource(24, 20, 0.1, 1.0)]
+
+
+def test_profiler_records_phases_without_changing_results(tmp_path):
+    profiler = Profiler()
+    simulator = sim.WaveSimulator2D(48, 40, make_scene(), backend='numpy', profiler=profiler)
+    visualizer = vis.WaveVisualizer(field_colormap=vis.get_colormap_lut('colormap_wave1', invert=False),
+                                    intensity_colormap=vis.get_colormap_lut('afmhot', invert=False),
+                                    profiler=profiler)
+    simulator.run(30, callbacks=[visualizer.update])
+    visualizer.render_field(1.0)
+
+    summary = profiler.summary()
+    assert summary['field.engine']['count'] == 30
+    assert summary['visualizer.update']['count'] == 30
+    assert summary['scene.bake']['count'] == 1
+    assert summary['scene.render.0:StaticDampening']['count'] == 1
+    assert summary['visualizer.render_field']['count'] == 1
+    assert profiler.histogram('field.engine')[0].sum() == 30
+
+    path = tmp_path / 'trace.json'
+    profiler.save_chrome_trace(str(path))
+    with open(path) as f:
+        assert len(json.load(f)['traceEvents']) == sum(s['count'] for s in summary.values())
+
+    unprofiled = sim.WaveSimulator2D(48, 40, make_scene(), backend='numpy')
+    unprofiled.run(30)
+    np.testing.assert_array_equal(simulator.get_field(), unprofiled.get_field())
+
+
+def test_profiler_of_ensemble():
+    profiler = Profiler()
+    ensemble = EnsembleWaveSimulator2D(48, 40, [make_scene(), make_scene()], backend='numpy', profiler=profiler)
+    ensemble.run(10)
+    assert profiler.summary()['field.engine']['count'] == 10
+
+
+def test_profiler_aggregates_durations_as_they_come_in():
+    profiler = Profiler(max_events=10)
+    durations = np.geomspace(1e-4, 1e-2, 500)
+    for d in durations:
+        profiler.end('phase', time.perf_counter() - d)
+
+    s = profiler.summary()['phase']
+    assert s['count'] == 500 and profiler.dropped_events == 490
+    assert abs(s['total'] - durations.sum()) < 1e-3 * durations.sum()
+    assert s['min'] >= durations[0] and s['max'] >= durations[-1]
+    for q in [50, 95]:
+        assert abs(s[f'p{q}'] / np.percentile(durations, q) - 1.0) < 0.05
+    counts, edges = profiler.histogram('phase', bins=10)
+    assert counts.sum() == 500 and len(edges) == 11
+
+
+def test_null_profiler_is_not_called():
+    class FailingProfiler(NullProfiler):
+        def begin(self, backend=None):
+            raise AssertionError('the null profiler is not used')
+
+    simulator = sim.WaveSimulator2D(48, 40, make_scene(), backend='numpy', profiler=FailingProfiler())
+    simulator.run(5)
+    unprofiled = sim.WaveSimulator2D(48, 40, make_scene(), backend='numpy')
+    unprofiled.run(5)
+    np.testing.assert_array_equal(simulator.get_field(), unprofiled.get_field())
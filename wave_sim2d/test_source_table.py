@@ -0,0 +1,103 @@
+import numpy as np
+from wave_sim2d.backend import get_backend
+from wave_sim2d.wave_simulation import SceneObject, WaveSimulator2D
+from wave_sim2d.source_table import SourceTable
+from wave_sim2d.scene_objects.source import PointSource, LineSource, ModulatorSmoothSquare
+from wave_sim2d.scene_objects.static_image_scene import StaticImageScene
+
+
+def make_sources():
+    image = np.zeros((100, 120, 3), dtype=np.uint8)
+    image[:, :, 0] = 100
+    image[10:13, 30, 1] = [40, 80, 120]
+    return [PointSource(5, 6, 0.2, 1.5, phase=0.3),
+            PointSource(20, 30, 0.1, amp_modulator=ModulatorSmoothSquare(0.05, 0.0)),
+            LineSource((2, 35), (45, 20), 0.15, 0.7),
+            StaticImageScene(image),
+            PointSource(30, 11, 0.3, 2.0)]  # overlaps a pixel of the image scene sources
+
+
+def test_source_table_matches_object_updates():
+    backend = get_backend('numpy')
+    rng = np.random.default_rng(1)
+    sources = make_sources()
+    table = SourceTable([obj.get_emitters((100, 120)) for obj in sources], backend)
+
+    for t in [0.0, 1.0, 17.5, 123.0]:
+        initial = rng.standard_normal((100, 120)).astype(np.float32)
+        expected = initial.copy()
+        for obj in sources:
+            obj.update_field(expected, t)
+        field = initial.copy()
+        table.update_field(field, t)
+        np.testing.assert_allclose(field, expected, rtol=0, atol=1e-6)
+
+
+def test_empty_source_table():
+    table = SourceTable([], get_backend('numpy'))
+    field = np.ones((4, 4), dtype=np.float32)
+    table.update_field(field, 1.0)
+    np.testing.assert_array_equal(field, 1.0)
+
+
+class Unmerged(SceneObject):
+    """ applies a source through its own update_field, as before the sources were merged """
+    def __init__(self, source):
+        self.source = source
+
+    def render(self, field, wave_speed_field, dampening_field):
+        pass
+
+    def update_field(self, field, t):
+        self.source.update_field(field, t)
+
+    def render_visualization(self, image):
+        pass
+
+
+class Writer(SceneObject):
+    """ overwrites one pixel of the field """
+    def __init__(self, x, y, value):
+        self.x, self.y, self.value = x, y, value
+
+    def render(self, field, wave_speed_field, dampening_field):
+        pass
+
+    def update_field(self, field, t):
+        field[self.y, self.x] = self.value
+
+    def render_visualization(self, image):
+        pass
+
+
+def test_source_parameter_changes_are_picked_up():
+    point, line = PointSource(20, 30, 0.1), LineSource((5, 5), (40, 10), 0.2)
+    merged = WaveSimulator2D(60, 50, [point, line], backend='numpy')
+    reference_point, reference_line = PointSource(20, 30, 0.1), LineSource((5, 5), (40, 10), 0.2)
+    reference = WaveSimulator2D(60, 50, [Unmerged(reference_point), Unmerged(reference_line)], backend='numpy')
+
+    def change(p, l):
+        p.frequency = 0.3
+        p.x += 7
+        p.amplitude = 2.0
+        l.phase = 1.0
+        l.end = (30, 40)
+
+    merged.run(30)
+    reference.run(30)
+    version = merged.scene_version
+    change(point, line)
+    change(reference_point, reference_line)
+    merged.run(30)
+    reference.run(30)
+
+    assert merged.scene_version > version
+    np.testing.assert_allclose(merged.get_field(), reference.get_field(), rtol=0, atol=1e-6)
+
+
+def test_field_updates_keep_scene_order():
+    simulator = WaveSimulator2D(40, 30, [PointSource(5, 6, 0.1, phase=1.0), Writer(5, 6, 42.0),
+                                         PointSource(9, 9, 0.1, phase=1.0)], backend='numpy')
+    simulator.update_scene()
+    assert simulator.get_field()[6, 5] == 42.0
+    assert simulator.get_field()[9, 9] == np.float32(np.sin(1.0))
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+import scipy.signal
+import wave_sim2d.scene_objects.strain_refractive_index as strain_module
+from wave_sim2d.scene_objects.strain_refractive_index import StrainRefractiveIndex
+
+
+def reference_wave_speed(field, offset, coupling):
+    """ the previous implementation, two convolutions and array expressions """
+    du_dx = scipy.signal.convolve2d(field, np.array([[-1, 0.0, 1]]), mode='same', boundary='fill')
+    du_dy = scipy.signal.convolve2d(field, np.array([[-1], [0.0], [1]]), mode='same', boundary='fill')
+    strain = np.sqrt(du_dx ** 2 + du_dy ** 2)
+    return 1.0 / np.clip(offset + strain * coupling, 0.9, 10.0), strain
+
+
+def random_field(seed=0):
+    return np.random.default_rng(seed).standard_normal((24, 31)).astype(np.float32)
+
+
+@pytest.mark.parametrize('use_numba', [True, False])
+def test_fused_kernel_matches_convolution_implementation(monkeypatch, use_numba):
+    if not use_numba:
+        monkeypatch.setattr(strain_module, 'numba', None)
+    field = random_field()
+    expected_c, expected_strain = reference_wave_speed(field, 1.2, 0.8)
+
+    obj = StrainRefractiveIndex(1.2, 0.8)
+    c = np.ones_like(field)
+    obj.render(field, c, np.ones_like(field))
+    np.testing.assert_allclose(c, expected_c, rtol=1e-6)
+    np.testing.assert_allclose(obj.strain_field, expected_strain, rtol=1e-6)
+
+
+def test_strain_field_can_be_skipped():
+    field = random_field()
+    obj = StrainRefractiveIndex(1.2, 0.8, keep_strain_field=False)
+    c = np.ones_like(field)
+    obj.render(field, c, np.ones_like(field))
+    assert obj.strain_field is None
+    np.testing.assert_allclose(c, reference_wave_speed(field, 1.2, 0.8)[0], rtol=1e-6)
+
+
+def test_update_every_reuses_wave_speed():
+    obj = StrainRefractiveIndex(1.0, 2.0, update_every=3)
+    for i in range(7):
+        field = random_field(seed=i)
+        c = np.ones_like(field)
+        obj.render(field, c, np.ones_like(field))
+        # the wave speed is recomputed at renders 0, 3 and 6
+        expected_c, expected_strain = reference_wave_speed(random_field(seed=i - i % 3), 1.0, 2.0)
+        np.testing.assert_allclose(c, expected_c, rtol=1e-6)
+        np.testing.assert_allclose(obj.strain_field, expected_strain, rtol=1e-6)
@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+import wave_sim2d.wave_simulation as sim
+from wave_sim2d.subgrid import RefinedPatch
+from wave_sim2d.scene_objects.source import PointSource
+from wave_sim2d.scene_objects.static_refractive_index import StaticRefractiveIndexPolygon
+
+
+class UniformSpeed(sim.SceneObject):
+    """ dynamic object without a fine representation, sets the wave speed of a block of cells """
+    def __init__(self, speed):
+        self.speed = speed
+
+    def render(self, field, wave_speed_field, dampening_field):
+        wave_speed_field[30:40, 30:40] = self.speed
+
+    def update_field(self, field, t):
+        pass
+
+    def render_visualization(self, image):
+        pass
+
+    def modifies_field(self):
+        return False
+
+
+def gaussian_pulse(size, x, y, variance=10.0):
+    ys, xs = np.mgrid[0:size, 0:size]
+    return np.exp(-((xs - x) ** 2 + (ys - y) ** 2) / variance).astype(np.float32)
+
+
+@pytest.mark.parametrize('factor', [2, 3])
+def test_patch_long_run_is_stable(factor):
+    # without dampening the reflecting grid keeps the pulse forever, a growing coupling error would show up
+    patch = RefinedPatch(20, 20, 32, 32, factor=factor)
+    simulator = sim.WaveSimulator2D(72, 72, [], initial_field=gaussian_pulse(72, 25, 30), backend='numpy',
+                                    patches=[patch])
+    for i in range(6):
+        simulator.run(500)
+        assert np.abs(simulator.get_field()).max() < 0.5
+        assert np.abs(patch.get_field()).max() < 0.5
+
+
+def test_patch_source_long_run_is_stable():
+    patch = RefinedPatch(20, 20, 32, 32, factor=2)
+    patch.scene_objects.append(PointSource(*patch.to_fine(36, 36), 0.05, 0.5))
+    simulator = sim.WaveSimulator2D(72, 72, [], backend='numpy', boundary='cpml', patches=[patch])
+    maxima = []
+    for i in range(6):
+        simulator.run(500)
+        maxima.append(np.abs(patch.get_field()).max())
+    assert max(maxima[3:]) < 2.0 * max(maxima[:3])
+
+
+def test_empty_patch_matches_fine_grid():
+    # a pulse crossing an empty patch, compared with a simulation of the whole grid at the fine resolution
+    def pulse(size, scale):
+        ys, xs = (np.mgrid[0:size, 0:size] + 0.5) / scale - 0.5
+        return np.exp(-((xs - 10) ** 2 + (ys - 36) ** 2) / 20.0).astype(np.float32)
+
+    reference = sim.WaveSimulator2D(144, 144, [], initial_field=pulse(144, 2), backend='numpy')
+    reference.run(120)
+    expected = reference.get_field().reshape(72, 2, 72, 2).mean(axis=(1, 3))
+
+    refined = sim.WaveSimulator2D(72, 72, [], initial_field=pulse(72, 1), backend='numpy',
+                                  patches=[RefinedPatch(20, 20, 32, 32, factor=2)])
+    refined.run(60)
+    interior = (slice(26, 46), slice(26, 46))
+    assert np.abs(refined.get_field() - expected)[interior].max() < 0.1 * np.abs(expected).max()
+
+
+def test_coarse_polygon_is_rasterised_at_the_fine_resolution():
+    polygon = StaticRefractiveIndexPolygon([(25.3, 22.6), (44.7, 31.2), (27.1, 47.8)], 1.5)
+    patch = RefinedPatch(20, 20, 32, 32, factor=3)
+    simulator = sim.WaveSimulator2D(72, 72, [polygon], backend='numpy', patches=[patch])
+    simulator.run(1)
+
+    expected = np.ones((96, 96), dtype=np.float32)
+    StaticRefractiveIndexPolygon([patch.to_fine(x, y) for x, y in polygon.vertices], 1.5).render(
+        None, expected, None)
+    np.testing.assert_allclose(patch.simulator.c, expected, atol=1e-6)
+
+
+def test_patch_follows_dynamic_coarse_objects():
+    dynamic = UniformSpeed(0.8)
+    patch = RefinedPatch(20, 20, 32, 32, factor=2)
+    simulator = sim.WaveSimulator2D(72, 72, [dynamic], backend='numpy', patches=[patch])
+    simulator.run(1)
+    # coarse cells 30..39 are the fine cells 20..39 of the patch
+    assert np.all(patch.simulator.c[20:40, 20:40] == np.float32(0.8))
+    assert np.all(patch.simulator.c[:20] == 1.0)
+
+    dynamic.speed = 0.6
+    simulator.run(1)
+    assert np.all(patch.simulator.c[20:40, 20:40] == np.float32(0.6))
+
+
+def test_patch_state_round_trip():
+    def make():
+        patch = RefinedPatch(20, 20, 32, 32, factor=2)
+        return sim.WaveSimulator2D(72, 72, [], initial_field=gaussian_pulse(72, 25, 30), backend='numpy',
+                                   patches=[patch])
+
+    simulator = make()
+    simulator.run(50)
+    state = simulator.get_state()
+    simulator.run(50)
+
+    restored = make()
+    restored.set_state(state)
+    restored.run(50)
+    np.testing.assert_array_equal(restored.get_field(), simulator.get_field())
+    np.testing.assert_array_equal(restored.patches[0].get_field(), simulator.patches[0].get_field())
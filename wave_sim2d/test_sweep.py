@@ -0,0 +1,53 @@
+import os
+import numpy as np
+import wave_sim2d.wave_simulation as sim
+from wave_sim2d.sweep import ParameterSweep, ProbeSeries, ProbeIntensity, Energy, TimeAveragedIntensity
+from wave_sim2d.scene_objects.source import PointSource
+
+
+def build_scene(frequency, amplitude):
+    """ scene builder of the sweep, module level so the worker processes can unpickle it """
+    return [PointSource(24, 20, frequency, amplitude)], 48, 40
+
+
+def test_sweep_matches_single_runs_and_resumes(tmp_path):
+    reductions = [ProbeSeries([(30, 20), (24, 30)]), ProbeIntensity([(30, 20)]), Energy()]
+    sweep = ParameterSweep(build_scene, {'frequency': [0.1, 0.2], 'amplitude': [1.0, 2.0, 3.0]}, 60, reductions,
+                           str(tmp_path), skip_steps=20, record_every=2, num_workers=2,
+                           simulator_kwargs={'backend': 'numpy'})
+    results = sweep.run()
+
+    assert results['probe_series'].shape == (2, 3, 20, 2)
+    assert results['energy'].shape == (2, 3, 20)
+    np.testing.assert_array_equal(results['param_amplitude'], [1.0, 2.0, 3.0])
+
+    # point (1, 2) simulated directly
+    scene_objects, w, h = build_scene(0.2, 3.0)
+    simulator = sim.WaveSimulator2D(w, h, scene_objects, backend='numpy')
+    simulator.run(20)
+    series = []
+    for i in range(20):
+        simulator.run(2)
+        series.append(simulator.get_field()[[20, 30], [30, 24]].copy())
+    np.testing.assert_allclose(results['probe_series'][1, 2], np.array(series), rtol=1e-6, atol=0)
+
+    # finished points are not simulated again
+    mtime = os.path.getmtime(sweep.point_path((0, 0)))
+    assert sweep.pending_points() == []
+    sweep.run()
+    assert os.path.getmtime(sweep.point_path((0, 0))) == mtime
+
+
+def test_results_of_other_settings_are_recomputed(tmp_path):
+    def make_sweep(num_steps, reductions):
+        return ParameterSweep(build_scene, {'frequency': [0.1], 'amplitude': [1.0]}, num_steps, reductions,
+                              str(tmp_path), num_workers=1, simulator_kwargs={'backend': 'numpy'})
+
+    make_sweep(20, [Energy()]).run()
+    assert make_sweep(20, [Energy()]).pending_points() == []
+    assert len(make_sweep(30, [Energy()]).pending_points()) == 1
+    assert len(make_sweep(20, [Energy(), ProbeIntensity([(30, 20)])]).pending_points()) == 1
+
+    results = make_sweep(30, [Energy(), TimeAveragedIntensity()]).run()
+    assert results['energy'].shape == (1, 1, 30)
+    assert results['intensity'].dtype == np.float64
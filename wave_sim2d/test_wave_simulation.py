@@ -0,0 +1,163 @@
+import numpy as np
+import scipy.signal
+import wave_sim2d.wave_simulation as sim
+from wave_sim2d.scene_objects.source import PointSource, LineSource
+from wave_sim2d.scene_objects.static_dampening import StaticDampening
+from wave_sim2d.scene_objects.static_refractive_index import StaticRefractiveIndexPolygon
+
+W, H = 64, 48
+SOURCES = [(20, 24, 0.15, 1.0, 0.0), (40, 30, 0.1, 0.5, 1.0)]
+
+
+def make_scene():
+    return [StaticDampening(np.ones((H, W)), 8),
+            StaticRefractiveIndexPolygon([(30, 10), (44, 24), (30, 38)], 1.5),
+            PointSource(*SOURCES[0]),
+            PointSource(*SOURCES[1])]
+
+
+def reference_run(num_steps):
+    """ the update of the original simulator: scene rendered each step, float32 fields and a float64 kernel """
+    kernel = np.array([[0.066, 0.184, 0.066], [0.184, -1.0, 0.184], [0.066, 0.184, 0.066]])
+    scene = make_scene()
+    u = np.zeros((H, W), dtype=np.float32)
+    u_prev = np.zeros((H, W), dtype=np.float32)
+    t, dt = 0.0, 1.0
+    for i in range(num_steps):
+        c = np.ones((H, W), dtype=np.float32)
+        d = np.ones((H, W), dtype=np.float32)
+        for obj in scene[:2]:
+            obj.render(u, c, d)
+        for x, y, frequency, amplitude, phase in SOURCES:
+            u[y, x] = np.sin(phase + frequency * t) * amplitude
+
+        laplacian = scipy.signal.convolve2d(u, kernel, mode='same', boundary='fill')
+        r = u + (u - u_prev) * d + laplacian * (c * dt) ** 2
+        u_prev, u = u, r.astype(np.float32)
+        t += dt
+    return u
+
+
+def test_simulator_matches_reference_update():
+    simulator = sim.WaveSimulator2D(W, H, make_scene(), backend='numpy')
+    for i in range(200):
+        simulator.update_scene()
+        simulator.update_field()
+    np.testing.assert_allclose(simulator.get_field(), reference_run(200), rtol=0, atol=1e-5)
+
+
+def test_line_source_writes_the_line():
+    simulator = sim.WaveSimulator2D(W, H, [LineSource((10, 5), (10, 20), 0.1, 2.0, phase=0.5)], backend='numpy')
+    simulator.update_scene()
+    np.testing.assert_allclose(simulator.u[5:21, 10], 2.0 * np.sin(0.5), rtol=1e-6)
+
+
+def test_field_buffers_are_rotated_not_reallocated():
+    simulator = sim.WaveSimulator2D(W, H, make_scene(), backend='numpy', engine='fused')
+    buffers = {id(simulator.u), id(simulator.u_prev), id(simulator.u_next)}
+    for i in range(5):
+        simulator.update_scene()
+        previous = simulator.get_field().copy()
+        simulator.update_field()
+        assert {id(simulator.u), id(simulator.u_prev), id(simulator.u_next)} == buffers
+        np.testing.assert_array_equal(simulator.u_prev, previous)
+
+
+def test_run_matches_manual_steps():
+    simulator = sim.WaveSimulator2D(W, H, make_scene(), backend='numpy')
+    statistics = simulator.run(120)
+    assert simulator.step_count == 120 and statistics.num_steps == 120
+    assert statistics.num_cells == W * H and statistics.steps_per_second > 0
+    np.testing.assert_allclose(simulator.get_field(), reference_run(120), rtol=0, atol=1e-5)
+
+
+def test_run_callback_cadence():
+    simulator = sim.WaveSimulator2D(W, H, make_scene(), backend='numpy')
+    seen = []
+    simulator.run(20, callbacks=[lambda s: seen.append(s.step_count)], callbacks_every=4)
+    assert seen == [4, 8, 12, 16, 20]
+
+
+def test_run_renders_scene_at_its_cadence():
+    # the scene is static, rendering it less often does not change the result
+    fields = []
+    for scene_every in [1, 7]:
+        simulator = sim.WaveSimulator2D(W, H, make_scene(), backend='numpy')
+        simulator.run(50, scene_every=scene_every)
+        fields.append(simulator.get_field().copy())
+    np.testing.assert_array_equal(fields[0], fields[1])
+
+
+class PulsingDampening(sim.SceneObject):
+    """ dynamic test object, its dampening changes with every rendered frame """
+
+    def __init__(self):
+        self.frame = 0
+
+    def render(self, field, wave_speed_field, dampening_field):
+        self.frame += 1
+        dampening_field[10:20, 30:50] *= 0.9 + 0.05 * np.sin(self.frame * 0.3)
+        wave_speed_field[30:40, 10:20] = 0.8
+
+    def update_field(self, field, t):
+        pass
+
+    def render_visualization(self, image):
+        pass
+
+
+class FullRenderSimulator(sim.WaveSimulator2D):
+    """ renders every scene object each frame, the behaviour before static objects were baked """
+
+    def render_scene(self):
+        self.c.fill(1.0)
+        self.d.fill(1.0)
+        for obj in self.scene_objects:
+            obj.render(self.u, self.c, self.d)
+        self._update_coefficient()
+
+
+def make_mixed_scene():
+    # static prefix, a dynamic object, and a static object in the dynamic tail
+    return make_scene()[:2] + [PulsingDampening(), StaticRefractiveIndexPolygon([(5, 5), (20, 5), (5, 20)], 2.0)] + \
+        make_scene()[2:]
+
+
+def test_baked_scene_matches_full_render():
+    fields = []
+    for simulator_class in [sim.WaveSimulator2D, FullRenderSimulator]:
+        simulator = simulator_class(W, H, make_mixed_scene(), backend='numpy')
+        simulator.run(100)
+        fields.append((simulator.get_field().copy(), simulator.c.copy(), simulator.d.copy()))
+    for baked, full in zip(*fields):
+        np.testing.assert_array_equal(baked, full)
+
+
+def test_invalidate_scene_rebakes_static_objects():
+    scene = make_scene()
+    simulator = sim.WaveSimulator2D(W, H, scene, backend='numpy')
+    reference = FullRenderSimulator(W, H, make_scene(), backend='numpy')
+    simulator.run(30)
+    reference.run(30)
+
+    # changing a static object is only picked up after invalidate_scene
+    scene[1].refractive_index = 2.0
+    reference.scene_objects[1].refractive_index = 2.0
+    simulator.render_scene()
+    reference.render_scene()
+    assert not np.array_equal(simulator.c, reference.c)
+    simulator.invalidate_scene()
+    simulator.run(30)
+    reference.run(30)
+    np.testing.assert_array_equal(simulator.c, reference.c)
+    np.testing.assert_array_equal(simulator.get_field(), reference.get_field())
+
+
+def test_adding_objects_rebakes_scene():
+    simulator = sim.WaveSimulator2D(W, H, make_scene(), backend='numpy')
+    simulator.run(10)
+    simulator.add_scene_object(StaticRefractiveIndexPolygon([(5, 5), (20, 5), (5, 20)], 2.0))
+    simulator.render_scene()
+    reference = FullRenderSimulator(W, H, simulator.scene_objects, backend='numpy')
+    reference.render_scene()
+    np.testing.assert_array_equal(simulator.c, reference.c)
@@ -0,0 +1,192 @@
+import numpy as np
+import wave_sim2d.wave_simulation as sim
+import wave_sim2d.wave_visualizer as vis
+from wave_sim2d.scene_objects.source import PointSource
+
+
+class CountingObject(sim.SceneObject):
+    """ draws a marker into the visualization and counts how often it was asked to """
+    def __init__(self, static=True, value=200):
+        self.static = static
+        self.value = value
+        self.num_renders = 0
+
+    def render(self, field, wave_speed_field, dampening_field):
+        pass
+
+    def update_field(self, field, t):
+        pass
+
+    def render_visualization(self, image):
+        self.num_renders += 1
+        image[2:4, 2:4] = self.value
+
+    def is_static(self):
+        return self.static
+
+
+def make_visualizer():
+    return vis.WaveVisualizer(field_colormap=vis.get_colormap_lut('colormap_wave1', invert=False),
+                              intensity_colormap=vis.get_colormap_lut('afmhot', invert=False))
+
+
+def step(simulator, visualizer, num_steps=1):
+    for i in range(num_steps):
+        simulator.run(1)
+        visualizer.update(simulator)
+
+
+def test_overlay_is_cached_for_static_scenes():
+    marker = CountingObject()
+    simulator = sim.WaveSimulator2D(32, 24, [marker, PointSource(10, 10, 0.1)], backend='numpy')
+    visualizer = make_visualizer()
+    for i in range(5):
+        step(simulator, visualizer)
+        visualizer.render_field(1.0)
+        assert visualizer.visualization_image[2, 2, 0] == 200
+    assert marker.num_renders == 1
+
+
+def test_overlay_is_invalidated_by_scene_version():
+    marker = CountingObject()
+    simulator = sim.WaveSimulator2D(32, 24, [marker], backend='numpy')
+    visualizer = make_visualizer()
+    step(simulator, visualizer)
+    visualizer.visualization_image
+
+    marker.value = 100
+    simulator.invalidate_scene()
+    assert visualizer.visualization_image[2, 2, 0] == 100
+    assert marker.num_renders == 2
+
+
+def test_overlay_is_invalidated_by_object_list_changes():
+    first, second = CountingObject(), CountingObject(value=50)
+    scene = [first]
+    simulator = sim.WaveSimulator2D(32, 24, scene, backend='numpy')
+    visualizer = make_visualizer()
+    step(simulator, visualizer)
+    visualizer.visualization_image
+
+    # a direct change of the list, without add_scene_object or a simulation step
+    scene.append(second)
+    assert visualizer.visualization_image[2, 2, 0] == 50
+    assert first.num_renders == 2 and second.num_renders == 1
+
+
+def test_dynamic_scenes_redraw_once_per_update():
+    marker = CountingObject(static=False)
+    simulator = sim.WaveSimulator2D(32, 24, [marker], backend='numpy')
+    visualizer = make_visualizer()
+    for i in range(3):
+        step(simulator, visualizer)
+        visualizer.visualization_image
+        visualizer.visualization_image
+    assert marker.num_renders == 3
+
+
+def test_headless_visualizer_has_no_overlay():
+    marker = CountingObject()
+    simulator = sim.WaveSimulator2D(32, 24, [marker], backend='numpy')
+    visualizer = vis.WaveVisualizer(None, None, headless=True)
+    step(simulator, visualizer, 3)
+    assert visualizer.visualization_image is None
+    assert marker.num_renders == 0
+
+
+class FieldSequence:
+    """ stands in for a simulator, get_field returns the next field of a fixed sequence """
+    def __init__(self, fields):
+        self.fields = fields
+        self.index = -1
+        self.scene_objects = []
+
+    def get_field(self):
+        return self.fields[self.index]
+
+    def advance(self):
+        self.index += 1
+
+
+def feed(visualizer, fields):
+    source = FieldSequence(fields)
+    for i in range(len(fields)):
+        source.advance()
+        visualizer.update(source)
+    return visualizer.intensity
+
+
+def random_fields(num_fields, shape=(6, 7), seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.standard_normal(shape).astype(np.float32) for i in range(num_fields)]
+
+
+def periodic_fields(num_fields, period=10.3):
+    # stationary oscillation with a different phase per cell
+    phase = np.linspace(0, 2 * np.pi, 42).reshape(6, 7)
+    return [np.sin(2 * np.pi * i / period + phase).astype(np.float32) for i in range(num_fields)]
+
+
+def test_exponential_intensity_matches_reference():
+    fields = random_fields(50)
+    reference = np.zeros((6, 7))
+    for field in fields:
+        reference = reference * 0.98 + field.astype(np.float64) ** 2 * 0.02
+    intensity = feed(vis.WaveVisualizer(None, None, headless=True), fields)
+    np.testing.assert_allclose(intensity, reference, rtol=1e-5, atol=1e-7)
+
+
+def test_decimated_intensity_matches_reference():
+    fields = random_fields(50)
+    reference = np.zeros((6, 7))
+    for i, field in enumerate(fields):
+        if (i + 1) % 4 == 0:
+            reference = reference * 0.98 ** 4 + field.astype(np.float64) ** 2 * (1.0 - 0.98 ** 4)
+    intensity = feed(vis.WaveVisualizer(None, None, headless=True, intensity_every=4), fields)
+    np.testing.assert_allclose(intensity, reference, rtol=1e-5, atol=1e-7)
+
+
+def test_decimated_intensity_keeps_time_constant():
+    # after the same number of steps, per step and decimated accumulation reach the same average
+    fields = periodic_fields(600)
+    every_step = feed(vis.WaveVisualizer(None, None, headless=True), fields)
+    decimated = feed(vis.WaveVisualizer(None, None, headless=True, intensity_every=3), fields)
+    np.testing.assert_allclose(every_step, 0.5, atol=0.05)
+    np.testing.assert_allclose(decimated, every_step, atol=0.05)
+
+
+def test_window_intensity_is_exact_average():
+    fields = random_fields(30)
+    visualizer = vis.WaveVisualizer(None, None, headless=True, intensity_mode='window', intensity_window=8)
+    intensity = feed(visualizer, fields)
+    # the last completed window holds updates 17..24, the updates after it are still being summed
+    expected = np.mean([f.astype(np.float64) ** 2 for f in fields[16:24]], axis=0)
+    np.testing.assert_allclose(intensity, expected, rtol=1e-6)
+
+    visualizer = vis.WaveVisualizer(None, None, headless=True, intensity_mode='window', intensity_window=8,
+                                    intensity_every=2)
+    intensity = feed(visualizer, fields)
+    expected = np.mean([f.astype(np.float64) ** 2 for f in fields[17:24:2]], axis=0)
+    np.testing.assert_allclose(intensity, expected, rtol=1e-6)
+
+
+def test_window_intensity_matches_per_step_average():
+    # for a stationary signal the window average over whole periods is the per step time average
+    fields = periodic_fields(400, period=10)
+    window = feed(vis.WaveVisualizer(None, None, headless=True, intensity_mode='window', intensity_window=100), fields)
+    per_step = np.mean([f.astype(np.float64) ** 2 for f in fields], axis=0)
+    np.testing.assert_allclose(window, per_step, rtol=1e-5)
+
+
+def test_numpy_fallback_matches_numba(monkeypatch):
+    fields = random_fields(20)
+    results = []
+    for use_numba in [True, False]:
+        if not use_numba:
+            monkeypatch.setattr(vis, 'numba', None)
+        exponential = feed(vis.WaveVisualizer(None, None, headless=True, intensity_every=2), fields)
+        window = feed(vis.WaveVisualizer(None, None, headless=True, intensity_mode='window', intensity_window=5),
+                      fields)
+        results.append((exponential.copy(), window.copy()))
+    for a, b in zip(*results):
+        np.testing.assert_allclose(a, b, rtol=1e-6)
@@ -1,23 +1,28 @@
-import cupy
+import time
 import numpy as np
-import cupy as cp
-import cupyx.scipy.signal
 from abc import ABC, abstractmethod
+from wave_sim2d.backend import get_backend
+from wave_sim2d.engines import get_engine
+from wave_sim2d.boundary import get_boundary
+from wave_sim2d.precision import get_precision, compute_dtype
+from wave_sim2d.profiling import active_profiler
+from wave_sim2d.source_table import SourceTable
 
 
 class SceneObject(ABC):
     """
     Interface for simulation scene objects. A scene object is anything defining or modifying the simulation scene.
     For example: Light sources, Absorbers or regions with specific refractive index. Scene objects can change the
-    simulated field and draw their contribution to the wave speed field and dampening field each frame """
+    simulated field and draw their contribution to the wave speed field and dampening field each frame.
+    The fields passed to the methods are numpy or cupy arrays, depending on the backend of the simulator. """
 
     @abstractmethod
-    def render(self, field: cupy.ndarray, wave_speed_field: cupy.ndarray, dampening_field: cupy.ndarray):
+    def render(self, field, wave_speed_field, dampening_field):
         """ renders the scene objects contribution to the wave speed field and dampening field """
         pass
 
     @abstractmethod
-    def update_field(self, field: cupy.ndarray, t):
+    def update_field(self, field, t):
         """ performs updates to the field itself, e.g. for adding sources """
         pass
 
@@ -26,6 +31,104 @@ class SceneObject(ABC):
         """ renders a visualization of the scene object to the image """
         pass
 
+    def is_static(self):
+        """
+        Returns True if the contribution of render() to the wave speed and dampening fields never changes, neither
+        over time nor with the field. The simulator renders static objects once and reuses the result until the
+        scene changes. Time dependent field updates (update_field) are allowed for static objects.
+        """
+        return False
+
+    def get_emitters(self, field_shape):
+        """
+        Objects whose field update consists only of sinusoidal emitters can return them as EmitterSet here. The
+        simulator then merges the emitters of consecutive such objects into one SourceTable, evaluates them in a
+        single vectorised operation per step and does not call update_field of the object.
+        @return: EmitterSet or None if the object updates the field itself.
+        """
+        return None
+
+    def get_refined(self, x, y, factor):
+        """
+        Objects that can be rasterised at a finer resolution return a copy of themselves in the coordinates of the
+        fine grid of a refined patch (see wave_sim2d.subgrid) here, the patch covers the coarse cells from (x, y)
+        with factor times the resolution. Patches render the other objects at the resolution of the coarse grid.
+        @return: SceneObject or None.
+        """
+        return None
+
+    def get_version(self):
+        """
+        Returns a counter of the parameter changes of the object, see SceneParameter. The simulator bakes the scene
+        again when the version of one of its objects has changed.
+        """
+        return getattr(self, '_version', 0)
+
+    def mark_changed(self):
+        """ increments the version of the object, e.g. after changing a parameter that is not a SceneParameter """
+        self._version = self.get_version() + 1
+
+    def modifies_field(self):
+        """
+        Returns False if update_field never writes to the field (e.g. objects that only render the wave speed or
+        dampening field, or detectors that only read the field). Engines that skip quiescent regions of the field
+        need to know which pixels the scene writes to.
+        """
+        return True
+
+    def get_state(self):
+        """
+        Returns the internal state of the object that is needed to continue a simulation from a checkpoint and can
+        not be derived from the simulation time (e.g. the position of an object moved by the field), as dictionary
+        of numpy arrays or scalars. Returns None for objects without such state.
+        """
+        return None
+
+    def set_state(self, state):
+        """ restores the state returned by get_state """
+        pass
+
+
+class SceneParameter:
+    """
+    Descriptor for parameters of scene objects that the simulator caches when it bakes the scene (e.g. source
+    positions and frequencies in the merged source table). Assigning a new value marks the object as changed, so the
+    simulator picks up the new value at the next scene update.
+    """
+    def __set_name__(self, owner, name):
+        self.name = '_' + name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return getattr(obj, self.name)
+
+    def __set__(self, obj, value):
+        setattr(obj, self.name, value)
+        obj.mark_changed()
+
+
+class RunStatistics:
+    """
+    Timing summary of a WaveSimulator2D.run call
+    """
+    def __init__(self, num_steps, elapsed_seconds, num_cells):
+        self.num_steps = num_steps
+        self.elapsed_seconds = elapsed_seconds
+        self.num_cells = num_cells
+
+    @property
+    def steps_per_second(self):
+        return self.num_steps / self.elapsed_seconds if self.elapsed_seconds > 0 else float('inf')
+
+    @property
+    def cells_per_second(self):
+        return self.steps_per_second * self.num_cells
+
+    def __repr__(self):
+        return (f'RunStatistics({self.num_steps} steps in {self.elapsed_seconds:.3f}s, '
+                f'{self.steps_per_second:.1f} steps/s, {self.cells_per_second:.3e} cells/s)')
+
 
 class WaveSimulator2D:
     """
@@ -33,40 +136,123 @@ class WaveSimulator2D:
     The system assumes units, where the wave speed is 1.0 pixel/timestep
     source frequency should be adjusted accordingly
     """
-    def __init__(self, w, h, scene_objects, initial_field=None):
+    def __init__(self, w, h, scene_objects, initial_field=None, backend=None, engine=None, boundary=None,
+                 precision=None, patches=None, profiler=None):
         """
         Initialize the 2D wave simulator.
         @param w: Width of the simulation grid.
         @param h: Height of the simulation grid.
+        @param backend: Array backend, 'numpy', 'cupy' or None to use cupy whenever a GPU is available.
+        @param engine: Field update engine, 'convolution' (default), 'fused', 'tiled', 'active', 'spectral', 'strip'
+                       or a FieldUpdateEngine instance.
+        @param boundary: Boundary of the grid, None for the zero boundary (waves are reflected unless absorbed by a
+                         dampening border), 'cpml' or a CPMLBoundary instance for a perfectly matched layer.
+        @param precision: Storage precision of all fields, 'float32' (default), 'float64' for reference results or
+                          'float16' to halve the memory of the fields, see wave_sim2d.precision. The arithmetic of
+                          float16 fields is done in float32.
+        @param patches: List of RefinedPatch objects, regions simulated on a finer grid (see wave_sim2d.subgrid).
+        @param profiler: Optional Profiler recording the time of the phases of each step (see wave_sim2d.profiling).
         """
-        self.global_dampening = 1.0
-        self.c = cp.ones((h, w), dtype=cp.float32)                      # wave speed field (from refractive indices)
-        self.d = cp.ones((h, w), dtype=cp.float32)                      # dampening field
-        self.u = cp.zeros((h, w), dtype=cp.float32)                     # field values
-        self.u_prev = cp.zeros((h, w), dtype=cp.float32)                # field values of prev frame
+        self._init_common(get_backend(backend), get_engine(engine), get_boundary(boundary), get_precision(precision),
+                          patches if patches is not None else [], profiler, scene_objects)
+        xp = self.backend.xp
+
+        shape = self._grid_shape(w, h)
+        self.c = xp.ones(shape, dtype=self.dtype)                       # wave speed field (from refractive indices)
+
+        # the arrays read and written by the engine are allocated by the engine
+        def allocate():
+            return self.engine.allocate_field(shape, self.dtype, self.backend)
+
+        self.d = allocate()                                             # dampening field
+        self.coefficient = allocate()                                   # precomputed (c*dt)**2
+        self.d.fill(1.0)
+        self.coefficient.fill(1.0)
+
+        # ring of three preallocated field buffers. Each step the engine writes the new field to u_next and the
+        # references are rotated afterwards, so the step loop neither allocates nor copies fields
+        self.u = allocate()                                             # field values
+        self.u_prev = allocate()                                        # field values of prev frame
+        self.u_next = allocate()                                        # output buffer of the field update
 
         if initial_field is not None:
-            assert w == initial_field.shape[1] and h == initial_field.shape[2], 'width/height of initial field invalid'
-            self.u[:] = initial_field
-            self.u_prev[:] = initial_field
+            assert w == initial_field.shape[-1] and h == initial_field.shape[-2], \
+                'width/height of initial field invalid'
+            self.u[:] = self.backend.asarray(initial_field)
+            self.u_prev[:] = self.u
 
-        # Define Laplacian kernel
-        self.laplacian_kernel = cp.array([[0.066, 0.184, 0.066],
+        # Define Laplacian kernel, in the compute dtype of the fields so convolutions do not upcast
+        self.laplacian_kernel = xp.array([[0.066, 0.184, 0.066],
                                           [0.184, -1.0, 0.184],
-                                          [0.066, 0.184, 0.066]])
+                                          [0.066, 0.184, 0.066]], dtype=compute_dtype(self.dtype))
 
-        # self.laplacian_kernel = cp.array([[0.05, 0.2, 0.05],
+        # self.laplacian_kernel = xp.array([[0.05, 0.2, 0.05],
         #                           [0.2, -1.0, 0.2],
         #                           [0.05, 0.2, 0.05]])
 
-        # self.laplacian_kernel = cp.array([[0.103, 0.147, 0.103],
+        # self.laplacian_kernel = xp.array([[0.103, 0.147, 0.103],
         #                                   [0.147, -1.0, 0.147],
         #                                   [0.103, 0.147, 0.103]])
 
+    def _init_common(self, backend, engine, boundary, dtype, patches, profiler, scene_objects):
+        """
+        Sets up everything but the fields. Shared with the members of an ensemble, whose fields are views into the
+        fields of the ensemble.
+        """
+        self.backend = backend
+        self.engine = engine
+        self.boundary = boundary
+        self.dtype = dtype
+        self.patches = patches
+        self.profiler = profiler
+        self._patch_phases = [f'field.patch.{i}' for i in range(len(patches))]
+
+        self.global_dampening = 1.0
         self.t = 0
         self.dt = 1.0
+        self.step_count = 0
 
         self.scene_objects = scene_objects if scene_objects is not None else []
+        self._reset_scene_cache()
+
+    def _grid_shape(self, w, h):
+        """ shape of the field arrays """
+        return h, w
+
+    def _reset_scene_cache(self):
+        """ baked contribution of the leading static scene objects, see render_scene """
+        self.scene_version = 0                                          # incremented whenever the scene changes
+        self._baked_objects = None
+        self._baked_versions = []
+        self._dynamic_objects = []
+        self._field_updates = []
+        self._render_phases = []
+        self._static_c = None
+        self._static_d = None
+        self._coefficient_dt = self.dt
+
+    def add_scene_object(self, scene_object):
+        """
+        Adds a scene object to the end of the scene.
+        """
+        self.scene_objects.append(scene_object)
+        self.invalidate_scene()
+
+    def remove_scene_object(self, scene_object):
+        """
+        Removes a scene object from the scene.
+        """
+        self.scene_objects.remove(scene_object)
+        self.invalidate_scene()
+
+    def invalidate_scene(self):
+        """
+        Forces the static scene to be rendered again at the next scene update. Call this after changing the
+        parameters of a static scene object. Adding, removing or reordering objects and changes of SceneParameter
+        attributes (e.g. of sources) are detected automatically.
+        """
+        self._baked_objects = None
+        self.scene_version += 1
 
     def reset_time(self):
         """
@@ -78,32 +264,272 @@ class WaveSimulator2D:
         """
         Update the simulation field based on the wave equation.
         """
-        # calculate laplacian using convolution
-        laplacian = cupyx.scipy.signal.convolve2d(self.u, self.laplacian_kernel, mode='same', boundary='fill')
+        if self.dt != self._coefficient_dt:
+            self._update_coefficient()
 
-        # update field
-        v = (self.u - self.u_prev) * self.d * self.global_dampening
-        r = (self.u + v + laplacian * (self.c * self.dt)**2)
+        # without a profiler the phases are not timed at all
+        profiler = active_profiler(self.profiler)
+        start = profiler.begin(self.backend) if profiler is not None else None
+        self.engine.step(self.u, self.u_prev, self.coefficient, self.d, self.global_dampening,
+                         self.laplacian_kernel, self.u_next)
+        if profiler is not None:
+            profiler.end('field.engine', start, self.backend)
+        if self.boundary is not None:
+            start = profiler.begin(self.backend) if profiler is not None else None
+            self.boundary.apply(self.u, self.u_next, self.coefficient, self.laplacian_kernel, self.dt)
+            if profiler is not None:
+                profiler.end('field.boundary', start, self.backend)
+        for phase, patch in zip(self._patch_phases, self.patches):
+            start = profiler.begin(self.backend) if profiler is not None else None
+            patch.step(self, self.u_prev, self.u, self.u_next)
+            if profiler is not None:
+                profiler.end(phase, start, self.backend)
 
-        self.u_prev[:] = self.u
-        self.u[:] = r
+        # rotate buffers, the oldest field becomes the output buffer of the next step
+        self.u_prev, self.u, self.u_next = self.u, self.u_next, self.u_prev
 
         self.t += self.dt
+        self.step_count += 1
+
+    def _update_coefficient(self):
+        """ recomputes the wave speed term (c*dt)**2 of the field update in place """
+        xp = self.backend.xp
+        xp.multiply(self.c, self.dt, out=self.coefficient)
+        xp.multiply(self.coefficient, self.coefficient, out=self.coefficient)
+        self._coefficient_dt = self.dt
+        self.engine.coefficient_changed()
+
+    def _bake_static_scene(self):
+        """
+        Renders the leading static scene objects once. All objects after the first non-static one are rendered
+        each frame on top of a copy of the baked fields, because they may blend with the dynamic contributions.
+        """
+        profiler = active_profiler(self.profiler)
+        start = profiler.begin(self.backend) if profiler is not None else None
+
+        num_static = 0
+        while num_static < len(self.scene_objects) and self.scene_objects[num_static].is_static():
+            num_static += 1
+
+        # phase names of the objects, so rendering them each frame does not format them again
+        self._render_phases = [f'scene.render.{i}:{type(obj).__name__}' for i, obj in enumerate(self.scene_objects)]
 
-    def update_scene(self):
         # clear wave speed field and dampening field
         self.c.fill(1.0)
         self.d.fill(1.0)
 
-        for obj in self.scene_objects:
-            obj.render(self.u, self.c, self.d)
+        for patch in self.patches:
+            patch.begin_scene(self, bake=True)
+        for i, obj in enumerate(self.scene_objects[:num_static]):
+            self._render_object(i, obj)
 
-        for obj in self.scene_objects:
-            obj.update_field(self.u, self.t)
+        self._dynamic_objects = self.scene_objects[num_static:]
+        if self._dynamic_objects:
+            self._static_c = self.c.copy()
+            self._static_d = self.d.copy()
+        else:
+            self._static_c = None
+            self._static_d = None
+        for patch in self.patches:
+            patch.end_scene(self, bake=True, dynamic=bool(self._dynamic_objects))
+
+        # merge the sinusoidal emitters of consecutive objects into one table, the other objects update the field
+        # themselves. The field updates keep the order of the scene objects.
+        self._field_updates = []
+        emitter_sets = []
+        field_objects = []
+        pending = []
+        for i, obj in enumerate(self.scene_objects + [None]):                # None closes the last run of emitters
+            emitters = obj.get_emitters(self.u.shape) if obj is not None else None
+            if emitters is not None:
+                pending.append(emitters)
+                continue
+            if pending:
+                self._field_updates.append(('scene.sources', SourceTable(pending, self.backend)))
+                emitter_sets += pending
+                pending = []
+            if obj is not None:
+                self._field_updates.append((f'scene.update_field.{i}:{type(obj).__name__}', obj))
+                field_objects.append(obj)
+
+        # tell the engine where the scene, the boundary and the patches write to the field (unknown if objects update
+        # the field themselves)
+        if any(obj.modifies_field() for obj in field_objects):
+            self.engine.set_source_pixels(None, None)
+        else:
+            pixels = [(e.ys, e.xs) for e in emitter_sets]
+            if self.boundary is not None:
+                pixels.append(self.boundary.get_pixels(self.u.shape[-2:]))
+            pixels += [patch.get_pixels(self.u.shape[-2:]) for patch in self.patches]
+            ys = np.concatenate([p[0] for p in pixels]) if pixels else np.zeros(0, dtype=np.int64)
+            xs = np.concatenate([p[1] for p in pixels]) if pixels else np.zeros(0, dtype=np.int64)
+            self.engine.set_source_pixels(ys, xs)
+
+        self._baked_objects = list(self.scene_objects)
+        self._baked_versions = [obj.get_version() for obj in self.scene_objects]
+        self.scene_version += 1
+        self._update_coefficient()
+
+        if profiler is not None:
+            profiler.end('scene.bake', start, self.backend)
+
+    def _render_object(self, i, obj):
+        """ renders the i-th scene object, timed if a profiler is set """
+        profiler = active_profiler(self.profiler)
+        start = profiler.begin(self.backend) if profiler is not None else None
+        obj.render(self.u, self.c, self.d)
+        for patch in self.patches:
+            patch.render_object(self, obj)
+        if profiler is not None:
+            profiler.end(self._render_phases[i], start, self.backend)
+
+    def _scene_changed(self):
+        """ True if objects were added, removed or reordered or changed their parameters since the last bake """
+        if self._baked_objects != self.scene_objects:
+            return True
+        return any(obj.get_version() != version for obj, version in zip(self.scene_objects, self._baked_versions))
+
+    def render_scene(self):
+        """
+        Renders the contributions of all scene objects to the wave speed field and the dampening field.
+        Static objects are only rendered again when the scene has changed.
+        """
+        if self._scene_changed():
+            self._bake_static_scene()
+
+        if self._dynamic_objects:
+            self.c[:] = self._static_c
+            self.d[:] = self._static_d
+
+            for patch in self.patches:
+                patch.begin_scene(self, bake=False)
+            first = len(self.scene_objects) - len(self._dynamic_objects)
+            for i, obj in enumerate(self._dynamic_objects):
+                self._render_object(first + i, obj)
+            for patch in self.patches:
+                patch.end_scene(self, bake=False, dynamic=True)
+
+            self._update_coefficient()
+
+    def update_scene_field(self):
+        """
+        Applies the field updates of all scene objects (e.g. sources) for the current time, in the order of the
+        scene objects. Consecutive sources are applied together by one merged source table.
+        """
+        if self._scene_changed():
+            self._bake_static_scene()
+
+        profiler = active_profiler(self.profiler)
+        if profiler is None:
+            for _, updater in self._field_updates:
+                updater.update_field(self.u, self.t)
+            return
+        for phase, updater in self._field_updates:
+            start = profiler.begin(self.backend)
+            updater.update_field(self.u, self.t)
+            profiler.end(phase, start, self.backend)
+
+    def update_scene(self):
+        self.render_scene()
+        self.update_scene_field()
+
+    def run(self, num_steps, callbacks=None, callbacks_every=1, scene_every=1):
+        """
+        Advances the simulation by several time steps in one call. Each step applies the field updates of the scene
+        objects and updates the field. The more expensive rendering of the scene and the observer callbacks only run
+        at the given cadence.
+        @param num_steps: Number of time steps to simulate.
+        @param callbacks: Optional list of callables, each is called with the simulator as argument after every
+                          'callbacks_every' steps (e.g. to update a visualizer or write video frames).
+        @param callbacks_every: Number of steps between two callback invocations.
+        @param scene_every: Number of steps between two renderings of the wave speed and dampening fields. Use
+                            values larger than 1 for scenes whose objects change slowly or not at all.
+        @return: RunStatistics with the achieved steps per second.
+        """
+        callbacks = callbacks if callbacks is not None else []
+        start = time.perf_counter()
+
+        for i in range(num_steps):
+            if i % scene_every == 0:
+                self.render_scene()
+            self.update_scene_field()
+            self.update_field()
+
+            if callbacks and (i + 1) % callbacks_every == 0:
+                for callback in callbacks:
+                    callback(self)
+
+        self.backend.synchronize()
+        return RunStatistics(num_steps, time.perf_counter() - start, self.u.size)
+
+    def _state_objects(self):
+        """ scene objects whose state is part of the simulator state """
+        return self.scene_objects
+
+    def get_state(self):
+        """
+        Returns a copy of the state needed to continue the simulation: the current and previous field, the time, the
+        step count and the state of the scene objects (see SceneObject.get_state), as dictionary of numpy arrays.
+        The wave speed and dampening fields are not included, they are rendered again by the scene objects.
+        """
+        to_numpy = self.backend.to_numpy
+        state = {'u': to_numpy(self.u.copy()),
+                 'u_prev': to_numpy(self.u_prev.copy()),
+                 't': np.float64(self.t),
+                 'dt': np.float64(self.dt),
+                 'step_count': np.int64(self.step_count),
+                 'global_dampening': np.float64(self.global_dampening)}
+
+        for i, obj in enumerate(self._state_objects()):
+            object_state = obj.get_state()
+            if object_state:
+                for key, value in object_state.items():
+                    state[f'scene.{i}.{key}'] = np.asarray(value)
+
+        if self.boundary is not None:
+            state.update({'boundary.' + key: value for key, value in self.boundary.get_state().items()})
+        for i, patch in enumerate(self.patches):
+            state.update({f'patch.{i}.{key}': value for key, value in patch.get_state().items()})
+        return state
+
+    def set_state(self, state):
+        """
+        Restores a state returned by get_state. The simulator has to be created with the same grid size and the same
+        scene objects (e.g. by the same scene builder) as the simulator the state was taken from.
+        """
+        assert tuple(state['u'].shape) == tuple(self.u.shape), 'grid size of the state does not match the simulator'
+        self.u[:] = self.backend.asarray(state['u'], dtype=self.u.dtype)
+        self.u_prev[:] = self.backend.asarray(state['u_prev'], dtype=self.u_prev.dtype)
+        self.t = float(state['t'])
+        self.dt = float(state['dt'])
+        self.step_count = int(state['step_count'])
+        self.global_dampening = float(state['global_dampening'])
+
+        object_states = {}
+        for key in state.keys():
+            if key.startswith('scene.'):
+                _, i, name = key.split('.', 2)
+                object_states.setdefault(int(i), {})[name] = state[key]
+
+        objects = self._state_objects()
+        for i, object_state in object_states.items():
+            objects[i].set_state(object_state)
+
+        if self.boundary is not None:
+            boundary_state = {key[len('boundary.'):]: state[key] for key in state.keys() if key.startswith('boundary.')}
+            self.boundary.set_state(boundary_state, self.u, self.laplacian_kernel, self.dt)
+        for i, patch in enumerate(self.patches):
+            prefix = f'patch.{i}.'
+            patch.set_state({key[len(prefix):]: state[key] for key in state.keys() if key.startswith(prefix)}, self)
+
+        self.engine.invalidate()
+        self.invalidate_scene()
 
     def get_field(self):
         """
         Get the current state of the simulation field.
+        The returned array is one of the simulators field buffers. It stays valid for the next step (as previous
+        field) and gets overwritten by the step after that, copy it if it needs to be kept longer.
         @return: A 2D array representing the simulation field.
         """
         return self.u
@@ -111,10 +537,12 @@ class WaveSimulator2D:
     def render_visualization(self, image=None):
         # clear wave speed field and dampening field
         if image is None:
-            image = np.zeros((self.c.shape[0], self.c.shape[1], 3), dtype=np.uint8)
+            image = np.zeros((self.c.shape[-2], self.c.shape[-1], 3), dtype=np.uint8)
 
         for obj in self.scene_objects:
             obj.render_visualization(image)
+        for patch in self.patches:
+            patch.render_visualization(image)
 
         return image
 
@@ -1,6 +1,9 @@
 import numpy as np
-import cupy as cp
 import cv2
+from wave_sim2d.backend import backend_of
+from wave_sim2d.engines import _jit, numba
+from wave_sim2d.precision import compute_dtype, as_compute
+from wave_sim2d.profiling import get_profiler
 import matplotlib.pyplot
 
 colormap_icefire = [[179, 224, 216], [178, 223, 216], [176, 222, 215], [175, 221, 215], [173, 219, 214], [171, 218, 214], [169, 217, 214], [167, 215, 213], [165, 214, 213], [162, 212, 212], [160, 210, 212], [157, 209, 211], [154, 207, 211], [151, 205, 210], [148, 203, 210], [146, 201, 209], [143, 199, 209], [140, 198, 208], [137, 196, 208], [134, 194, 208], [131, 192, 207], [128, 190, 207], [125, 188, 207], [122, 187, 207], [119, 185, 206], [116, 183, 206], [113, 181, 206], [110, 179, 206], [108, 177, 206], [105, 176, 205], [102, 174, 205], [99, 172, 205], [97, 170, 205], [94, 168, 205], [91, 166, 205], [89, 164, 205], [86, 162, 205], [84, 161, 205], [82, 159, 205], [79, 157, 205], [77, 155, 205], [75, 153, 206], [73, 151, 206], [71, 149, 206], [69, 147, 206], [68, 145, 206], [66, 143, 206], [65, 140, 206], [64, 138, 206], [63, 136, 206], [62, 134, 206], [61, 132, 206], [61, 130, 205], [61, 127, 205], [60, 125, 205], [60, 123, 204], [60, 121, 203], [60, 118, 203], [61, 116, 202], [61, 114, 201], [61, 112, 200], [62, 109, 198], [62, 107, 197], [63, 105, 195], [64, 103, 194], [65, 100, 192], [65, 98, 190], [66, 96, 187], [67, 94, 185], [67, 92, 183], [68, 90, 180], [68, 88, 177], [69, 86, 174], [69, 85, 171], [69, 83, 168], [70, 81, 165], [70, 79, 162], [70, 78, 158], [69, 76, 155], [69, 75, 151], [69, 73, 148], [68, 72, 144], [68, 70, 141], [67, 69, 137], [66, 67, 134], [66, 66, 130], [65, 65, 127], [64, 63, 123], [63, 62, 120], [62, 61, 116], [61, 60, 113], [60, 59, 109], [59, 57, 106], [58, 56, 103], [57, 55, 99], [55, 54, 96], [54, 53, 93], [53, 52, 90], [52, 50, 87], [51, 49, 84], [50, 48, 81], [48, 47, 78], [47, 46, 75], [46, 45, 72], [45, 44, 70], [44, 43, 67], [43, 42, 65], [42, 41, 62], [41, 40, 60], [40, 39, 57], [39, 38, 55], [38, 37, 53], [37, 37, 51], [37, 36, 49], [36, 35, 47], [35, 35, 45], [35, 34, 44], [34, 33, 42], [34, 33, 41], [33, 32, 39], [33, 32, 38], [33, 32, 37], [33, 31, 36], [33, 31, 35], [33, 31, 35], [34, 30, 34], [34, 30, 33], [34, 30, 33], [35, 30, 32], [36, 30, 32], [36, 30, 32], [37, 30, 32], [38, 30, 32], [39, 30, 32], [40, 30, 32], [41, 30, 32], [42, 30, 33], [44, 31, 33], [46, 31, 34], [47, 31, 34], [49, 31, 35], [51, 32, 35], [53, 32, 36], [55, 32, 37], [57, 33, 38], [59, 33, 38], [61, 33, 39], [63, 34, 40], [65, 34, 41], [67, 35, 42], [70, 35, 43], [72, 36, 44], [74, 36, 45], [77, 37, 46], [79, 37, 47], [82, 38, 48], [84, 38, 49], [87, 39, 50], [90, 39, 51], [92, 40, 52], [95, 40, 53], [98, 40, 54], [100, 41, 55], [103, 41, 56], [106, 42, 57], [109, 42, 58], [111, 42, 59], [114, 43, 60], [117, 43, 60], [120, 43, 61], [123, 44, 62], [126, 44, 63], [129, 44, 63], [131, 44, 64], [134, 45, 64], [137, 45, 65], [140, 45, 65], [143, 46, 65], [146, 46, 65], [149, 46, 66], [152, 47, 66], [155, 47, 66], [158, 48, 66], [160, 48, 66], [163, 49, 65], [166, 49, 65], [169, 50, 65], [172, 51, 64], [174, 52, 64], [177, 53, 63], [180, 54, 63], [182, 55, 62], [185, 56, 62], [187, 57, 61], [190, 58, 61], [192, 60, 60], [195, 61, 59], [197, 63, 59], [199, 65, 58], [201, 66, 57], [203, 68, 57], [206, 70, 56], [208, 72, 55], [209, 74, 55], [211, 76, 54], [213, 78, 54], [215, 81, 54], [217, 83, 53], [218, 85, 53], [220, 88, 53], [221, 90, 53], [223, 93, 54], [224, 95, 54], [225, 98, 55], [227, 101, 55], [228, 103, 56], [229, 106, 57], [230, 109, 58], [231, 111, 60], [232, 114, 61], [233, 117, 62], [234, 120, 64], [235, 123, 66], [236, 125, 68], [237, 128, 70], [237, 131, 73], [238, 134, 75], [239, 137, 78], [240, 139, 80], [240, 142, 83], [241, 145, 86], [242, 148, 89], [242, 151, 93], [243, 153, 96], [243, 156, 99], [244, 159, 103], [245, 162, 106], [245, 165, 110], [246, 167, 113], [246, 170, 117], [247, 173, 120], [247, 176, 124], [248, 178, 127], [248, 181, 131], [249, 184, 134], [249, 186, 138], [250, 188, 141], [250, 190, 144], [251, 192, 147], [251, 194, 149], [251, 196, 152], [252, 198, 154], [252, 200, 156], [252, 201, 158], [253, 203, 160]]
@@ -10,40 +13,238 @@ colormap_wave3 = [[253, 203, 160], [252, 201, 158], [252, 200, 156], [252, 198,
 colormap_wave4 = [[246, 230, 183], [246, 229, 182], [246, 227, 180], [246, 226, 178], [246, 224, 176], [245, 222, 173], [245, 219, 170], [244, 217, 167], [244, 214, 163], [244, 211, 160], [243, 209, 156], [243, 206, 152], [242, 203, 148], [242, 200, 144], [241, 196, 140], [241, 193, 136], [241, 190, 132], [240, 186, 128], [240, 183, 124], [239, 180, 120], [239, 176, 116], [238, 173, 112], [238, 170, 108], [237, 166, 104], [237, 163, 100], [236, 160, 97], [236, 156, 93], [236, 153, 90], [235, 150, 87], [235, 147, 84], [235, 144, 81], [234, 140, 78], [234, 137, 76], [234, 134, 74], [234, 131, 71], [233, 127, 69], [233, 124, 67], [233, 121, 65], [233, 118, 64], [232, 115, 62], [232, 112, 61], [232, 109, 60], [232, 106, 59], [232, 103, 58], [232, 101, 58], [232, 98, 57], [232, 95, 57], [231, 93, 57], [230, 90, 57], [230, 88, 57], [229, 85, 57], [227, 83, 57], [226, 81, 57], [224, 78, 57], [222, 76, 58], [220, 74, 58], [217, 72, 59], [215, 70, 59], [212, 67, 60], [210, 65, 60], [207, 63, 60], [204, 62, 61], [201, 60, 61], [199, 58, 61], [196, 56, 61], [193, 55, 61], [189, 53, 61], [186, 52, 62], [183, 50, 61], [180, 49, 61], [176, 48, 61], [173, 46, 61], [170, 45, 61], [166, 44, 61], [163, 43, 61], [159, 42, 60], [156, 40, 60], [152, 39, 60], [149, 39, 59], [146, 38, 58], [142, 37, 58], [139, 36, 57], [135, 35, 56], [132, 34, 55], [128, 34, 54], [125, 33, 53], [122, 32, 52], [118, 31, 51], [115, 31, 50], [111, 30, 49], [108, 29, 48], [105, 28, 46], [101, 28, 45], [98, 27, 44], [94, 26, 43], [91, 25, 41], [88, 24, 40], [85, 24, 38], [82, 23, 37], [78, 22, 35], [75, 21, 34], [72, 20, 32], [69, 19, 31], [66, 18, 29], [63, 18, 28], [60, 16, 26], [57, 16, 25], [55, 15, 24], [52, 14, 22], [49, 13, 21], [46, 12, 19], [44, 11, 18], [41, 11, 17], [39, 10, 16], [36, 9, 14], [34, 8, 13], [31, 8, 12], [29, 7, 11], [27, 7, 10], [25, 6, 10], [23, 5, 9], [21, 5, 8], [19, 4, 7], [17, 4, 7], [16, 4, 6], [14, 3, 6], [13, 3, 5], [13, 3, 5], [12, 3, 5], [12, 3, 5], [12, 3, 5], [12, 3, 5], [13, 3, 5], [14, 3, 5], [15, 3, 6], [16, 4, 6], [18, 4, 7], [20, 4, 7], [21, 5, 8], [23, 5, 9], [26, 6, 10], [28, 7, 11], [30, 7, 12], [33, 8, 13], [35, 9, 14], [38, 9, 15], [40, 10, 17], [43, 11, 18], [46, 12, 19], [48, 13, 21], [51, 14, 22], [54, 15, 24], [57, 16, 25], [60, 17, 27], [63, 18, 28], [67, 19, 30], [70, 20, 31], [73, 20, 33], [76, 21, 34], [80, 22, 36], [83, 23, 37], [86, 24, 39], [90, 25, 40], [93, 26, 42], [96, 27, 43], [100, 27, 44], [103, 28, 46], [107, 29, 47], [110, 30, 48], [114, 30, 50], [117, 31, 51], [121, 32, 52], [124, 33, 53], [128, 34, 54], [131, 34, 55], [135, 35, 56], [138, 36, 57], [142, 37, 57], [146, 38, 58], [149, 39, 59], [153, 39, 59], [156, 40, 60], [160, 42, 60], [164, 43, 61], [167, 44, 61], [171, 45, 61], [174, 46, 61], [178, 48, 62], [181, 49, 62], [184, 51, 62], [188, 52, 62], [191, 54, 62], [194, 56, 61], [197, 57, 61], [200, 59, 61], [203, 61, 61], [206, 63, 60], [209, 65, 60], [212, 67, 59], [215, 69, 59], [217, 72, 59], [220, 74, 58], [222, 76, 58], [224, 78, 57], [226, 81, 57], [227, 83, 57], [229, 86, 57], [230, 88, 57], [230, 91, 57], [231, 94, 57], [232, 97, 57], [232, 99, 57], [232, 102, 58], [232, 105, 59], [232, 108, 60], [232, 111, 61], [232, 114, 62], [232, 117, 63], [233, 120, 65], [233, 123, 66], [233, 127, 68], [233, 130, 71], [234, 133, 73], [234, 137, 75], [234, 140, 78], [235, 143, 81], [235, 147, 84], [235, 150, 87], [236, 153, 90], [236, 157, 94], [236, 160, 97], [237, 164, 101], [237, 167, 105], [238, 170, 109], [238, 174, 113], [239, 178, 117], [239, 181, 121], [240, 184, 126], [240, 188, 130], [241, 192, 134], [241, 195, 138], [242, 198, 142], [242, 202, 147], [243, 205, 151], [243, 208, 155], [244, 211, 159], [244, 214, 162], [244, 216, 166], [245, 219, 169], [245, 221, 173], [246, 224, 175], [246, 226, 178], [246, 227, 180], [246, 229, 182], [246, 230, 183]]
 
 
+@_jit
+def _exponential_accumulate(intensity, field, decay):
+    """ intensity = intensity*decay + field**2*(1-decay) in a single pass, both arrays are 2D """
+    weight = 1.0 - decay
+    for y in range(field.shape[0]):
+        for x in range(field.shape[1]):
+            f = field[y, x]
+            intensity[y, x] = intensity[y, x] * decay + f * f * weight
+
+
+@_jit
+def _square_accumulate(accumulator, field):
+    """ accumulator += field**2 in a single pass, both arrays are 2D """
+    for y in range(field.shape[0]):
+        for x in range(field.shape[1]):
+            f = field[y, x]
+            accumulator[y, x] += f * f
+
+
+_cupy_kernels = {}
+
+
+def _get_cupy_kernel(name):
+    """ elementwise cupy kernels of the intensity accumulation, compiled on first use """
+    if name not in _cupy_kernels:
+        import cupy
+        if name == 'exponential':
+            _cupy_kernels[name] = cupy.ElementwiseKernel('T f, float64 decay', 'I intensity',
+                                                         'intensity = intensity * decay + (I)f * (I)f * (1.0 - decay)',
+                                                         'wave_sim2d_exponential_accumulate')
+        else:
+            _cupy_kernels[name] = cupy.ElementwiseKernel('T f', 'A accumulator', 'accumulator += (A)f * f',
+                                                         'wave_sim2d_square_accumulate')
+    return _cupy_kernels[name]
+
+
 class WaveVisualizer:
-    def __init__(self, field_colormap, intensity_colormap):
+    def __init__(self, field_colormap, intensity_colormap, headless=False, intensity_mode='exponential',
+                 intensity_every=1, intensity_window=None, profiler=None):
+        """
+        @param field_colormap: Colormap lookup table of the field, see get_colormap_lut.
+        @param intensity_colormap: Colormap lookup table of the intensity.
+        @param headless: Only track the field and the intensity, the scene visualization is never rendered and
+                         rendered frames have no overlay.
+        @param intensity_mode: 'exponential' for an exponential moving average of the squared field, 'window' for
+                               the exact average over the last completed window of 'intensity_window' updates.
+        @param intensity_every: Sample the intensity only every k-th update. The decay of the exponential average is
+                                corrected (decay**k), so the time constant in steps does not change.
+        @param intensity_window: Window length in updates for the 'window' mode (e.g. one source period), has to be
+                                 a multiple of intensity_every.
+        @param profiler: Optional Profiler recording the time of the updates and renderings (see
+                         wave_sim2d.profiling).
+        """
+        assert intensity_mode in ('exponential', 'window'), "intensity_mode must be 'exponential' or 'window'"
+        if intensity_mode == 'window':
+            assert intensity_window is not None and intensity_window % intensity_every == 0, \
+                'the intensity window has to be a multiple of intensity_every'
         self.field_colormap = field_colormap
         self.intensity_colormap = intensity_colormap
+        self.headless = headless
         self.intensity = None
         self.intensity_exp_average_factor = 0.98
+        self.intensity_mode = intensity_mode
+        self.intensity_every = intensity_every
+        self.intensity_window = intensity_window
         self.field = None
-        self.visualization_image = None
+        self.profiler = profiler
+
+        # window mode: float64 sum of the squared field over the current window and its number of samples
+        self._window_sum = None
+        self._window_count = 0
+        self._scratch = None
+
+        # the scene visualization is rendered on demand and cached until the scene changes
+        self._wave_sim = None
+        self._num_updates = 0
+        self._overlay = None
+        self._overlay_key = None
 
     def update(self, wave_sim):
         self.field = wave_sim.get_field()
+        self._wave_sim = wave_sim
+        self._num_updates += 1
+        backend = backend_of(self.field)
 
         if self.intensity is None:
-            self.intensity = cp.zeros_like(self.field)
+            # fields of reduced precision accumulate their intensity in the compute dtype
+            self.intensity = backend.xp.zeros(self.field.shape, dtype=compute_dtype(self.field.dtype))
+
+        if self._num_updates % self.intensity_every == 0:
+            with get_profiler(self.profiler).phase('visualizer.update', backend):
+                if self.intensity_mode == 'exponential':
+                    self._accumulate_exponential(backend)
+                else:
+                    self._accumulate_window(backend)
+
+        # the colormap lookup happens on the backend of the field, conversions are only done once
+        if not self.headless:
+            if self.field_colormap is not None:
+                self.field_colormap = backend.asarray(self.field_colormap)
+            if self.intensity_colormap is not None:
+                self.intensity_colormap = backend.asarray(self.intensity_colormap)
+
+    def _accumulate_exponential(self, backend):
+        """ in place exponential moving average of the squared field """
+        decay = self.intensity_exp_average_factor ** self.intensity_every
+        if backend.is_gpu:
+            _get_cupy_kernel('exponential')(self.field, decay, self.intensity)
+        elif numba is not None:
+            _exponential_accumulate(_as_2d(self.intensity), _as_2d(as_compute(self.field)), decay)
+        else:
+            self._scratch = _square(as_compute(self.field), self._scratch)
+            self._scratch *= 1.0 - decay
+            self.intensity *= decay
+            self.intensity += self._scratch
+
+    def _accumulate_window(self, backend):
+        """ adds the squared field to the window sum and publishes the average when the window is complete """
+        if self._window_sum is None or self._window_sum.shape != self.field.shape:
+            self._window_sum = backend.xp.zeros(self.field.shape, dtype=np.float64)
+            self._window_count = 0
+
+        if backend.is_gpu:
+            _get_cupy_kernel('square')(self.field, self._window_sum)
+        elif numba is not None:
+            _square_accumulate(_as_2d(self._window_sum), _as_2d(as_compute(self.field)))
+        else:
+            self._scratch = _square(as_compute(self.field), self._scratch)
+            self._window_sum += self._scratch
+        self._window_count += 1
+
+        if self._window_count * self.intensity_every >= self.intensity_window:
+            backend.xp.multiply(self._window_sum, 1.0 / self._window_count, out=self.intensity, casting='unsafe')
+            self._window_sum.fill(0.0)
+            self._window_count = 0
+
+    @property
+    def visualization_image(self):
+        """
+        The visualization of the scene objects of the last updated simulator. It is rendered again only when the
+        scene has changed, or once per update if the scene contains non-static objects. None in headless mode.
+        """
+        wave_sim = self._wave_sim
+        if self.headless or wave_sim is None:
+            return None
 
-        t = self.intensity_exp_average_factor
-        self.intensity = self.intensity*t + (self.field**2)*(1.0-t)
-        self.visualization_image = wave_sim.render_visualization()
+        dynamic = any(not obj.is_static() for obj in wave_sim.scene_objects)
+        key = (wave_sim.scene_version, list(wave_sim.scene_objects), self._num_updates if dynamic else None)
+        h, w = self.field.shape[-2:]
+
+        if self._overlay is None or self._overlay.shape[:2] != (h, w):
+            self._overlay = np.zeros((h, w, 3), dtype=np.uint8)
+            self._overlay_key = None
+
+        if key != self._overlay_key:
+            self._overlay.fill(0)
+            wave_sim.render_visualization(self._overlay)
+            self._overlay_key = key
+
+        return self._overlay
+
+    def get_state(self):
+        """ returns a copy of the intensity accumulator as dictionary of numpy arrays """
+        if self.intensity is None:
+            return {}
+        state = {'intensity': backend_of(self.intensity).to_numpy(self.intensity.copy()),
+                 'num_updates': np.int64(self._num_updates)}
+        if self._window_sum is not None:
+            state['window_sum'] = backend_of(self._window_sum).to_numpy(self._window_sum.copy())
+            state['window_count'] = np.int64(self._window_count)
+        return state
+
+    def set_state(self, state, backend):
+        """ restores the intensity accumulator on the given backend, see get_state """
+        self.intensity = backend.asarray(state['intensity']).copy() if 'intensity' in state else None
+        self._num_updates = int(state.get('num_updates', 0))
+        self._window_sum = backend.asarray(state['window_sum']).copy() if 'window_sum' in state else None
+        self._window_count = int(state.get('window_count', 0))
 
     def render_intensity(self, brightness_scale=1.0, exp=0.5, overlay_visualization=True):
-        gray = (cp.clip((self.intensity**exp)*brightness_scale, 0.0, 1.0) * 254.0).astype(np.uint8)
-        img = self.intensity_colormap[gray].get() if self.intensity_colormap is not None else gray.get()
-        img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-        if overlay_visualization:
-            img = cv2.add(img, self.visualization_image)
-        return img
+        # the image is on the host, so the time includes the device work and the transfer
+        with get_profiler(self.profiler).phase('visualizer.render_intensity'):
+            overlay = self.visualization_image if overlay_visualization else None
+            return colorize_intensity(self.intensity, self.intensity_colormap, brightness_scale, exp, overlay)
 
     def render_field(self, brightness_scale=1.0, overlay_visualization=True):
-        gray = (cp.clip(self.field*brightness_scale, -1.0, 1.0) * 127 + 127).astype(np.uint8)
-        img = self.field_colormap[gray].get() if self.field_colormap is not None else gray.get()
-        img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-        if overlay_visualization:
-            img = cv2.add(img, self.visualization_image)
-        return img
+        with get_profiler(self.profiler).phase('visualizer.render_field'):
+            overlay = self.visualization_image if overlay_visualization else None
+            return colorize_field(self.field, self.field_colormap, brightness_scale, overlay)
+
+
+def _as_2d(a):
+    """ 2D view of a field or a stack of fields """
+    return a.reshape(-1, a.shape[-1])
+
+
+def _square(field, out):
+    """ field**2 written to the reused buffer 'out' """
+    if out is None or out.shape != field.shape or out.dtype != field.dtype:
+        out = np.empty_like(field)
+    return np.multiply(field, field, out=out)
+
+
+def _apply_colormap(colormap, gray, overlay):
+    """
+    looks up the colors of a gray value image on its backend and returns the result as BGR numpy image, the
+    optional overlay image is added
+    """
+    backend = backend_of(gray)
+    img = backend.to_numpy(gray) if colormap is None else backend.to_numpy(colormap[gray])
+    img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    if overlay is not None:
+        img = cv2.add(img, overlay)
+    return img
+
+
+def colorize_field(field, colormap, brightness_scale=1.0, overlay=None):
+    """
+    Renders a field to a BGR image. The colormap has to be on the backend of the field (or None for gray values).
+    """
+    xp = backend_of(field).xp
+    gray = (xp.clip(field*brightness_scale, -1.0, 1.0) * 127 + 127).astype(np.uint8)
+    return _apply_colormap(colormap, gray, overlay)
+
+
+def colorize_intensity(intensity, colormap, brightness_scale=1.0, exp=0.5, overlay=None):
+    """
+    Renders an intensity field to a BGR image. The colormap has to be on the backend of the intensity (or None).
+    """
+    xp = backend_of(intensity).xp
+    gray = (xp.clip((intensity**exp)*brightness_scale, 0.0, 1.0) * 254.0).astype(np.uint8)
+    return _apply_colormap(colormap, gray, overlay)
 
 
 def get_colormap_lut(name, invert, black_level=0.0, make_symmetric=False):
@@ -66,4 +267,4 @@ def get_colormap_lut(name, invert, black_level=0.0, make_symmetric=False):
 
     color_values = np.clip(color_values*(1.0-black_level)+black_level, 0, 255)
 
-    return cp.asarray((color_values*255).astype(np.uint8))
\ No newline at end of file
+    return (color_values*255).astype(np.uint8)
\ No newline at end of file